@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Config(object):
     DEBUG = False
@@ -6,6 +7,50 @@ class Config(object):
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
 
+    # Database connection pool: connections kept open, extra connections
+    # allowed under load, seconds before a connection is replaced, a ping
+    # before each checkout to skip connections the server dropped while idle,
+    # and seconds to wait for a free connection before failing
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv("DB_POOL_SIZE", 5)),
+        'max_overflow': int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        'pool_recycle': int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        'pool_pre_ping': os.getenv("DB_POOL_PRE_PING", "True") == "True",
+        'pool_timeout': int(os.getenv("DB_POOL_TIMEOUT", 10)),
+    }
+
+    # Optional integrations, imported only when switched on: Sentry error
+    # reporting (with request headers and user IPs when PII is allowed), the
+    # Flask-MonitoringDashboard at /dashboard, and the OpenAPI spec with
+    # Swagger UI at /api/docs
+    SENTRY_DSN = os.getenv("SENTRY_DSN")
+    SENTRY_SEND_DEFAULT_PII = os.getenv("SENTRY_SEND_DEFAULT_PII", "True") == "True"
+    SENTRY_TRACES_SAMPLE_RATE = float(os.getenv("SENTRY_TRACES_SAMPLE_RATE", 0.0))
+    MONITORING_DASHBOARD = os.getenv("MONITORING_DASHBOARD", "False") == "True"
+    SWAGGER_ENABLED = os.getenv("SWAGGER_ENABLED", "True") == "True"
+
+    # The spec is built from the route docstrings once per process, or read
+    # from SWAGGER_SPEC_FILE when "flask dump-spec" wrote it at build time;
+    # browsers cache it and the Swagger UI assets for these many seconds
+    SWAGGER_SPEC_FILE = os.getenv("SWAGGER_SPEC_FILE")
+    SWAGGER_SPEC_MAX_AGE = int(os.getenv("SWAGGER_SPEC_MAX_AGE", 24 * 3600))
+    SWAGGER_ASSETS_MAX_AGE = int(os.getenv("SWAGGER_ASSETS_MAX_AGE", 7 * 24 * 3600))
+
+    # Read replicas (comma-separated URLs) that GET and HEAD requests read
+    # from, round-robin; writes and everything else go to the primary
+    SQLALCHEMY_REPLICA_URIS = [
+        uri for uri in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if uri.strip()
+    ]
+
+    # Per-request query count and database, serialization and total time,
+    # logged by "api.request_timing" and, with the header on, sent to
+    # clients as Server-Timing; nothing is measured while it is off
+    REQUEST_TIMING = os.getenv("REQUEST_TIMING", "False") == "True"
+    REQUEST_TIMING_HEADER = os.getenv("REQUEST_TIMING_HEADER", "True") == "True"
+
+    # Bearer token for the /internal endpoints; they answer 404 while unset
+    INTERNAL_METRICS_TOKEN = os.getenv("INTERNAL_METRICS_TOKEN")
+
     SECRET_KEY = os.getenv("SECRET_KEY", "your-default-secret-key")
     SECURITY_PASSWORD_SALT = os.getenv("SECURITY_PASSWORD_SALT", "your-default-salt")
 
@@ -18,11 +63,118 @@ class Config(object):
     MAIL_USE_TLS = os.getenv("MAIL_USE_TLS", "False") == "True"
     MAIL_USE_SSL = os.getenv("MAIL_USE_SSL", "True") == "True"
 
+    # Background delivery: queue size, messages per batch and how long to
+    # wait for a batch to fill, idle seconds before the SMTP connection is
+    # closed, and retries with exponential backoff (base delay in seconds)
+    MAIL_ASYNC = os.getenv("MAIL_ASYNC", "True") == "True"
+    MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", 1000))
+    MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 50))
+    MAIL_BATCH_WAIT = float(os.getenv("MAIL_BATCH_WAIT", 0.05))
+    MAIL_IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", 30))
+    MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", 3))
+    MAIL_RETRY_BACKOFF = float(os.getenv("MAIL_RETRY_BACKOFF", 1.0))
+
     # ✅ Upload folder configuration
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'static', 'uploads')
 
+    # Largest accepted avatar and the chunk size it is copied and hashed in
+    AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", 5 * 1024 * 1024))
+    AVATAR_CHUNK_SIZE = int(os.getenv("AVATAR_CHUNK_SIZE", 64 * 1024))
+
+    # Where avatar files live: "local" keeps them in UPLOAD_FOLDER, spread
+    # over AVATAR_SHARD_DEPTH levels of hashed subdirectories (0 stores them
+    # flat; "flask avatars migrate-layout" moves flat files into shards),
+    # "memory" keeps them in the process for tests
+    AVATAR_STORAGE = os.getenv("AVATAR_STORAGE", "local")
+    AVATAR_SHARD_DEPTH = int(os.getenv("AVATAR_SHARD_DEPTH", 2))
+
+    # Avatar files never change, so clients may cache them for a year; a
+    # thumbnail URL that still serves the original is cached briefly.
+    # AVATAR_SEND_MODE: direct (the app sends the file), x-accel (nginx
+    # X-Accel-Redirect to AVATAR_ACCEL_PREFIX, an internal location aliased
+    # to UPLOAD_FOLDER) or x-sendfile (Apache/lighttpd)
+    AVATAR_CACHE_MAX_AGE = int(os.getenv("AVATAR_CACHE_MAX_AGE", 365 * 24 * 3600))
+    AVATAR_FALLBACK_MAX_AGE = int(os.getenv("AVATAR_FALLBACK_MAX_AGE", 60))
+    AVATAR_SEND_MODE = os.getenv("AVATAR_SEND_MODE", "direct")
+    AVATAR_ACCEL_PREFIX = os.getenv("AVATAR_ACCEL_PREFIX", "/protected-avatars")
+
+    # Orphaned avatar cleanup ("flask avatars gc"): files younger than the
+    # grace period are kept, entries checked per batch, and the interval in
+    # seconds of the scheduler gunicorn workers start (0 leaves scheduling
+    # to cron)
+    AVATAR_GC_GRACE_PERIOD = int(os.getenv("AVATAR_GC_GRACE_PERIOD", 3600))
+    AVATAR_GC_BATCH_SIZE = int(os.getenv("AVATAR_GC_BATCH_SIZE", 1000))
+    AVATAR_GC_INTERVAL = int(os.getenv("AVATAR_GC_INTERVAL", 0))
+
+    # Square avatar thumbnails generated after upload (needs Pillow), and
+    # the background threads and queue that generate them
+    AVATAR_VARIANT_SIZES = tuple(
+        int(size) for size in os.getenv("AVATAR_VARIANT_SIZES", "48,96,256").split(",") if size
+    )
+    AVATAR_VARIANT_WORKERS = int(os.getenv("AVATAR_VARIANT_WORKERS", 2))
+    AVATAR_VARIANT_MAX_PENDING = int(os.getenv("AVATAR_VARIANT_MAX_PENDING", 100))
+
+    # JSON encoder: auto (orjson when installed), orjson or default
+    JSON_PROVIDER = os.getenv("JSON_PROVIDER", "auto")
+
+    # Keyset pagination for list endpoints
+    PAGINATION_DEFAULT_LIMIT = int(os.getenv("PAGINATION_DEFAULT_LIMIT", 50))
+    PAGINATION_MAX_LIMIT = int(os.getenv("PAGINATION_MAX_LIMIT", 500))
+
+    # Rows fetched per server-side batch by the export endpoints
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+    # Bulk endpoints: records accepted per request and rows per INSERT batch
+    BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 10000))
+    BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 1000))
+
+    # Full-text search: auto, fts5 (SQLite), mysql (InnoDB FULLTEXT) or memory
+    SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+    SEARCH_DEFAULT_LIMIT = int(os.getenv("SEARCH_DEFAULT_LIMIT", 20))
+    SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", 100))
+
+    # Verified JWT claims kept per token (0 disables) and for how long at
+    # most; entries never outlive the token's exp
+    JWT_CLAIMS_CACHE_SIZE = int(os.getenv("JWT_CLAIMS_CACHE_SIZE", 1024))
+    JWT_CLAIMS_CACHE_TTL = int(os.getenv("JWT_CLAIMS_CACHE_TTL", 300))
+
+    # Login and signup throttling: token bucket rates as "capacity/seconds"
+    # per client IP and per email/username, shared by all workers on the
+    # host through a SQLite file; set the number of reverse proxies in front
+    # of the app so the client IP is read from X-Forwarded-For
+    RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "True") == "True"
+    RATELIMIT_STORAGE = os.getenv(
+        "RATELIMIT_STORAGE", os.path.join(tempfile.gettempdir(), "author-book-ratelimit.db"))
+    RATELIMIT_PER_IP = os.getenv("RATELIMIT_PER_IP", "20/60")
+    RATELIMIT_PER_IDENTIFIER = os.getenv("RATELIMIT_PER_IDENTIFIER", "5/60")
+    RATELIMIT_TRUSTED_PROXIES = int(os.getenv("RATELIMIT_TRUSTED_PROXIES", 0))
+
+    # Verified users cached by email/username on the login path
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1024))
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 60))
+
+    # Password hashing: PBKDF2 rounds for new hashes (older hashes are
+    # upgraded on login), worker processes per app process (0 hashes in the
+    # request thread; more than 1 only helps threaded gunicorn workers, see
+    # api.utils.passwords), how they are started, and hashes allowed to
+    # wait for a worker before answering 503
+    PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", 29000))
+    PASSWORD_HASH_POOL_SIZE = int(os.getenv("PASSWORD_HASH_POOL_SIZE", 1))
+    PASSWORD_HASH_START_METHOD = os.getenv("PASSWORD_HASH_START_METHOD") or None
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 0))
+
 class ProductionConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
+    SENTRY_DSN = os.getenv(
+        "SENTRY_DSN",
+        "https://1a2bad50c8e9301441ea1bb0099f6ee6@o4510117421514752.ingest.us.sentry.io/4510117450940416"
+    )
+    MONITORING_DASHBOARD = os.getenv("MONITORING_DASHBOARD", "True") == "True"
+    # Requests reach the app through Railway's proxy
+    RATELIMIT_TRUSTED_PROXIES = int(os.getenv("RATELIMIT_TRUSTED_PROXIES", 1))
+    # Replaced and deleted avatars are only removed by the GC, and there is
+    # no cron on the deploy, so the gunicorn workers schedule it
+    AVATAR_GC_INTERVAL = int(os.getenv("AVATAR_GC_INTERVAL", 3600))
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -37,14 +189,32 @@ class TestingConfig(Config):
     SQLALCHEMY_ECHO = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
-    # Use in-memory SQLite for fast, isolated tests
+    # Use in-memory SQLite for fast, isolated tests, on the single shared
+    # connection Flask-SQLAlchemy gives it (no pool settings apply)
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_REPLICA_URIS = []
 
     # Security keys for testing
     SECRET_KEY = 'test-secret-key'
     JWT_SECRET_KEY = 'test-jwt-secret'
     SECURITY_PASSWORD_SALT = 'test-password-salt'
 
+    # Tests that exercise throttling turn it on with their own bucket file
+    RATELIMIT_ENABLED = False
+
+    # Send mail (suppressed while testing) in the request thread
+    MAIL_ASYNC = False
+
+    # Hash inline and cheaply in tests
+    PASSWORD_HASH_ROUNDS = 1000
+    PASSWORD_HASH_POOL_SIZE = 0
+
+    # No error reporting, dashboard or API docs unless a test turns them on
+    SENTRY_DSN = None
+    MONITORING_DASHBOARD = False
+    SWAGGER_ENABLED = False
+
     # Disable CSRF protection for testing forms
     WTF_CSRF_ENABLED = False
 
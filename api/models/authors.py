@@ -2,16 +2,25 @@ from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
 from marshmallow import fields
 
 from api.utils.database import db
+from api.utils.timing import TimedDumpMixin
 from api.models.books import BookSchema
+from api.models.versions import new_version
+from api.utils.avatars import avatar_variant_urls
 
 class Author(db.Model):
     __tablename__ = 'authors'
+    __table_args__ = (
+        db.Index('ft_authors_name', 'first_name', 'last_name', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     first_name = db.Column(db.String(20), nullable=False)
     last_name = db.Column(db.String(20), nullable=False)
     created = db.Column(db.DateTime, server_default=db.func.now())
-    books = db.relationship('Book', backref='Author', cascade="all, delete-orphan")
+    books = db.relationship('Book', backref='Author', cascade="all, delete-orphan", order_by='Book.id')
     avatar = db.Column(db.String(512), nullable=True)  # ✅ Increased length
+    # ETag of the author's detail view, see api.utils.etags
+    version = db.Column(db.String(32), default=new_version, onupdate=new_version)
 
     def __init__(self, first_name, last_name, books=None):
         self.first_name = first_name
@@ -23,11 +32,12 @@ class Author(db.Model):
         db.session.commit()
         return self
 
-class AuthorSchema(SQLAlchemyAutoSchema):
+class AuthorSchema(TimedDumpMixin, SQLAlchemyAutoSchema):
     class Meta(SQLAlchemyAutoSchema.Meta):
         model = Author
         sqla_session = db.session
         load_instance = True
+        exclude = ('version',)
 
     id = fields.Int(dump_only=True)
     first_name = fields.String(required=True)
@@ -35,3 +45,7 @@ class AuthorSchema(SQLAlchemyAutoSchema):
     created = fields.String(dump_only=True)
     books = fields.Nested(BookSchema, many=True, only=['title', 'year', 'id'])
     avatar = fields.String(dump_only=True)
+    avatar_variants = fields.Method('get_avatar_variants', dump_only=True)
+
+    def get_avatar_variants(self, author):
+        return avatar_variant_urls(author.avatar)
@@ -0,0 +1,11 @@
+from api.utils.database import db
+
+# Avatar file stored under its content hash, with the number of authors
+# whose avatar it is. Identical uploads share one file; it is deleted when
+# the last reference goes away.
+class AvatarFile(db.Model):
+    __tablename__ = 'avatar_files'
+    filename = db.Column(db.String(80), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created = db.Column(db.DateTime, server_default=db.func.now())
@@ -2,13 +2,25 @@ from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
 from marshmallow import fields
 
 from api.utils.database import db
+from api.utils.timing import TimedDumpMixin
+from api.models.versions import new_version
 
 class Book(db.Model):
     __tablename__ = 'books'
+    # (author_id, year) also serves lookups on author_id alone as its leftmost prefix
+    __table_args__ = (
+        db.Index('ix_books_author_id_year', 'author_id', 'year'),
+        db.Index('ix_books_year', 'year'),
+        db.Index('ix_books_title', 'title'),
+        db.Index('ft_books_title', 'title', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(50))
     year = db.Column(db.Integer)
     author_id = db.Column(db.Integer, db.ForeignKey('authors.id'))
+    # ETag of the book's detail view, see api.utils.etags
+    version = db.Column(db.String(32), default=new_version, onupdate=new_version)
 
     def __init__(self, title, year, author_id=None):
         self.title = title
@@ -20,10 +32,11 @@ class Book(db.Model):
         db.session.commit()
         return self
 
-class BookSchema(SQLAlchemyAutoSchema):
+class BookSchema(TimedDumpMixin, SQLAlchemyAutoSchema):
     class Meta(SQLAlchemyAutoSchema.Meta):
         model = Book
         sqla_session = db.session
+        exclude = ('version',)
                 
     id = fields.Int(dump_only=True)
     title = fields.String(required=True)
@@ -0,0 +1,62 @@
+from functools import lru_cache
+
+from sqlalchemy import select
+
+from api.utils.database import db
+from api.utils.avatars import avatar_variant_urls
+from api.utils.timing import serializing
+from api.models.books import Book
+
+# Fields of the read-only list views. They mirror
+# BookSchema(only=BOOK_LIST_FIELDS) and AuthorSchema(only=AUTHOR_LIST_FIELDS
+# + ('avatar_variants', 'books')), whose nested books use NESTED_BOOK_FIELDS.
+BOOK_LIST_FIELDS = ('id', 'title', 'year', 'author_id')
+AUTHOR_LIST_FIELDS = ('id', 'first_name', 'last_name', 'avatar')
+NESTED_BOOK_FIELDS = ('id', 'title', 'year')
+
+@lru_cache(maxsize=None)
+def _dump_schema(schema_class, many, only):
+    return schema_class(many=many, only=only)
+
+# Shared schema instance for dumping, one per (class, many, only) combination.
+# Only use it for dump(): marshmallow-sqlalchemy keeps per-call state on the
+# instance during load().
+def dump_schema(schema_class, many=False, only=None):
+    return _dump_schema(schema_class, many, tuple(only) if only is not None else None)
+
+def list_columns(model, fields):
+    return [getattr(model, field) for field in fields]
+
+# Rows selected with with_entities()/select() over the given fields, turned
+# straight into the dicts the schema would produce. This holds because every
+# listed column is a plain Integer or String column whose database value
+# already has the type the schema field serializes to. Like the helpers
+# below, it counts as serialization time of the request.
+def dump_rows(rows, fields):
+    with serializing():
+        return [dict(zip(fields, row)) for row in rows]
+
+# Add the "avatar_variants" URLs computed from each author's avatar
+def attach_avatar_variants(authors):
+    with serializing():
+        for author in authors:
+            author['avatar_variants'] = avatar_variant_urls(author['avatar'])
+    return authors
+
+# Add the nested "books" list to author dicts with one query for the whole
+# page, grouped in Python
+def attach_books(authors):
+    by_author = {}
+    for author in authors:
+        author['books'] = by_author[author['id']] = []
+    if not by_author:
+        return authors
+    rows = db.session.execute(
+        select(Book.author_id, *list_columns(Book, NESTED_BOOK_FIELDS))
+        .where(Book.author_id.in_(list(by_author)))
+        .order_by(Book.id)
+    )
+    with serializing():
+        for row in rows:
+            by_author[row[0]].append(dict(zip(NESTED_BOOK_FIELDS, row[1:])))
+    return authors
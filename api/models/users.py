@@ -1,8 +1,26 @@
-from passlib.hash import pbkdf2_sha256 as sha256
+from collections import namedtuple
+
+from flask import current_app
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
 from marshmallow import fields
+from sqlalchemy import case, or_
 
 from api.utils.database import db
+from api.utils.timing import TimedDumpMixin
+from api.utils.passwords import passwords
+from api.utils.cache import TTLCache
+
+# Read-only snapshot of a user, as kept in the login lookup cache
+UserIdentity = namedtuple('UserIdentity', ['id', 'username', 'email', 'password', 'isVerified'])
+
+def get_identity_cache():
+    cache = current_app.extensions.get('user_identity_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('user_identity_cache', TTLCache(
+            current_app.config.get('USER_CACHE_SIZE', 1024),
+            current_app.config.get('USER_CACHE_TTL', 60)
+        ))
+    return cache
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -26,15 +44,65 @@ class User(db.Model):
     def find_by_username(cls, username):
         return cls.query.filter_by(username=username).first()
 
+    # The user matching the email or the username, in one query; a match on
+    # the email wins when both are given. Both columns are unique, so each
+    # comparison is an index lookup.
+    @classmethod
+    def find_by_identity(cls, email=None, username=None):
+        clauses = []
+        if email:
+            clauses.append(cls.email == email)
+        if username:
+            clauses.append(cls.username == username)
+        if not clauses:
+            return None
+        query = cls.query.filter(or_(*clauses))
+        if len(clauses) > 1:
+            query = query.order_by(case((cls.email == email, 0), else_=1))
+        return query.first()
+
+    # find_by_identity() for the login path. Verified users are cached for
+    # USER_CACHE_TTL seconds; unverified ones are always read again so a
+    # confirmed email takes effect at once.
+    @classmethod
+    def get_identity(cls, email=None, username=None):
+        cache = get_identity_cache()
+        key = ('email', email) if email else ('username', username)
+        identity = cache.get(key)
+        if identity is None:
+            user = cls.find_by_identity(email=email, username=username)
+            if user is None:
+                return None
+            identity = UserIdentity(user.id, user.username, user.email, user.password, user.isVerified)
+            if identity.isVerified:
+                cache.set(key, identity)
+        return identity
+
+    @staticmethod
+    def forget_identity(user):
+        cache = get_identity_cache()
+        cache.pop(('email', user.email))
+        cache.pop(('username', user.username))
+
     @staticmethod
     def generate_hash(password):
-        return sha256.hash(password)
+        return passwords.hash(password)
 
     @staticmethod
     def verify_hash(password, hash):
-        return sha256.verify(password, hash)
+        return passwords.verify(password, hash)
+
+    # Replace the stored hash of a user or UserIdentity if it was made with
+    # outdated parameters; call only with a password that was just verified
+    @classmethod
+    def rehash_if_needed(cls, user, password):
+        if passwords.needs_update(user.password):
+            password_hash = cls.generate_hash(password)
+            cls.query.filter_by(id=user.id).update({'password': password_hash})
+            db.session.commit()
+            cls.forget_identity(user)
 
-class UserSchema(SQLAlchemyAutoSchema):
+class UserSchema(TimedDumpMixin, SQLAlchemyAutoSchema):
     class Meta:
         model = User
         sqla_session = db.session
@@ -0,0 +1,16 @@
+import uuid
+
+from api.utils.database import db
+
+# Random version token, also the "version" column of every author and book
+# row, replaced on each update of the row
+def new_version():
+    return uuid.uuid4().hex
+
+# Current version token of a cached collection ("authors", "books"). Write
+# handlers replace the token right after their commit, which invalidates
+# every list ETag derived from it in all worker processes.
+class ResourceVersion(db.Model):
+    __tablename__ = 'resource_versions'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.String(32), nullable=False)
@@ -1,17 +1,26 @@
-import os
-import uuid
-from flask import Blueprint, request, url_for, current_app, send_from_directory
+from flask import Blueprint, request, url_for, current_app
 from flask_jwt_extended import jwt_required
-from werkzeug.utils import secure_filename
+from marshmallow import ValidationError
+from sqlalchemy.orm import joinedload
+from werkzeug.exceptions import NotFound, RequestEntityTooLarge
 
 from api.utils.responses import response_with
 from api.utils import responses as resp
 from api.utils.database import db
+from api.utils.avatars import (
+    AvatarTooLarge, add_reference, avatar_extension, avatar_filename, release_reference,
+    save_avatar, send_avatar, upload_limit
+)
+from api.utils.bulk import BulkPayloadError, bulk_insert, created_results, get_bulk_items, invalid_results
+from api.utils.etags import AUTHORS, BOOKS, author_version, conditional_get, invalidate
+from api.utils.export import ExportFormatError, stream_export
+from api.utils.pagination import PaginationError, get_page_args, keyset_paginate
+from api.utils.search import AUTHOR, author_document, search
+from api.utils.thumbnails import pick_size, thumbnails, variant_sizes
 from api.models.authors import Author, AuthorSchema
-
-# Allowed file extensions
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg'}
+from api.models.serializers import (
+    AUTHOR_LIST_FIELDS, attach_avatar_variants, attach_books, dump_rows, dump_schema, list_columns
+)
 
 # Blueprint setup
 author_routes = Blueprint("author_routes", __name__)
@@ -20,10 +29,19 @@ author_routes = Blueprint("author_routes", __name__)
 def get_request_data():
     return request.get_json() if request.is_json else request.form
 
-# Serve uploaded avatar files
+# Serve uploaded avatar files; ?size= picks a resized variant, falling back to
+# the original until the variant has been generated
 @author_routes.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+    size = request.args.get('size', type=int)
+    if size:
+        variant = thumbnails.find(filename, size)
+        if variant is None and pick_size(size, variant_sizes()) is not None:
+            # The URL will serve the variant once it exists, so the
+            # original must not be cached under it for long
+            return send_avatar(filename, immutable=False)
+        filename = variant or filename
+    return send_avatar(filename)
 
 # Handle OPTIONS requests globally
 @author_routes.route('/', methods=['OPTIONS'])
@@ -70,6 +88,7 @@ def create_author():
         author_schema = AuthorSchema()
         author = author_schema.load(data)
         db.session.add(author)
+        invalidate(AUTHORS)
         db.session.commit()
         result = author_schema.dump(author)
         return response_with(resp.SUCCESS_201, value={"author": result})
@@ -78,8 +97,72 @@ def create_author():
         return response_with(resp.INVALID_INPUT_422, message="Invalid input")
 
 
+# Create many authors in one transaction
+@author_routes.route('/bulk', methods=['POST'])
+@jwt_required()
+def create_authors_bulk():
+    """
+    Create authors in bulk
+
+    ---
+    tags:
+      - Authors
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: array
+          items:
+            type: object
+            required:
+              - first_name
+              - last_name
+            properties:
+              first_name:
+                type: string
+                example: "Jane"
+              last_name:
+                type: string
+                example: "Austen"
+    responses:
+      201:
+        description: All authors created; results holds the id of every item in request order
+        schema:
+          type: object
+          properties:
+            results:
+              type: array
+              items:
+                type: object
+      422:
+        description: Invalid payload or items; results holds the errors per item and nothing is created
+    """
+    try:
+        items = get_bulk_items(request.get_json(silent=True), current_app.config['BULK_MAX_ITEMS'])
+    except BulkPayloadError as e:
+        return response_with(resp.INVALID_INPUT_422, value={"error": str(e)})
+
+    try:
+        rows = AuthorSchema(many=True, load_instance=False).load(items)
+    except ValidationError as err:
+        return response_with(resp.INVALID_INPUT_422, value={"results": invalid_results(len(items), err.messages)})
+
+    rows = [{'first_name': row['first_name'], 'last_name': row['last_name']} for row in rows]
+    ids = bulk_insert(Author, rows, current_app.config['BULK_CHUNK_SIZE'])
+    search.stage(db.session, AUTHOR, {
+        id: author_document(row['first_name'], row['last_name']) for id, row in zip(ids, rows)
+    })
+    invalidate(AUTHORS)
+    db.session.commit()
+    return response_with(resp.SUCCESS_201, value={"results": created_results(ids)})
+
+
 # Get all authors (basic info only)
 @author_routes.route('/', methods=['GET'])
+@conditional_get(AUTHORS)
 def get_author_list():
     """
     Get all authors
@@ -87,13 +170,35 @@ def get_author_list():
     ---
     tags:
       - Authors
-    summary: Retrieve a list of all authors with basic information
+    summary: Retrieve a page of authors with basic information
+    parameters:
+      - in: query
+        name: limit
+        type: integer
+        required: false
+        description: Maximum number of authors to return
+      - in: query
+        name: after
+        type: string
+        required: false
+        description: Cursor returned as pagination.next by the previous page
     responses:
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       200:
         description: A list of authors with ID, first name, last name, and avatar URL
         schema:
           type: object
           properties:
+            pagination:
+              type: object
+              properties:
+                limit:
+                  type: integer
+                  example: 50
+                next:
+                  type: string
+                  description: Cursor for the next page, null on the last page
             authors:
               type: array
               items:
@@ -111,15 +216,63 @@ def get_author_list():
                   avatar:
                     type: string
                     example: "https://yourdomain.com/api/authors/uploads/avatar123.jpg"
+                  avatar_variants:
+                    type: object
+                    description: URLs of square thumbnails by pixel size
+                    example: {"48": "https://yourdomain.com/api/authors/uploads/avatar123.jpg?size=48"}
+    """
+    try:
+        limit, after = get_page_args(request.args)
+        query = Author.query.with_entities(*list_columns(Author, AUTHOR_LIST_FIELDS))
+        fetched, pagination = keyset_paginate(query, Author.id, limit, after)
+    except PaginationError as e:
+        return response_with(resp.INVALID_INPUT_422, value={"error": str(e)})
+    # Plain dicts from column tuples, with the books of the whole page loaded
+    # by one extra SELECT ... IN query
+    authors = attach_books(attach_avatar_variants(dump_rows(fetched, AUTHOR_LIST_FIELDS)))
+    return response_with(resp.SUCCESS_200, value={"authors": authors}, pagination=pagination)
+
+
+# Export all authors as a stream
+@author_routes.route('/export', methods=['GET'])
+def export_authors():
     """
-    fetched = Author.query.all()
-    author_schema = AuthorSchema(many=True, only=['id', 'first_name', 'last_name', 'avatar', 'books'])
-    authors = author_schema.dump(fetched)
-    return response_with(resp.SUCCESS_200, value={"authors": authors})
+    Export all authors
+
+    ---
+    tags:
+      - Authors
+    summary: Stream every author as NDJSON or CSV
+    produces:
+      - application/x-ndjson
+      - text/csv
+    parameters:
+      - in: query
+        name: format
+        type: string
+        enum: [ndjson, csv]
+        default: ndjson
+        required: false
+        description: Output format, one author per line
+    responses:
+      200:
+        description: A stream of authors
+      422:
+        description: Unsupported export format
+    """
+    try:
+        return stream_export(
+            [Author.id, Author.first_name, Author.last_name, Author.created, Author.avatar],
+            request.args.get('format', 'ndjson'),
+            'authors'
+        )
+    except ExportFormatError as e:
+        return response_with(resp.INVALID_INPUT_422, value={"error": str(e)})
 
 
 # Get author details by ID
 @author_routes.route('/<int:author_id>/', methods=['GET'])
+@conditional_get(AUTHORS, author_version)
 def get_author_detail(author_id):
     """
     Retrieve author details by ID
@@ -134,6 +287,8 @@ def get_author_detail(author_id):
         type: integer
         description: ID of the author to retrieve
     responses:
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       200:
         description: Author details retrieved successfully
         schema:
@@ -154,11 +309,15 @@ def get_author_detail(author_id):
                 avatar:
                   type: string
                   example: "https://yourdomain.com/api/authors/uploads/avatar123.jpg"
+                avatar_variants:
+                  type: object
+                  description: URLs of square thumbnails by pixel size
+                  example: {"48": "https://yourdomain.com/api/authors/uploads/avatar123.jpg?size=48"}
       404:
         description: Author not found
     """
-    fetched = Author.query.get_or_404(author_id)
-    author_schema = AuthorSchema()
+    fetched = Author.query.options(joinedload(Author.books)).get_or_404(author_id)
+    author_schema = dump_schema(AuthorSchema)
     author = author_schema.dump(fetched)
     return response_with(resp.SUCCESS_200, value={"author": author})
 
@@ -211,8 +370,9 @@ def update_author_detail(id):
     get_author.first_name = data.get('first_name')
     get_author.last_name = data.get('last_name')
     db.session.add(get_author)
+    invalidate(AUTHORS)
     db.session.commit()
-    author_schema = AuthorSchema()
+    author_schema = dump_schema(AuthorSchema)
     author = author_schema.dump(get_author)
     return response_with(resp.SUCCESS_200, value={"author": author})
 
@@ -267,8 +427,9 @@ def modify_author_detail(id):
     if 'last_name' in data:
         get_author.last_name = data.get('last_name')
     db.session.add(get_author)
+    invalidate(AUTHORS)
     db.session.commit()
-    author_schema = AuthorSchema()
+    author_schema = dump_schema(AuthorSchema)
     author = author_schema.dump(get_author)
     return response_with(resp.SUCCESS_200, value={"author": author})
 
@@ -297,7 +458,11 @@ def delete_author(id):
         description: Author not found
     """
     get_author = Author.query.get_or_404(id)
+    avatar = avatar_filename(get_author.avatar)
+    if avatar:
+        release_reference(avatar)
     db.session.delete(get_author)
+    invalidate(AUTHORS, BOOKS)
     db.session.commit()
     return response_with(resp.SUCCESS_204)
 
@@ -336,13 +501,23 @@ def upsert_author_avatar(author_id):
           properties:
             author:
               type: object
+      404:
+        description: Author not found
+      413:
+        description: Avatar larger than the configured maximum size
       422:
         description: Invalid input or file type
-      500:
-        description: Upload folder not configured
     """
 
+    # Look the author up before any of the body is read or written
+    get_author = db.session.get(Author, author_id)
+    if get_author is None:
+        return response_with(resp.SERVER_ERROR_404, value={"error": "Author not found."})
+
     try:
+        # Refuse bodies over the avatar size cap before parsing them
+        request.max_content_length = upload_limit()
+
         # Check if the request contains a file
         if 'avatar' not in request.files:
             print("No 'avatar' field found in request.files")
@@ -356,40 +531,43 @@ def upsert_author_avatar(author_id):
             return response_with(resp.INVALID_INPUT_422, message="No selected file")
 
         # Validate file extension
-        if not allowed_file(file.filename):
+        extension = avatar_extension(file.filename)
+        if extension is None:
             print(f"File type not allowed: {file.filename}")
             return response_with(resp.INVALID_INPUT_422, message="Invalid file type")
 
-        # Generate a unique filename
-        filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
-        upload_folder = current_app.config.get('UPLOAD_FOLDER')
-
-        # Ensure the upload folder exists
-        if not upload_folder:
-            print("UPLOAD_FOLDER not configured")
-            return response_with(resp.SERVER_ERROR_500, message="Upload folder not configured")
-
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-
-        # Save the file
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
-
-        # Update the author's avatar URL
-        get_author = Author.query.get_or_404(author_id)
+        # Store the file under its content hash
+        filename, size = save_avatar(file.stream, extension)
+
+        # Point the author at the new file and release the previous one. The
+        # row is locked before its avatar is read, so that concurrent uploads
+        # for one author each release the file the other one replaced.
+        get_author = db.session.get(Author, author_id, with_for_update=True, populate_existing=True)
+        if get_author is None:
+            db.session.rollback()
+            return response_with(resp.SERVER_ERROR_404, value={"error": "Author not found."})
+        previous = avatar_filename(get_author.avatar)
+        add_reference(filename, size)
+        if previous:
+            release_reference(previous)
         get_author.avatar = url_for('author_routes.uploaded_file', filename=filename, _external=True)
-        db.session.add(get_author)
+        invalidate(AUTHORS)
         db.session.commit()
+        thumbnails.schedule(filename)
 
         # Return updated author data
-        author_schema = AuthorSchema()
+        author_schema = dump_schema(AuthorSchema)
         author = author_schema.dump(get_author)
         return response_with(resp.SUCCESS_200, value={"author": author})
 
+    except (AvatarTooLarge, RequestEntityTooLarge):
+        db.session.rollback()
+        return response_with(resp.PAYLOAD_TOO_LARGE_413,
+                             value={"error": f"Avatar must be at most {current_app.config['AVATAR_MAX_BYTES']} bytes."})
     except Exception as e:
         import traceback
         print("Avatar upload error:", traceback.format_exc())
+        db.session.rollback()
         return response_with(resp.INVALID_INPUT_422, message="Failed to upload avatar")
 
 # Delete author avatar image
@@ -421,6 +599,8 @@ def delete_author_avatar(author_id):
               type: object
       404:
         description: Avatar not found or author does not exist
+      500:
+        description: Avatar could not be deleted
     """
     # [function body unchanged]
 
@@ -429,31 +609,23 @@ def delete_author_avatar(author_id):
 
         # Check if avatar exists
         if not author.avatar:
-            return response_with(resp.NOT_FOUND_404, message="No avatar to delete")
-
-        # Extract filename from URL
-        avatar_url = author.avatar
-        filename = avatar_url.split('/')[-1]
-        upload_folder = current_app.config.get('UPLOAD_FOLDER')
-        file_path = os.path.join(upload_folder, filename)
-
-        # Delete the file if it exists
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            print(f"Deleted avatar file: {file_path}")
-        else:
-            print(f"Avatar file not found: {file_path}")
-
-        # Remove avatar reference from DB
+            return response_with(resp.SERVER_ERROR_404, message="No avatar to delete")
+
+        # Remove avatar reference from DB; the avatar GC deletes the file
+        # once nothing uses it
+        release_reference(avatar_filename(author.avatar))
         author.avatar = None
-        db.session.add(author)
+        invalidate(AUTHORS)
         db.session.commit()
 
-        author_schema = AuthorSchema()
+        author_schema = dump_schema(AuthorSchema)
         updated_author = author_schema.dump(author)
         return response_with(resp.SUCCESS_200, value={"author": updated_author})
 
+    except NotFound:
+        raise
     except Exception as e:
         import traceback
         print("Avatar deletion error:", traceback.format_exc())
-        return response
\ No newline at end of file
+        db.session.rollback()
+        return response_with(resp.SERVER_ERROR_500, message="Failed to delete avatar")
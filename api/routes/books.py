@@ -1,10 +1,23 @@
-from flask import Blueprint, request
+import re
+
+from flask import Blueprint, current_app, request
 from flask_jwt_extended import jwt_required
+from marshmallow import ValidationError
+from sqlalchemy import and_, delete, update
 
 from api.utils.responses import response_with
 from api.utils import responses as resp
 from api.utils.database import db
+from api.utils.bulk import (
+    BulkPayloadError, bulk_insert, chunked, created_results, get_bulk_items, invalid_results
+)
+from api.utils.etags import AUTHORS, BOOKS, book_version, conditional_get, invalidate
+from api.utils.export import ExportFormatError, stream_export
+from api.utils.pagination import get_page_args, keyset_paginate
+from api.utils.search import BOOK, search
+from api.models.authors import Author
 from api.models.books import Book, BookSchema
+from api.models.serializers import BOOK_LIST_FIELDS, dump_rows, dump_schema, list_columns
 
 book_routes = Blueprint("book_routes", __name__)
 
@@ -14,6 +27,66 @@ def get_request_data():
     else:
         return request.form
 
+INT_RE = re.compile(r'-?[0-9]+')
+
+# Columns GET /api/books/ can be sorted by; "id" sorts on the key alone
+BOOK_SORT_FIELDS = {
+    'id': None,
+    'year': Book.year,
+    'title': Book.title,
+}
+
+# Integer filter value: a JSON integer or, in a query string, a string of
+# digits. Anything else (floats, booleans, lists, objects) is rejected
+# rather than coerced, since the filters also select what bulk writes touch.
+def get_int_arg(args, name):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and INT_RE.fullmatch(value):
+        return int(value)
+    raise ValueError(f"{name} must be an integer.")
+
+# Title prefix condition. MySQL range-scans the title index for
+# LIKE 'prefix%' itself, and its collations do not order by code point, so
+# it gets LIKE. SQLite only uses the index for a range, which it compares
+# by code point (BINARY), so there the match is case-sensitive.
+def title_prefix_clause(prefix):
+    upper = ord(prefix[-1]) + 1
+    if (db.session.get_bind().dialect.name != 'sqlite'
+            or upper > 0x10FFFF or 0xD800 <= upper < 0xE000):
+        return Book.title.startswith(prefix, autoescape=True)
+    return and_(Book.title >= prefix, Book.title < prefix[:-1] + chr(upper))
+
+# Translate the filter query parameters into SQL conditions
+def get_book_filters(args):
+    filters = []
+    author_id = get_int_arg(args, 'author_id')
+    if author_id is not None:
+        filters.append(Book.author_id == author_id)
+    year_min = get_int_arg(args, 'year_min')
+    if year_min is not None:
+        filters.append(Book.year >= year_min)
+    year_max = get_int_arg(args, 'year_max')
+    if year_max is not None:
+        filters.append(Book.year <= year_max)
+    title_prefix = args.get('title_prefix')
+    if title_prefix is not None and not isinstance(title_prefix, str):
+        raise ValueError("title_prefix must be a string.")
+    if title_prefix:
+        filters.append(title_prefix_clause(title_prefix))
+    return filters
+
+def get_book_sort(args):
+    sort = args.get('sort') or 'id'
+    descending = sort.startswith('-')
+    field = sort[1:] if descending else sort
+    if field not in BOOK_SORT_FIELDS:
+        raise ValueError(f"sort must be one of: {', '.join(BOOK_SORT_FIELDS)} (prefix with - to reverse).")
+    return BOOK_SORT_FIELDS[field], descending
+
 # Handle OPTIONS requests globally for this blueprint
 @book_routes.route('/', methods=['OPTIONS'])
 @book_routes.route('/<int:id>', methods=['OPTIONS'])
@@ -69,6 +142,7 @@ def create_book():
         book_data = book_schema.load(data)
         book = Book(**book_data)
         db.session.add(book)
+        invalidate(BOOKS, AUTHORS)
         db.session.commit()
         result = book_schema.dump(book)
         return response_with(resp.SUCCESS_201, value={"book": result})
@@ -76,8 +150,130 @@ def create_book():
         print(f"Error creating book: {e}")
         return response_with(resp.INVALID_INPUT_422)
 
+# POST many books in one transaction
+@book_routes.route('/bulk', methods=['POST'])
+@jwt_required()
+def create_books_bulk():
+    """
+    Create books in bulk
+
+    ---
+    tags:
+      - Books
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: array
+          items:
+            type: object
+            required:
+              - title
+              - year
+              - author_id
+            properties:
+              title:
+                type: string
+                example: "Emma"
+              year:
+                type: integer
+                example: 1815
+              author_id:
+                type: integer
+                example: 1
+    responses:
+      201:
+        description: All books created; results holds the id of every item in request order
+        schema:
+          type: object
+          properties:
+            results:
+              type: array
+              items:
+                type: object
+      422:
+        description: Invalid payload or items; results holds the errors per item and nothing is created
+    """
+    try:
+        items = get_bulk_items(request.get_json(silent=True), current_app.config['BULK_MAX_ITEMS'])
+    except BulkPayloadError as e:
+        return response_with(resp.INVALID_INPUT_422, value={"error": str(e)})
+
+    try:
+        rows = BookSchema(many=True).load(items)
+        errors = {}
+    except ValidationError as err:
+        # valid_data keeps one (partial) entry per item, aligned with items
+        rows, errors = err.valid_data, err.messages
+
+    # One query per chunk of distinct author ids instead of one per book
+    chunk_size = current_app.config['BULK_CHUNK_SIZE']
+    author_ids = {row['author_id'] for row in rows if isinstance(row, dict) and 'author_id' in row}
+    existing = set()
+    for chunk in chunked(author_ids, chunk_size):
+        existing.update(db.session.execute(
+            db.select(Author.id).where(Author.id.in_(chunk))
+        ).scalars())
+    for i, row in enumerate(rows):
+        if isinstance(row, dict) and 'author_id' in row and row['author_id'] not in existing:
+            errors.setdefault(i, {})['author_id'] = ['Author not found.']
+    if errors:
+        return response_with(resp.INVALID_INPUT_422, value={"results": invalid_results(len(items), errors)})
+
+    rows = [{'title': row['title'], 'year': row['year'], 'author_id': row['author_id']} for row in rows]
+    ids = bulk_insert(Book, rows, chunk_size)
+    search.stage(db.session, BOOK, {id: row['title'] for id, row in zip(ids, rows)})
+    invalidate(BOOKS, AUTHORS)
+    db.session.commit()
+    return response_with(resp.SUCCESS_201, value={"results": created_results(ids)})
+
+# Ids targeted by a bulk request: either an explicit "ids" list or a
+# "filter" object using the GET /api/books/ filter parameters. Only the id
+# column is read, no ORM objects are loaded. Both are limited to
+# BULK_MAX_ITEMS books.
+def resolve_bulk_targets(data):
+    if not isinstance(data, dict) or ('ids' in data) == ('filter' in data):
+        raise BulkPayloadError("Send either an ids list or a filter object.")
+
+    chunk_size = current_app.config['BULK_CHUNK_SIZE']
+    max_items = current_app.config['BULK_MAX_ITEMS']
+    if 'ids' in data:
+        ids = get_bulk_items(data['ids'], max_items)
+        if not all(isinstance(id, int) and not isinstance(id, bool) for id in ids):
+            raise BulkPayloadError("ids must be a list of integers.")
+        existing = set()
+        for chunk in chunked(set(ids), chunk_size):
+            existing.update(db.session.execute(
+                db.select(Book.id).where(Book.id.in_(chunk))
+            ).scalars())
+        found = [id for id in dict.fromkeys(ids) if id in existing]
+        missing = [id for id in dict.fromkeys(ids) if id not in existing]
+        return found, missing
+
+    if not isinstance(data['filter'], dict):
+        raise BulkPayloadError("filter must be an object.")
+    try:
+        filters = get_book_filters(data['filter'])
+    except (TypeError, ValueError) as e:
+        raise BulkPayloadError(str(e))
+    if not filters:
+        raise BulkPayloadError("filter must contain at least one condition.")
+    ids = list(db.session.execute(
+        db.select(Book.id).where(*filters).order_by(Book.id).limit(max_items + 1)
+    ).scalars())
+    if len(ids) > max_items:
+        raise BulkPayloadError(f"filter matches more than {max_items} books; narrow it down.")
+    return ids, []
+
+def missing_errors(missing):
+    return [{'id': id, 'error': 'Book not found.'} for id in missing] or None
+
 # GET books endpoint
 @book_routes.route('/', methods=['GET'])
+@conditional_get(BOOKS)
 def get_book_list():
     """
     Get all books
@@ -85,13 +281,62 @@ def get_book_list():
     ---
     tags:
       - Books
-    summary: Retrieve a list of all books
+    summary: Retrieve a page of books, optionally filtered and sorted
+    parameters:
+      - in: query
+        name: author_id
+        type: integer
+        required: false
+        description: Only books by this author
+      - in: query
+        name: year_min
+        type: integer
+        required: false
+        description: Only books published in or after this year
+      - in: query
+        name: year_max
+        type: integer
+        required: false
+        description: Only books published in or before this year
+      - in: query
+        name: title_prefix
+        type: string
+        required: false
+        description: Only books whose title starts with this text (case-sensitive on SQLite)
+      - in: query
+        name: sort
+        type: string
+        enum: [id, -id, year, -year, title, -title]
+        default: id
+        required: false
+        description: Sort field, prefixed with - for descending order
+      - in: query
+        name: limit
+        type: integer
+        required: false
+        description: Maximum number of books to return
+      - in: query
+        name: after
+        type: string
+        required: false
+        description: Cursor returned as pagination.next by the previous page
     responses:
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       200:
         description: A list of books
         schema:
           type: object
           properties:
+            pagination:
+              type: object
+              properties:
+                limit:
+                  type: integer
+                  example: 50
+                next:
+                  type: string
+                  description: Cursor for the next page, null on the last page
             books:
               type: array
               items:
@@ -110,14 +355,60 @@ def get_book_list():
                     type: integer
                     example: 2
     """
-    fetched = Book.query.all()
-    book_schema = BookSchema(many=True, only=['id','title', 'year', 'author_id'])
-    books = book_schema.dump(fetched)
-    return response_with(resp.SUCCESS_200, value={"books": books})
+    try:
+        limit, after = get_page_args(request.args)
+        filters = get_book_filters(request.args)
+        sort, descending = get_book_sort(request.args)
+        query = Book.query.with_entities(*list_columns(Book, BOOK_LIST_FIELDS)).filter(*filters)
+        fetched, pagination = keyset_paginate(
+            query, Book.id, limit, after, sort=sort, descending=descending
+        )
+    except ValueError as e:
+        return response_with(resp.INVALID_INPUT_422, value={"error": str(e)})
+    books = dump_rows(fetched, BOOK_LIST_FIELDS)
+    return response_with(resp.SUCCESS_200, value={"books": books}, pagination=pagination)
+
+
+# Export all books as a stream
+@book_routes.route('/export', methods=['GET'])
+def export_books():
+    """
+    Export all books
+
+    ---
+    tags:
+      - Books
+    summary: Stream every book as NDJSON or CSV
+    produces:
+      - application/x-ndjson
+      - text/csv
+    parameters:
+      - in: query
+        name: format
+        type: string
+        enum: [ndjson, csv]
+        default: ndjson
+        required: false
+        description: Output format, one book per line
+    responses:
+      200:
+        description: A stream of books
+      422:
+        description: Unsupported export format
+    """
+    try:
+        return stream_export(
+            [Book.id, Book.title, Book.year, Book.author_id],
+            request.args.get('format', 'ndjson'),
+            'books'
+        )
+    except ExportFormatError as e:
+        return response_with(resp.INVALID_INPUT_422, value={"error": str(e)})
 
 
 # GET route to fetch a specific book using its ID
 @book_routes.route('/<int:id>/', methods=['GET'])
+@conditional_get(BOOKS, book_version)
 def get_book_detail(id):
     """
     Get book details by ID
@@ -132,6 +423,8 @@ def get_book_detail(id):
         type: integer
         description: ID of the book to retrieve
     responses:
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       200:
         description: Book details retrieved successfully
         schema:
@@ -143,7 +436,7 @@ def get_book_detail(id):
         description: Book not found
     """
     fetched = Book.query.get_or_404(id)
-    book_schema = BookSchema()
+    book_schema = dump_schema(BookSchema)
     book = book_schema.dump(fetched)
     return response_with(resp.SUCCESS_200, value={"book": book})
 
@@ -197,8 +490,9 @@ def update_book_detail(id):
     get_book.title = data.get('title')
     get_book.year = data.get('year')
     db.session.add(get_book)
+    invalidate(BOOKS, AUTHORS)
     db.session.commit()
-    book_schema = BookSchema()
+    book_schema = dump_schema(BookSchema)
     book = book_schema.dump(get_book)
     return response_with(resp.SUCCESS_200, value={"book": book})
 
@@ -250,11 +544,161 @@ def modify_book_detail(id):
     if 'year' in data:
         get_book.year = data.get('year')
     db.session.add(get_book)
+    invalidate(BOOKS, AUTHORS)
     db.session.commit()
-    book_schema = BookSchema()
+    book_schema = dump_schema(BookSchema)
     book = book_schema.dump(get_book)
     return response_with(resp.SUCCESS_200, value={"book": book})
 
+# PATCH many books with one set-based UPDATE per chunk of ids
+@book_routes.route('/bulk', methods=['PATCH'])
+@jwt_required()
+def modify_books_bulk():
+    """
+    Modify books in bulk
+
+    ---
+    tags:
+      - Books
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - set
+          properties:
+            ids:
+              type: array
+              items:
+                type: integer
+              example: [1, 2, 3]
+            filter:
+              type: object
+              description: Same conditions as the GET /api/books/ query parameters
+              properties:
+                author_id:
+                  type: integer
+                year_min:
+                  type: integer
+                year_max:
+                  type: integer
+                title_prefix:
+                  type: string
+            set:
+              type: object
+              properties:
+                title:
+                  type: string
+                year:
+                  type: integer
+                  example: 1816
+                author_id:
+                  type: integer
+    responses:
+      200:
+        description: Matched books updated; ids that do not exist are listed in errors
+        schema:
+          type: object
+          properties:
+            updated:
+              type: integer
+            errors:
+              type: array
+              items:
+                type: object
+      422:
+        description: Invalid payload
+    """
+    data = request.get_json(silent=True)
+    try:
+        ids, missing = resolve_bulk_targets(data)
+    except BulkPayloadError as e:
+        return response_with(resp.INVALID_INPUT_422, value={"error": str(e)})
+
+    if not isinstance(data.get('set'), dict) or not data['set']:
+        return response_with(resp.INVALID_INPUT_422, value={"error": "set must be a non-empty object."})
+    try:
+        values = BookSchema(only=['title', 'year', 'author_id'], partial=True).load(data['set'])
+    except ValidationError as err:
+        return response_with(resp.INVALID_INPUT_422, value={"error": "Invalid values."}, error=err.messages)
+    if 'author_id' in values and not db.session.get(Author, values['author_id']):
+        return response_with(resp.INVALID_INPUT_422, value={"error": "Author not found."})
+
+    for chunk in chunked(ids, current_app.config['BULK_CHUNK_SIZE']):
+        db.session.execute(update(Book.__table__).where(Book.id.in_(chunk)).values(**values))
+    if 'title' in values:
+        search.stage(db.session, BOOK, dict.fromkeys(ids, values['title']))
+    invalidate(BOOKS, AUTHORS)
+    db.session.commit()
+    return response_with(resp.SUCCESS_200, value={"updated": len(ids)}, error=missing_errors(missing))
+
+# DELETE many books with one set-based DELETE per chunk of ids
+@book_routes.route('/bulk', methods=['DELETE'])
+@jwt_required()
+def delete_books_bulk():
+    """
+    Delete books in bulk
+
+    ---
+    tags:
+      - Books
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          properties:
+            ids:
+              type: array
+              items:
+                type: integer
+              example: [1, 2, 3]
+            filter:
+              type: object
+              description: Same conditions as the GET /api/books/ query parameters
+              properties:
+                author_id:
+                  type: integer
+                year_min:
+                  type: integer
+                year_max:
+                  type: integer
+                title_prefix:
+                  type: string
+    responses:
+      200:
+        description: Matched books deleted; ids that do not exist are listed in errors
+        schema:
+          type: object
+          properties:
+            deleted:
+              type: integer
+            errors:
+              type: array
+              items:
+                type: object
+      422:
+        description: Invalid payload
+    """
+    try:
+        ids, missing = resolve_bulk_targets(request.get_json(silent=True))
+    except BulkPayloadError as e:
+        return response_with(resp.INVALID_INPUT_422, value={"error": str(e)})
+
+    for chunk in chunked(ids, current_app.config['BULK_CHUNK_SIZE']):
+        db.session.execute(delete(Book.__table__).where(Book.id.in_(chunk)))
+    search.stage(db.session, BOOK, dict.fromkeys(ids))
+    invalidate(BOOKS, AUTHORS)
+    db.session.commit()
+    return response_with(resp.SUCCESS_200, value={"deleted": len(ids)}, error=missing_errors(missing))
+
 # DELETE books endpoint
 @book_routes.route('/<int:id>/', methods=['DELETE'])
 @jwt_required()
@@ -281,6 +725,7 @@ def delete_book(id):
     """
     get_book = Book.query.get_or_404(id)
     db.session.delete(get_book)
+    invalidate(BOOKS, AUTHORS)
     db.session.commit()
     return response_with(resp.SUCCESS_204)
 
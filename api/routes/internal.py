@@ -0,0 +1,53 @@
+import hmac
+
+from flask import Blueprint, abort, current_app, request
+
+from api.utils.responses import response_with
+from api.utils import responses as resp
+from api.utils.pool_metrics import pool_metrics
+
+internal_routes = Blueprint("internal_routes", __name__)
+
+# Internal endpoints need "Authorization: Bearer <INTERNAL_METRICS_TOKEN>"
+# and do not exist while no token is configured
+@internal_routes.before_request
+def require_internal_token():
+    token = current_app.config.get('INTERNAL_METRICS_TOKEN')
+    if not token:
+        abort(404)
+    scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(given.encode(), token.encode()):
+        return response_with(resp.UNAUTHORIZED_401)
+
+# Connection pool state of the worker process that answers the request
+@internal_routes.route('/pool', methods=['GET'])
+def pool_stats():
+    """
+    Database connection pool statistics
+
+    ---
+    tags:
+      - Internal
+    summary: Live connection pool state and counters of the answering worker process
+    parameters:
+      - in: header
+        name: Authorization
+        type: string
+        required: true
+        description: Bearer INTERNAL_METRICS_TOKEN
+    responses:
+      200:
+        description: Pool state by bind key
+        schema:
+          type: object
+          properties:
+            pid:
+              type: integer
+            pools:
+              type: object
+      401:
+        description: Missing or wrong token
+      404:
+        description: No INTERNAL_METRICS_TOKEN configured
+    """
+    return response_with(resp.SUCCESS_200, value=pool_metrics.snapshot())
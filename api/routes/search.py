@@ -0,0 +1,96 @@
+from flask import Blueprint, current_app, request
+
+from api.utils.responses import response_with
+from api.utils import responses as resp
+from api.utils.replicas import use_primary
+from api.utils.search import AUTHOR, BOOK, SearchIndexMissing, search
+from api.models.authors import Author, AuthorSchema
+from api.models.books import Book, BookSchema
+from api.models.serializers import AUTHOR_LIST_FIELDS, BOOK_LIST_FIELDS, dump_schema
+
+search_routes = Blueprint("search_routes", __name__)
+
+# Search authors and books by words in their names and titles. Runs on the
+# primary, where the search index is created and kept up to date.
+@search_routes.route('', methods=['GET'])
+@use_primary
+def search_catalog():
+    """
+    Search authors and books
+
+    ---
+    tags:
+      - Search
+    summary: Full-text search over book titles and author names, best match first
+    parameters:
+      - in: query
+        name: q
+        type: string
+        required: true
+        description: Words to search for; the last word also matches as a prefix
+      - in: query
+        name: limit
+        type: integer
+        required: false
+        description: Maximum number of results to return
+    responses:
+      200:
+        description: Ranked search results
+        schema:
+          type: object
+          properties:
+            results:
+              type: array
+              items:
+                type: object
+                properties:
+                  type:
+                    type: string
+                    enum: [author, book]
+                  id:
+                    type: integer
+                    example: 1
+                  score:
+                    type: number
+                    example: 2.5
+      422:
+        description: Missing query or invalid limit
+      503:
+        description: The search index has not been built yet
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return response_with(resp.INVALID_INPUT_422, value={"error": "q is required."})
+    try:
+        limit = int(request.args.get('limit', current_app.config['SEARCH_DEFAULT_LIMIT']))
+    except ValueError:
+        return response_with(resp.INVALID_INPUT_422, value={"error": "limit must be an integer."})
+    if limit < 1:
+        return response_with(resp.INVALID_INPUT_422, value={"error": "limit must be greater than 0."})
+    limit = min(limit, current_app.config['SEARCH_MAX_LIMIT'])
+
+    try:
+        hits = search.search(query, limit)
+    except SearchIndexMissing as e:
+        return response_with(resp.SERVICE_UNAVAILABLE_503, value={"error": str(e)})
+
+    # Load the matched rows with one query per kind; rows deleted since they
+    # were indexed are skipped
+    author_ids = [id for kind, id, score in hits if kind == AUTHOR]
+    book_ids = [id for kind, id, score in hits if kind == BOOK]
+    rows = {}
+    if author_ids:
+        author_schema = dump_schema(AuthorSchema, only=AUTHOR_LIST_FIELDS + ('avatar_variants',))
+        for author in Author.query.filter(Author.id.in_(author_ids)):
+            rows[(AUTHOR, author.id)] = author_schema.dump(author)
+    if book_ids:
+        book_schema = dump_schema(BookSchema, only=BOOK_LIST_FIELDS)
+        for book in Book.query.filter(Book.id.in_(book_ids)):
+            rows[(BOOK, book.id)] = book_schema.dump(book)
+
+    results = []
+    for kind, id, score in hits:
+        row = rows.get((kind, id))
+        if row is not None:
+            results.append(dict(row, type=kind, score=round(score, 6)))
+    return response_with(resp.SUCCESS_200, value={"results": results})
@@ -1,18 +1,33 @@
-from flask import Blueprint, request, url_for, render_template_string
+from flask import Blueprint, request, url_for
 from flask_jwt_extended import create_access_token
 import logging
+from sqlalchemy.exc import IntegrityError
 
 from api.utils.responses import response_with
 from api.utils import responses as resp
 from api.utils.database import db
 from api.utils.token import generate_verification_token, confirm_verification_token
-from api.utils.email import send_email
+from api.utils.email import send_email, render_email
+from api.utils.passwords import PasswordHasherBusy
+from api.utils.ratelimit import limiter
+from api.utils.replicas import use_primary
 from api.models.users import User, UserSchema
 
 user_routes = Blueprint("user_routes", __name__)
 
+# Seconds a client is asked to wait when the password hashing pool is full
+HASH_RETRY_AFTER = 1
+
+def hashing_busy():
+    return response_with(
+        resp.SERVICE_UNAVAILABLE_503,
+        value={"error": "Too many sign-ins in progress, try again shortly."},
+        headers={'Retry-After': str(HASH_RETRY_AFTER)}
+    )
+
 # POST user route to create a new user
 @user_routes.route('/', methods=['POST'])
+@limiter.limit('signup')
 def create_user():
 
     """
@@ -59,6 +74,10 @@ def create_user():
           properties:
             error:
               type: string
+      429:
+        description: Too many attempts from this address or for this email; retry after the Retry-After delay
+      503:
+        description: Password hashing is at capacity; retry after the Retry-After delay
     """
 
     try:
@@ -68,26 +87,23 @@ def create_user():
         if not data or 'username' not in data or 'password' not in data or 'email' not in data:
             return response_with(resp.INVALID_INPUT_422, value={"error": "Username, email, and password are required."})
 
-        # Check for existing user
-        if User.find_by_email(data['email']) or User.find_by_username(data['username']):
-            return response_with(resp.INVALID_INPUT_422, value={"error": "Email or username already exists."})
-
         # Hash the password
         data['password'] = User.generate_hash(data['password'])
 
-        # Load and create user
+        # Load and create user; the unique email and username columns reject
+        # duplicates, including concurrent signups for the same account
         user_schema = UserSchema()
         user = user_schema.load(data)
-        user.create()
+        try:
+            user.create()
+        except IntegrityError:
+            db.session.rollback()
+            return response_with(resp.INVALID_INPUT_422, value={"error": "Email or username already exists."})
 
         # Generate verification token and email
         token = generate_verification_token(data['email'])
         verification_email = url_for('user_routes.verify_email', token=token, _external=True)
-        html = render_template_string(
-            "<p>Welcome! Thanks for signing up. Please follow this link to activate your account:</p>"
-            "<p><a href='{{ verification_email }}'>{{ verification_email }}</a></p><br><p>Thanks!</p>",
-            verification_email=verification_email
-        )
+        html = render_email('verification', verification_email=verification_email)
         subject = "Please Verify Your Email"
         send_email(user.email, subject, html)
 
@@ -95,12 +111,15 @@ def create_user():
         result = user_schema.dump(user)
         return response_with(resp.SUCCESS_201, value={"user": result})
 
+    except PasswordHasherBusy:
+        return hashing_busy()
     except Exception as e:
         logging.exception("Error creating user")
         return response_with(resp.INVALID_INPUT_422, value={"error": str(e)})
     
 # Create a login route for the signed up users to login
 @user_routes.route('/login', methods=['POST'])
+@limiter.limit('login')
 def authenticate_user():
     """
     User Login
@@ -175,15 +194,19 @@ def authenticate_user():
             error:
               type: string
               example: "Email or username is required."
+      429:
+        description: Too many attempts from this address or for this account; retry after the Retry-After delay
+      503:
+        description: Password hashing is at capacity; retry after the Retry-After delay
     """
  
     try:
         data = request.get_json()
 
         if data.get('email'):
-            current_user = User.find_by_email(data['email'])
+            current_user = User.get_identity(email=data['email'])
         elif data.get('username'):
-            current_user = User.find_by_username(data['username'])
+            current_user = User.get_identity(username=data['username'])
         else:
             return response_with(resp.INVALID_INPUT_422, value={"error": "Email or username is required."})
 
@@ -194,6 +217,12 @@ def authenticate_user():
             return response_with(resp.BAD_REQUEST_400, value={"error": "Email not verified."})
 
         if User.verify_hash(data['password'], current_user.password):
+            # Upgrade hashes made with older rounds; a full pool only
+            # postpones this to a later login
+            try:
+                User.rehash_if_needed(current_user, data['password'])
+            except PasswordHasherBusy:
+                pass
             access_token = create_access_token(identity=current_user.username)
             return response_with(
                 resp.SUCCESS_201,
@@ -205,12 +234,15 @@ def authenticate_user():
         else:
             return response_with(resp.UNAUTHORIZED_401, value={"error": "Invalid password."})
 
+    except PasswordHasherBusy:
+        return hashing_busy()
     except Exception as e:
         logging.exception("Login error")
         return response_with(resp.INVALID_INPUT_422, value={"error": str(e)})
 
 # GET endpoint to handle email validation
 @user_routes.route('/confirm/<token>', methods=['GET'])
+@use_primary
 def verify_email(token):
     """
     Verify Email
@@ -267,7 +299,7 @@ def verify_email(token):
         return response_with(resp.UNAUTHORIZED_401, value={"error": "Invalid or expired verification link."})
 
 
-    user = User.query.filter_by(email=email).first()
+    user = User.find_by_identity(email=email)
     if not user:
         logging.warning(f"No user found for verified email: {email}")
         return response_with(resp.SERVER_ERROR_404, value={"error": "User not found."})
@@ -279,6 +311,7 @@ def verify_email(token):
 
     user.isVerified = True
     db.session.commit()
+    User.forget_identity(user)
     logging.info(f"Email successfully verified for user: {user.email}")
     return response_with(resp.SUCCESS_200, value={"message": "Email successfully verified."})
 
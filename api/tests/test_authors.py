@@ -1,12 +1,15 @@
 import json
+import shutil
+import tempfile
 import unittest
 import io
 from flask_jwt_extended import create_access_token
 
-from api.utils.test_base import BaseTestCase
+from api.utils.test_base import BaseTestCase, count_queries
 from api.models.authors import Author
 from api.models.books import Book
 from api.utils.database import db
+from api.utils.thumbnails import thumbnails
 from api.config.config import TestingConfig
 from main import create_app
 
@@ -15,7 +18,12 @@ def login():
 
 class TestAuthors(BaseTestCase):
     def setUp(self):
-        self.app = create_app(TestingConfig)
+        self.upload_folder = tempfile.mkdtemp()
+
+        class AuthorsConfig(TestingConfig):
+            UPLOAD_FOLDER = self.upload_folder
+
+        self.app = create_app(AuthorsConfig)
         self.app_context = self.app.app_context()
         self.app_context.push()
         self.client = self.app.test_client()
@@ -24,10 +32,12 @@ class TestAuthors(BaseTestCase):
         self.seed_authors_and_books()
 
     def tearDown(self):
+        thumbnails.shutdown()
         db.session.remove()
         db.drop_all()
         db.engine.dispose()
         self.app_context.pop()
+        shutil.rmtree(self.upload_folder)
 
     def seed_authors_and_books(self):
         self.author1 = Author(first_name="John", last_name="Doe").create()
@@ -93,12 +103,88 @@ class TestAuthors(BaseTestCase):
         )
         self.assertEqual(422, response.status_code)
 
+    def test_create_authors_bulk(self):
+        token = login()
+        authors = [{'first_name': f'Bulk{i}', 'last_name': 'Author'} for i in range(5)]
+        response = self.client.post(
+            '/api/authors/bulk',
+            data=json.dumps(authors),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        data = json.loads(response.data)
+        self.assertEqual(201, response.status_code)
+        ids = [item['id'] for item in data['results']]
+        self.assertEqual(
+            [f'Bulk{i}' for i in range(5)],
+            [db.session.get(Author, id).first_name for id in ids]
+        )
+
+    def test_create_authors_bulk_invalid_item(self):
+        token = login()
+        authors = [{'first_name': 'Ok', 'last_name': 'Author'}, {'first_name': 'Missing'}]
+        response = self.client.post(
+            '/api/authors/bulk',
+            data=json.dumps(authors),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        data = json.loads(response.data)
+        self.assertEqual(422, response.status_code)
+        self.assertEqual(['valid', 'invalid'], [item['status'] for item in data['results']])
+        self.assertIn('last_name', data['results'][1]['errors'])
+        self.assertEqual(2, Author.query.count())
+
     def test_get_authors(self):
         response = self.client.get('/api/authors/')
         data = json.loads(response.data)
         self.assertEqual(200, response.status_code)
         self.assertIn('authors', data)
 
+    def test_get_authors_paginated(self):
+        response = self.client.get('/api/authors/?limit=1')
+        data = json.loads(response.data)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([self.author1.id], [a['id'] for a in data['authors']])
+        self.assertIsNotNone(data['pagination']['next'])
+
+        response = self.client.get(f"/api/authors/?limit=1&after={data['pagination']['next']}")
+        data = json.loads(response.data)
+        self.assertEqual([self.author2.id], [a['id'] for a in data['authors']])
+        self.assertIsNone(data['pagination']['next'])
+
+    def test_get_authors_invalid_cursor(self):
+        response = self.client.get('/api/authors/?after=not-a-cursor')
+        self.assertEqual(422, response.status_code)
+
+    def test_get_authors_query_count(self):
+        with count_queries() as statements:
+            self.client.get('/api/authors/')
+        baseline = len(statements)
+
+        for i in range(10):
+            author = Author(first_name=f"Author{i}", last_name="Doe").create()
+            Book(title=f"Book {i}", year=2000 + i, author_id=author.id).create()
+        db.session.expunge_all()
+
+        with count_queries() as statements:
+            response = self.client.get('/api/authors/')
+        data = json.loads(response.data)
+        self.assertEqual(12, len(data['authors']))
+        self.assertEqual(baseline, len(statements))
+        # ETag version lookup, authors page, books of the page
+        self.assertLessEqual(len(statements), 3)
+
+    def test_get_author_detail_query_count(self):
+        author_id = self.author1.id
+        db.session.expunge_all()
+        with count_queries() as statements:
+            response = self.client.get(f'/api/authors/{author_id}/')
+        data = json.loads(response.data)
+        self.assertEqual(2, len(data['author']['books']))
+        # ETag version lookup, author joined with its books
+        self.assertEqual(2, len(statements))
+
     def test_get_author_detail(self):
         response = self.client.get(f'/api/authors/{self.author2.id}/')
         data = json.loads(response.data)
@@ -124,6 +210,51 @@ class TestAuthors(BaseTestCase):
         )
         self.assertEqual(204, response.status_code)
 
+    def test_get_author_not_modified(self):
+        response = self.client.get(f'/api/authors/{self.author1.id}/')
+        etag = response.headers['ETag']
+        response = self.client.get(f'/api/authors/{self.author1.id}/', headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b'', response.data)
+
+        other = self.client.get(f'/api/authors/{self.author2.id}/')
+        self.assertNotEqual(etag, other.headers['ETag'])
+
+    def test_author_etag_invalidated_by_writes(self):
+        response = self.client.get('/api/authors/')
+        etag = response.headers['ETag']
+        token = login()
+        self.client.post(
+            '/api/books/',
+            data=json.dumps({'title': 'New Book', 'year': 2001, 'author_id': self.author1.id}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        response = self.client.get('/api/authors/', headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers['ETag'])
+
+    def test_author_detail_etag_follows_its_own_rows(self):
+        url = f'/api/authors/{self.author1.id}/'
+        etag = self.client.get(url).headers['ETag']
+        token = login()
+        self.client.put(
+            f'/api/authors/{self.author2.id}/',
+            data=json.dumps({'first_name': 'Joseph', 'last_name': 'Doe'}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(304, self.client.get(url, headers={'If-None-Match': etag}).status_code)
+
+        book = Book.query.filter_by(author_id=self.author1.id).first()
+        self.client.patch(
+            f'/api/books/{book.id}/',
+            data=json.dumps({'year': 2000}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(200, self.client.get(url, headers={'If-None-Match': etag}).status_code)
+
     # ---------- Book Tests ----------
 
     def test_create_book(self):
@@ -167,12 +298,222 @@ class TestAuthors(BaseTestCase):
         )
         self.assertEqual(401, response.status_code)
 
+    def test_create_books_bulk(self):
+        token = login()
+        books = [
+            {'title': f'Bulk Book {i}', 'year': 1900 + i, 'author_id': self.author1.id}
+            for i in range(25)
+        ]
+        response = self.client.post(
+            '/api/books/bulk',
+            data=json.dumps(books),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        data = json.loads(response.data)
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(list(range(25)), [item['index'] for item in data['results']])
+        for item in data['results']:
+            self.assertEqual(f"Bulk Book {item['index']}", db.session.get(Book, item['id']).title)
+
+    def test_create_books_bulk_unknown_author(self):
+        token = login()
+        books = [
+            {'title': 'Good', 'year': 2000, 'author_id': self.author1.id},
+            {'title': 'Orphan', 'year': 2000, 'author_id': 9999},
+            {'title': 'No year', 'author_id': self.author1.id},
+        ]
+        response = self.client.post(
+            '/api/books/bulk',
+            data=json.dumps(books),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        data = json.loads(response.data)
+        self.assertEqual(422, response.status_code)
+        self.assertEqual(['valid', 'invalid', 'invalid'], [item['status'] for item in data['results']])
+        self.assertEqual(4, Book.query.count())
+
+    def test_create_books_bulk_not_a_list(self):
+        token = login()
+        response = self.client.post(
+            '/api/books/bulk',
+            data=json.dumps({'title': 'Emma'}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(422, response.status_code)
+
+    def test_modify_books_bulk_by_ids(self):
+        token = login()
+        ids = [b.id for b in Book.query.filter_by(author_id=self.author1.id)]
+        response = self.client.patch(
+            '/api/books/bulk',
+            data=json.dumps({'ids': ids + [9999], 'set': {'year': 2020}}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        data = json.loads(response.data)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, data['updated'])
+        self.assertEqual([{'id': 9999, 'error': 'Book not found.'}], data['errors'])
+        db.session.expire_all()
+        self.assertEqual({2020}, {db.session.get(Book, id).year for id in ids})
+        self.assertEqual(2, Book.query.filter(Book.year != 2020).count())
+
+    def test_modify_books_bulk_invalid_values(self):
+        token = login()
+        response = self.client.patch(
+            '/api/books/bulk',
+            data=json.dumps({'filter': {'year_min': 1990}, 'set': {'year': 'soon'}}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(422, response.status_code)
+
+    def test_delete_books_bulk_by_filter(self):
+        token = login()
+        response = self.client.delete(
+            '/api/books/bulk',
+            data=json.dumps({'filter': {'year_min': 1990}}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        data = json.loads(response.data)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, data['deleted'])
+        self.assertNotIn('errors', data)
+        self.assertEqual(['Test Book 1', 'Test Book 3'], sorted(b.title for b in Book.query))
+
+    def test_delete_books_bulk_requires_condition(self):
+        token = login()
+        for body in ({'filter': {}}, {}, {'ids': [1], 'filter': {'author_id': 1}}):
+            response = self.client.delete(
+                '/api/books/bulk',
+                data=json.dumps(body),
+                content_type='application/json',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+            self.assertEqual(422, response.status_code)
+        self.assertEqual(4, Book.query.count())
+
+    def test_delete_books_bulk_rejects_loose_filter_values(self):
+        token = login()
+        for condition in ({'author_id': [self.author1.id]}, {'author_id': float(self.author1.id) + 0.9},
+                          {'author_id': True}, {'year_min': {}}, {'title_prefix': ['Test']}):
+            response = self.client.delete(
+                '/api/books/bulk',
+                data=json.dumps({'filter': condition}),
+                content_type='application/json',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+            self.assertEqual(422, response.status_code, condition)
+        self.assertEqual(4, Book.query.count())
+
+    def test_delete_books_bulk_filter_is_capped(self):
+        self.app.config['BULK_MAX_ITEMS'] = 3
+        response = self.client.delete(
+            '/api/books/bulk',
+            data=json.dumps({'filter': {'year_min': 0}}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {login()}'}
+        )
+        self.assertEqual(422, response.status_code)
+        self.assertEqual(4, Book.query.count())
+
     def test_get_books(self):
         response = self.client.get('/api/books/')
         data = json.loads(response.data)
         self.assertEqual(200, response.status_code)
         self.assertIn('books', data)
 
+    def test_get_books_paginated(self):
+        seen = []
+        url = '/api/books/?limit=3'
+        while url:
+            response = self.client.get(url)
+            data = json.loads(response.data)
+            self.assertEqual(200, response.status_code)
+            self.assertLessEqual(len(data['books']), 3)
+            seen.extend(book['id'] for book in data['books'])
+            cursor = data['pagination']['next']
+            url = f'/api/books/?limit=3&after={cursor}' if cursor else None
+        self.assertEqual(sorted(b.id for b in Book.query.all()), seen)
+
+    def test_get_books_invalid_limit(self):
+        response = self.client.get('/api/books/?limit=0')
+        self.assertEqual(422, response.status_code)
+
+    def test_get_books_filtered(self):
+        response = self.client.get(
+            f'/api/books/?author_id={self.author1.id}&year_min=1980&title_prefix=Test%20Book'
+        )
+        data = json.loads(response.data)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['Test Book 2'], [b['title'] for b in data['books']])
+
+    def test_get_books_sorted_across_pages(self):
+        Book(title="Undated", year=None, author_id=self.author1.id).create()
+        for sort in ('year', '-year', 'title', '-title', '-id'):
+            expected = [b.id for b in Book.query.order_by(
+                *[getattr(Book, sort.lstrip('-')).desc() if sort.startswith('-')
+                  else getattr(Book, sort).asc(),
+                  Book.id.desc() if sort.startswith('-') else Book.id.asc()]
+            ).all()]
+            seen = []
+            url = f'/api/books/?limit=2&sort={sort}'
+            while url:
+                data = json.loads(self.client.get(url).data)
+                seen.extend(b['id'] for b in data['books'])
+                cursor = data['pagination']['next']
+                url = f'/api/books/?limit=2&sort={sort}&after={cursor}' if cursor else None
+            self.assertEqual(expected, seen, sort)
+
+    def test_get_books_invalid_filter(self):
+        self.assertEqual(422, self.client.get('/api/books/?year_min=abc').status_code)
+        self.assertEqual(422, self.client.get('/api/books/?sort=author').status_code)
+
+    def test_book_filters_use_index(self):
+        plan = db.session.execute(db.text(
+            "EXPLAIN QUERY PLAN SELECT id FROM books WHERE author_id = 1 AND year >= 1980"
+        )).fetchall()
+        self.assertIn('ix_books_author_id_year', ' '.join(str(row[-1]) for row in plan))
+
+    def test_export_books_ndjson(self):
+        response = self.client.get('/api/books/export')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('application/x-ndjson', response.mimetype)
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(4, len(rows))
+        self.assertEqual({'id', 'title', 'year', 'author_id'}, set(rows[0]))
+
+    def test_export_authors_csv(self):
+        response = self.client.get('/api/authors/export?format=csv')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('text/csv', response.mimetype)
+        lines = response.data.decode().splitlines()
+        self.assertEqual('id,first_name,last_name,created,avatar', lines[0])
+        self.assertEqual(3, len(lines))
+
+    def test_export_invalid_format(self):
+        response = self.client.get('/api/books/export?format=xml')
+        self.assertEqual(422, response.status_code)
+
+    def test_get_books_not_modified_until_update(self):
+        url = '/api/books/?limit=2'
+        etag = self.client.get(url).headers['ETag']
+        self.assertEqual(304, self.client.get(url, headers={'If-None-Match': etag}).status_code)
+
+        token = login()
+        book = Book.query.first()
+        self.client.patch(
+            f'/api/books/{book.id}/',
+            data=json.dumps({'year': 2000}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(200, self.client.get(url, headers={'If-None-Match': etag}).status_code)
+
     def test_get_book_details(self):
         book = Book(title='Alice', year=1982, author_id=self.author2.id).create()
         response = self.client.get(f'/api/books/{book.id}/')
@@ -0,0 +1,319 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from flask_jwt_extended import create_access_token
+
+from api.utils.test_base import BaseTestCase
+from api.models.authors import Author
+from api.models.avatars import AvatarFile
+from api.utils.thumbnails import thumbnails
+from api.utils.avatar_gc import collect_avatars
+from api.utils.storage import get_storage
+from api.utils.database import db
+from api.config.config import TestingConfig
+from main import create_app
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+def login():
+    return create_access_token(identity='kunal.relan@hotmail.com')
+
+class TestAvatars(BaseTestCase):
+    storage = 'local'
+
+    def setUp(self):
+        self.upload_folder = tempfile.mkdtemp()
+
+        class AvatarConfig(TestingConfig):
+            UPLOAD_FOLDER = self.upload_folder
+            AVATAR_STORAGE = self.storage
+            AVATAR_MAX_BYTES = 4096
+            AVATAR_CHUNK_SIZE = 1024
+            AVATAR_VARIANT_SIZES = (48, 96)
+
+        self.app = create_app(AvatarConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+
+        db.create_all()
+        self.author = Author(first_name="Jane", last_name="Austen").create()
+        self.other = Author(first_name="Leo", last_name="Tolstoy").create()
+
+    def tearDown(self):
+        thumbnails.shutdown()
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+        shutil.rmtree(self.upload_folder)
+
+    def upload(self, author_id, content, name='avatar.jpg'):
+        return self.client.post(
+            f'/api/authors/avatar/{author_id}/',
+            data=dict(avatar=(io.BytesIO(content), name)),
+            content_type='multipart/form-data',
+            headers={'Authorization': f'Bearer {login()}'}
+        )
+
+    def delete_avatar(self, author_id):
+        return self.client.delete(
+            f'/api/authors/avatar/{author_id}',
+            headers={'Authorization': f'Bearer {login()}'}
+        )
+
+    def stored_files(self):
+        return sorted(stored.name for batch in get_storage().scan(100) for stored in batch)
+
+    # Run the GC without a grace period, waiting for thumbnails first
+    def collect(self):
+        thumbnails.shutdown()
+        return collect_avatars(get_storage(), grace_period=0)
+
+    def require_local_storage(self):
+        if self.storage != 'local':
+            self.skipTest("needs files on disk")
+
+    def test_identical_uploads_share_a_file(self):
+        content = b'x' * 3000
+        first = json.loads(self.upload(self.author.id, content).data)['author']['avatar']
+        second = json.loads(self.upload(self.other.id, content, 'copy.jpeg').data)['author']['avatar']
+        self.assertEqual(first, second)
+        self.assertEqual(1, len(self.stored_files()))
+        filename = self.stored_files()[0]
+        self.assertEqual(2, db.session.get(AvatarFile, filename).refcount)
+
+        self.assertEqual(200, self.delete_avatar(self.author.id).status_code)
+        self.collect()
+        self.assertEqual([filename], self.stored_files())
+        self.assertEqual(200, self.delete_avatar(self.other.id).status_code)
+        self.assertIsNone(db.session.get(AvatarFile, filename))
+        # Left to the GC, which keeps it for the grace period
+        self.assertEqual([filename], self.stored_files())
+        self.assertEqual(1, collect_avatars(get_storage(), grace_period=3600)['recent'])
+        self.collect()
+        self.assertEqual([], self.stored_files())
+
+    def test_replacing_an_avatar_releases_the_old_file(self):
+        self.upload(self.author.id, b'first')
+        self.upload(self.author.id, b'second', 'avatar.png')
+        self.collect()
+        self.assertEqual(1, len(self.stored_files()))
+        self.assertTrue(self.stored_files()[0].endswith('.png'))
+
+    def test_deleting_the_author_releases_the_file(self):
+        self.upload(self.author.id, b'first')
+        response = self.client.delete(
+            f'/api/authors/{self.author.id}/',
+            headers={'Authorization': f'Bearer {login()}'}
+        )
+        self.assertEqual(204, response.status_code)
+        self.collect()
+        self.assertEqual([], self.stored_files())
+
+    def test_upload_over_the_size_cap(self):
+        self.assertEqual(413, self.upload(self.author.id, b'x' * 4097).status_code)
+        self.assertEqual(413, self.upload(self.author.id, b'x' * 100000).status_code)
+        self.assertEqual([], self.stored_files())
+        self.assertIsNone(db.session.get(Author, self.author.id).avatar)
+
+    def test_upload_for_missing_author(self):
+        self.assertEqual(404, self.upload(12345, b'x').status_code)
+        self.assertEqual([], self.stored_files())
+
+    def test_variant_urls(self):
+        self.upload(self.author.id, b'first')
+        author = json.loads(self.client.get(f'/api/authors/{self.author.id}/').data)['author']
+        self.assertEqual({'48': author['avatar'] + '?size=48', '96': author['avatar'] + '?size=96'},
+                         author['avatar_variants'])
+        listed = json.loads(self.client.get('/api/authors/').data)['authors']
+        self.assertEqual(author['avatar_variants'], listed[0]['avatar_variants'])
+        self.assertIsNone(listed[1]['avatar_variants'])
+
+    @unittest.skipUnless(Image, "Pillow is not installed")
+    def test_variants_are_generated_and_served(self):
+        image = io.BytesIO()
+        Image.new('RGB', (300, 200), 'red').save(image, 'PNG')
+        original = image.getvalue()
+        url = json.loads(self.upload(self.author.id, original, 'avatar.png').data)['author']['avatar']
+        path = url.split('localhost', 1)[1]
+        thumbnails.shutdown()
+        self.assertEqual(3, len(self.stored_files()))
+
+        def fetch(size):
+            response = self.client.get(f'{path}?size={size}')
+            self.assertEqual(200, response.status_code)
+            data = response.data
+            response.close()
+            return data
+
+        self.assertEqual((48, 48), Image.open(io.BytesIO(fetch(40))).size)
+        self.assertEqual((96, 96), Image.open(io.BytesIO(fetch(96))).size)
+        # Larger than every variant
+        self.assertEqual(original, fetch(500))
+
+        # A missing variant falls back to the original and is generated again
+        variant = [name for name in self.stored_files() if name.endswith('-48.png')][0]
+        get_storage().delete(variant)
+        self.assertEqual(original, fetch(48))
+        thumbnails.shutdown()
+        self.assertEqual((48, 48), Image.open(io.BytesIO(fetch(48))).size)
+
+        self.assertEqual(200, self.delete_avatar(self.author.id).status_code)
+        self.collect()
+        self.assertEqual([], self.stored_files())
+
+    def test_serving_is_cacheable(self):
+        url = json.loads(self.upload(self.author.id, b'0123456789').data)['author']['avatar']
+        path = url.split('localhost', 1)[1]
+        response = self.client.get(path)
+        self.assertEqual(b'0123456789', response.data)
+        self.assertEqual('public, max-age=31536000, immutable', response.headers['Cache-Control'])
+        etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+        response.close()
+
+        response = self.client.get(path, headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        response = self.client.get(path, headers={'If-Modified-Since': last_modified})
+        self.assertEqual(304, response.status_code)
+
+        response = self.client.get(path, headers={'Range': 'bytes=2-5'})
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(b'2345', response.data)
+        response.close()
+
+        # Same file through the app-level route
+        response = self.client.get('/avatar/' + path.rsplit('/', 1)[1])
+        self.assertEqual(b'0123456789', response.data)
+        response.close()
+
+    def test_thumbnail_fallback_is_cached_briefly(self):
+        url = json.loads(self.upload(self.author.id, b'not an image').data)['author']['avatar']
+        response = self.client.get(url.split('localhost', 1)[1] + '?size=48')
+        self.assertEqual(b'not an image', response.data)
+        self.assertEqual('public, max-age=60', response.headers['Cache-Control'])
+        response.close()
+
+    def test_x_accel_redirect(self):
+        self.require_local_storage()
+        self.app.config['AVATAR_SEND_MODE'] = 'x-accel'
+        url = json.loads(self.upload(self.author.id, b'0123456789').data)['author']['avatar']
+        filename = url.rsplit('/', 1)[1]
+        response = self.client.get(f'/api/authors/uploads/{filename}')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b'', response.data)
+        relative = get_storage().relative_path(filename)
+        self.assertEqual(f'/protected-avatars/{relative}', response.headers['X-Accel-Redirect'])
+        self.assertEqual('image/jpeg', response.headers['Content-Type'])
+        self.assertEqual(404, self.client.get('/api/authors/uploads/missing.jpg').status_code)
+
+    def test_files_are_sharded(self):
+        self.require_local_storage()
+        url = json.loads(self.upload(self.author.id, b'sharded').data)['author']['avatar']
+        filename = url.rsplit('/', 1)[1]
+        first, second, name = get_storage().relative_path(filename).split(os.sep)
+        self.assertEqual((2, 2, filename), (len(first), len(second), name))
+        self.assertTrue(os.path.isfile(os.path.join(self.upload_folder, first, second, filename)))
+        self.assertEqual([first], os.listdir(self.upload_folder))
+
+    def test_migrating_flat_files(self):
+        self.require_local_storage()
+        self.write_file('legacy_avatar.jpg', 0)
+        path = '/api/authors/uploads/legacy_avatar.jpg'
+        response = self.client.get(path)
+        self.assertEqual(b'data', response.data)
+        response.close()
+
+        result = self.app.test_cli_runner().invoke(args=['avatars', 'migrate-layout'])
+        self.assertIn('Moved 1 files.', result.output)
+        self.assertFalse(os.path.exists(os.path.join(self.upload_folder, 'legacy_avatar.jpg')))
+        self.assertTrue(os.path.isfile(get_storage().path('legacy_avatar.jpg')))
+        response = self.client.get(path)
+        self.assertEqual(b'data', response.data)
+        response.close()
+        self.assertEqual(['legacy_avatar.jpg'], self.stored_files())
+
+    # Files written flat into the folder, as before sharding
+    def write_file(self, name, age):
+        path = os.path.join(self.upload_folder, name)
+        with open(path, 'wb') as f:
+            f.write(b'data')
+        past = time.time() - age
+        os.utime(path, (past, past))
+
+    def test_gc_deletes_old_unreferenced_files(self):
+        self.require_local_storage()
+        url = json.loads(self.upload(self.author.id, b'kept').data)['author']['avatar']
+        kept = url.rsplit('/', 1)[1]
+        os.utime(get_storage().path(kept), (0, 0))
+        self.write_file(kept.replace('.jpg', '-48.jpg'), 7200)
+        self.other.avatar = 'http://localhost/api/authors/uploads/legacy_avatar.jpg'
+        db.session.commit()
+        self.write_file('legacy_avatar.jpg', 7200)
+        self.write_file('orphan.jpg', 7200)
+        self.write_file('.upload-abc123', 7200)
+        self.write_file('fresh.jpg', 10)
+        os.mkdir(os.path.join(self.upload_folder, 'subdir'))
+        self.write_file(os.path.join('subdir', 'ignored.jpg'), 7200)
+
+        stats = collect_avatars(get_storage(), grace_period=3600, batch_size=2, dry_run=True)
+        self.assertEqual({'scanned': 6, 'referenced': 3, 'recent': 1, 'deleted': 2, 'bytes': 8}, stats)
+        self.assertEqual(6, len(self.stored_files()))
+
+        result = self.app.test_cli_runner().invoke(args=['avatars', 'gc', '--batch-size', '2'])
+        self.assertIn('Deleted 2 files (8 bytes)', result.output)
+        self.assertEqual(
+            sorted([kept, kept.replace('.jpg', '-48.jpg'), 'legacy_avatar.jpg', 'fresh.jpg']),
+            self.stored_files()
+        )
+        self.assertTrue(os.path.exists(os.path.join(self.upload_folder, 'subdir', 'ignored.jpg')))
+
+    def test_gc_with_memory_storage(self):
+        if self.storage != 'memory':
+            self.skipTest("covered on disk above")
+        url = json.loads(self.upload(self.author.id, b'kept').data)['author']['avatar']
+        with get_storage().writer() as out:
+            out.write(b'data')
+            out.commit('orphan.jpg')
+        stats = collect_avatars(get_storage(), grace_period=0)
+        self.assertEqual(1, stats['deleted'])
+        self.assertEqual([url.rsplit('/', 1)[1]], self.stored_files())
+
+    def test_gc_keeps_files_rewritten_after_the_scan(self):
+        storage = get_storage()
+        for name in ('orphan.jpg', 'rewritten.jpg'):
+            with storage.writer() as out:
+                out.write(b'data')
+                out.commit(name)
+
+        # An upload of the same content lands between listing and deleting
+        class Racing:
+            def scan(self, batch_size):
+                for files in storage.scan(batch_size):
+                    time.sleep(0.01)
+                    with storage.writer() as out:
+                        out.write(b'data')
+                        out.commit('rewritten.jpg')
+                    yield files
+
+            def delete_if_older(self, name, cutoff):
+                return storage.delete_if_older(name, cutoff)
+
+        time.sleep(0.01)
+        stats = collect_avatars(Racing(), grace_period=0)
+        self.assertEqual({'scanned': 2, 'referenced': 0, 'recent': 1, 'deleted': 1, 'bytes': 4}, stats)
+        self.assertEqual(['rewritten.jpg'], self.stored_files())
+
+
+class TestMemoryAvatars(TestAvatars):
+    storage = 'memory'
+
+if __name__ == '__main__':
+    unittest.main()
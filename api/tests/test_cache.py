@@ -0,0 +1,77 @@
+import json
+import time
+import unittest
+from datetime import timedelta
+from flask_jwt_extended import create_access_token
+
+from api.utils.test_base import BaseTestCase
+from api.utils.cache import TTLCache
+from api.utils.database import db
+from api.models.authors import Author
+from api.config.config import TestingConfig
+from main import create_app
+
+class TestTTLCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 1)
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual({'size': 1, 'maxsize': 2, 'hits': 1, 'misses': 1}, cache.stats())
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1, ttl=0.01)
+        cache.set('b', 2, ttl=-1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(0, len(cache))
+
+class TestClaimsCache(BaseTestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+        self.author = Author(first_name="Jane", last_name="Austen").create()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+
+    def put_author(self, token):
+        return self.client.put(
+            f'/api/authors/{self.author.id}/',
+            data=json.dumps({'first_name': 'Jane', 'last_name': 'Austen'}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+
+    def test_token_verified_once(self):
+        token = create_access_token(identity='kunal.relan@hotmail.com')
+        for _ in range(3):
+            self.assertEqual(200, self.put_author(token).status_code)
+        stats = self.app.extensions['flask-jwt-extended'].claims_cache.stats()
+        self.assertEqual((2, 1), (stats['hits'], stats['misses']))
+
+    def test_cached_token_still_expires(self):
+        token = create_access_token(identity='kunal.relan@hotmail.com', expires_delta=timedelta(seconds=1))
+        self.assertEqual(200, self.put_author(token).status_code)
+        time.sleep(1.1)
+        self.assertEqual(401, self.put_author(token).status_code)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import json
+import socketserver
+import threading
+import unittest
+
+from api.utils.test_base import BaseTestCase
+from api.utils.database import db
+from api.utils.email import mailer, send_email
+from api.config.config import TestingConfig
+from main import create_app
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail from smtplib, recording each message."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        if server.drop_connections:
+            server.drop_connections -= 1
+            return
+        self.reply('220 localhost ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command.startswith('DATA'):
+                self.reply('354 end with .')
+                lines = []
+                for data in iter(self.rfile.readline, b''):
+                    if data == b'.\r\n':
+                        break
+                    lines.append(data)
+                server.messages.append(b''.join(lines))
+                self.reply('250 queued')
+            elif command.startswith('QUIT'):
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.drop_connections = 0
+        self.messages = []
+
+class TestEmail(BaseTestCase):
+    def setUp(self):
+        self.smtp = SMTPServer()
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+
+        class MailConfig(TestingConfig):
+            MAIL_SERVER = '127.0.0.1'
+            MAIL_PORT = self.smtp.server_address[1]
+            MAIL_USE_SSL = False
+            MAIL_USE_TLS = False
+            MAIL_USERNAME = None
+            MAIL_SUPPRESS_SEND = False
+            MAIL_ASYNC = True
+            MAIL_RETRY_BACKOFF = 0.01
+
+        self.app = create_app(MailConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+        self.smtp.shutdown()
+        self.smtp.server_close()
+
+    def test_batch_shares_one_connection(self):
+        for i in range(5):
+            send_email(f'user{i}@example.com', 'Hello', '<p>Hi</p>')
+        self.assertTrue(mailer.flush(5))
+        self.assertEqual(5, len(self.smtp.messages))
+        self.assertEqual(1, self.smtp.connections)
+
+    def test_retries_on_a_new_connection(self):
+        self.smtp.drop_connections = 1
+        send_email('user@example.com', 'Hello', '<p>Hi</p>')
+        self.assertTrue(mailer.flush(5))
+        self.assertEqual(1, len(self.smtp.messages))
+        self.assertEqual(2, self.smtp.connections)
+
+    def test_signup_sends_verification_email(self):
+        response = self.client.post(
+            '/api/users/',
+            data=json.dumps({"username": "jane", "password": "helloworld", "email": "jane@example.com"}),
+            content_type='application/json'
+        )
+        self.assertEqual(201, response.status_code)
+        self.assertTrue(mailer.flush(5))
+        self.assertEqual(1, len(self.smtp.messages))
+        self.assertIn(b'/api/users/confirm/', self.smtp.messages[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import exc, text
+
+from api.utils.test_base import BaseTestCase
+from api.utils.database import db
+from api.utils.pool_metrics import InstrumentedQueuePool, pool_metrics
+from api.config.config import TestingConfig
+from main import create_app
+
+class TestPoolMetrics(BaseTestCase):
+    def setUp(self):
+        self.db_file = tempfile.mkstemp(suffix='.db')[1]
+
+        class PoolConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + self.db_file
+            SQLALCHEMY_ENGINE_OPTIONS = {'pool_size': 2, 'max_overflow': 0, 'pool_timeout': 1}
+            INTERNAL_METRICS_TOKEN = 'metrics-token'
+
+        self.app = create_app(PoolConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+        os.remove(self.db_file)
+
+    def get_stats(self, token='metrics-token'):
+        return self.client.get('/internal/pool', headers={'Authorization': f'Bearer {token}'})
+
+    def test_queue_pool_is_instrumented(self):
+        self.assertIsInstance(db.engine.pool, InstrumentedQueuePool)
+        self.assertEqual(2, db.engine.pool.size())
+
+    def test_stats_endpoint(self):
+        first, second = db.engine.connect(), db.engine.connect()
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        with self.assertRaises(exc.TimeoutError):
+            db.engine.connect()
+
+        stats = json.loads(self.get_stats().data)['pools']['default']
+        self.assertEqual(2, stats['checked_out'])
+        self.assertEqual(0, stats['overflow'])
+        self.assertEqual(1, stats['timeouts'])
+        self.assertGreaterEqual(stats['wait_max_ms'], 900)
+        first.close()
+        second.close()
+
+        with db.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        stats = json.loads(self.get_stats().data)['pools']['default']
+        self.assertEqual(0, stats['checked_out'])
+        self.assertEqual(2, stats['checked_in'])
+        self.assertEqual(2, stats['connects'])
+
+    def test_stats_need_the_token(self):
+        self.assertEqual(401, self.get_stats('wrong').status_code)
+        self.assertEqual(401, self.client.get('/internal/pool').status_code)
+        self.app.config['INTERNAL_METRICS_TOKEN'] = None
+        self.assertEqual(404, self.get_stats().status_code)
+
+    def test_pool_is_replaced_after_fork(self):
+        with db.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        pool = db.engine.pool
+        # What os.register_at_fork runs in a forked child
+        pool_metrics._after_fork()
+        self.assertIsNot(pool, db.engine.pool)
+        self.assertEqual(0, db.engine.pool.stats.checkouts)
+        self.assertEqual(1, pool.checkedin())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import json
+import os
+import tempfile
+import unittest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func, insert, select
+
+from api.utils.test_base import BaseTestCase
+from api.models.authors import Author
+from api.utils.database import db
+from api.config.config import TestingConfig
+from main import create_app
+
+def login():
+    return create_access_token(identity='kunal.relan@hotmail.com')
+
+class TestReplicas(BaseTestCase):
+    # Two SQLite files stand in for the primary and its replicas; nothing
+    # copies rows between them, which makes every read's source visible
+    def setUp(self):
+        self.files = [tempfile.mkstemp(suffix='.db')[1] for _ in range(3)]
+        primary, *replicas = self.files
+
+        class ReplicaConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + primary
+            SQLALCHEMY_REPLICA_URIS = ['sqlite:///' + path for path in replicas]
+
+        self.app = create_app(ReplicaConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+
+        db.create_all()
+        for key in ('replica_0', 'replica_1'):
+            db.metadata.create_all(db.engines[key])
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        for engine in db.engines.values():
+            engine.dispose()
+        self.app_context.pop()
+        for path in self.files:
+            os.remove(path)
+
+    def add_to_replicas(self, first_name):
+        for key in ('replica_0', 'replica_1'):
+            with db.engines[key].begin() as connection:
+                connection.execute(insert(Author.__table__).values(first_name=first_name, last_name='Replica'))
+
+    def count_authors(self):
+        return db.session.scalar(select(func.count()).select_from(Author))
+
+    def test_get_reads_from_a_replica(self):
+        self.add_to_replicas('Jane')
+        response = self.client.get('/api/authors/')
+        self.assertEqual(['Jane'], [author['first_name'] for author in json.loads(response.data)['authors']])
+        self.assertEqual(0, self.count_authors())
+
+    def test_writes_go_to_the_primary(self):
+        response = self.client.post(
+            '/api/authors/',
+            data=json.dumps({'first_name': 'Leo', 'last_name': 'Tolstoy'}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {login()}'}
+        )
+        self.assertEqual(201, response.status_code)
+        author_id = json.loads(response.data)['author']['id']
+        self.assertEqual(1, self.count_authors())
+        # Not replicated here, so GET does not see it yet
+        self.assertEqual(404, self.client.get(f'/api/authors/{author_id}/').status_code)
+
+    def test_reads_after_a_write_use_the_primary(self):
+        self.add_to_replicas('Jane')
+        with self.app.test_request_context('/api/authors/', method='GET'):
+            self.assertEqual(1, self.count_authors())
+            db.session.add(Author(first_name='Leo', last_name='Tolstoy'))
+            db.session.flush()
+            self.assertEqual(1, self.count_authors())
+            self.assertEqual(['Leo'], db.session.scalars(select(Author.first_name)).all())
+            db.session.rollback()
+
+        with self.app.test_request_context('/api/authors/', method='GET'):
+            self.assertEqual(1, self.count_authors())
+            self.assertEqual(['Jane'], db.session.scalars(select(Author.first_name)).all())
+
+    def test_replicas_are_used_round_robin(self):
+        picked = []
+        for _ in range(4):
+            with self.app.test_request_context('/api/authors/', method='GET'):
+                db.session.get_bind()
+                picked.append(db.session.get_bind())
+        engines = db.engines
+        self.assertEqual([engines['replica_0'], engines['replica_1']] * 2, picked)
+
+        with self.app.test_request_context('/api/authors/', method='POST'):
+            self.assertIs(engines[None], db.session.get_bind())
+        self.assertIs(engines[None], db.session.get_bind())
+
+if __name__ == '__main__':
+    unittest.main()
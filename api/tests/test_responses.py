@@ -0,0 +1,78 @@
+import datetime
+import decimal
+import json
+import unittest
+import uuid
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+from api.utils.test_base import BaseTestCase
+from api.utils.json_provider import OrjsonProvider, orjson
+from api.utils.responses import response_with
+from api.utils import responses as resp
+from api.config.config import TestingConfig
+from main import create_app
+
+class TestResponses(BaseTestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.context = self.app.test_request_context()
+        self.context.push()
+
+    def tearDown(self):
+        self.context.pop()
+
+    def test_envelope(self):
+        rv = response_with(resp.SUCCESS_200, value={'books': [1, 2]}, pagination={'next': None})
+        self.assertEqual(200, rv.status_code)
+        self.assertEqual(
+            {'books': [1, 2], 'code': 'success', 'pagination': {'next': None}},
+            json.loads(rv.data)
+        )
+
+    def test_message_argument(self):
+        rv = response_with(resp.INVALID_INPUT_422, message='No selected file')
+        self.assertEqual('No selected file', json.loads(rv.data)['message'])
+        rv = response_with(resp.INVALID_INPUT_422)
+        self.assertEqual('Invalid input', json.loads(rv.data)['message'])
+
+    def test_headers_do_not_leak_between_calls(self):
+        rv = response_with(resp.SUCCESS_200, headers={'Retry-After': '1'})
+        self.assertEqual('1', rv.headers['Retry-After'])
+        rv = response_with(resp.SUCCESS_200)
+        self.assertNotIn('Retry-After', rv.headers)
+        self.assertEqual('*', rv.headers['Access-Control-Allow-Origin'])
+
+    def test_pre_encoded_body(self):
+        body = b'{"code":"success","books":[]}'
+        rv = response_with(resp.SUCCESS_200, body=body)
+        self.assertEqual(body, rv.data)
+        self.assertEqual('application/json', rv.mimetype)
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_orjson_provider_matches_default(self):
+        self.assertIsInstance(self.app.json, OrjsonProvider)
+        default = DefaultJSONProvider(self.app)
+        value = {
+            'b': [1, 2.5, None, True, 'é'],
+            'a': {'created': datetime.datetime(2024, 5, 1, 12, 30),
+                  'day': datetime.date(2024, 5, 1),
+                  'price': decimal.Decimal('1.50'),
+                  'id': uuid.UUID(int=1)},
+            'big': 2 ** 70,
+        }
+        self.assertEqual(json.loads(default.dumps(value)), json.loads(self.app.json.dumps(value)))
+        self.assertEqual(
+            json.loads(default.response(value).data),
+            json.loads(self.app.json.response(value).data)
+        )
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_request_parsing_keeps_wide_integers(self):
+        body = b'{"ids": [%d]}' % (2 ** 70 + 1)
+        with self.app.test_request_context(data=body, content_type='application/json'):
+            self.assertEqual({'ids': [2 ** 70 + 1]}, request.get_json())
+
+if __name__ == '__main__':
+    unittest.main()
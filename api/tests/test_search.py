@@ -0,0 +1,139 @@
+import json
+import unittest
+from flask_jwt_extended import create_access_token
+
+from api.utils.test_base import BaseTestCase
+from api.models.authors import Author
+from api.models.books import Book
+from api.utils.database import db
+from api.config.config import TestingConfig
+from main import create_app
+
+def login():
+    return create_access_token(identity='kunal.relan@hotmail.com')
+
+class MemorySearchConfig(TestingConfig):
+    SEARCH_BACKEND = 'memory'
+
+class TestSearch(BaseTestCase):
+    config = TestingConfig
+    backend = 'fts5'
+
+    def setUp(self):
+        self.app = create_app(self.config)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+
+        db.create_all()
+        self.author = Author(first_name="Jane", last_name="Austen").create()
+        self.emma = Book(title="Emma", year=1815, author_id=self.author.id).create()
+        self.pride = Book(title="Pride and Prejudice", year=1813, author_id=self.author.id).create()
+        self.other = Author(first_name="Leo", last_name="Tolstoy").create()
+        self.war = Book(title="War and Peace", year=1869, author_id=self.other.id).create()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+
+    def search(self, q):
+        response = self.client.get(f'/api/search?q={q}')
+        self.assertEqual(200, response.status_code)
+        return [(r['type'], r['id']) for r in json.loads(response.data)['results']]
+
+    def test_backend(self):
+        self.client.get('/api/search?q=emma')
+        self.assertEqual(self.backend, self.app.extensions['search']['backend'].name)
+
+    def test_search_book_title(self):
+        self.assertEqual([('book', self.emma.id)], self.search('emma'))
+
+    def test_search_prefix_and_ranking(self):
+        results = self.search('pride prej')
+        self.assertEqual(('book', self.pride.id), results[0])
+
+    def test_search_author_name(self):
+        self.assertEqual([('author', self.other.id)], self.search('tolstoy'))
+
+    def test_search_missing_query(self):
+        self.assertEqual(422, self.client.get('/api/search?q=').status_code)
+
+    def test_search_follows_updates(self):
+        self.search('emma')
+        token = login()
+        response = self.client.put(
+            f'/api/books/{self.emma.id}/',
+            data=json.dumps({'title': 'Persuasion', 'year': 1817}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([], self.search('emma'))
+        self.assertEqual([('book', self.emma.id)], self.search('persuasion'))
+
+    def test_search_follows_creates_and_deletes(self):
+        self.search('emma')
+        token = login()
+        response = self.client.post(
+            '/api/books/',
+            data=json.dumps({'title': 'Anna Karenina', 'year': 1878, 'author_id': self.other.id}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        book_id = json.loads(response.data)['book']['id']
+        self.assertEqual([('book', book_id)], self.search('karenina'))
+
+        response = self.client.delete(
+            f'/api/authors/{self.other.id}/',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(204, response.status_code)
+        self.assertEqual([], self.search('karenina'))
+        self.assertEqual([], self.search('tolstoy'))
+        self.assertEqual([], self.search('peace'))
+
+    def test_search_follows_bulk_writes(self):
+        self.search('emma')
+        token = login()
+        self.client.patch(
+            '/api/books/bulk',
+            data=json.dumps({'ids': [self.emma.id], 'set': {'title': 'Sanditon'}}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual([('book', self.emma.id)], self.search('sanditon'))
+        self.client.delete(
+            '/api/books/bulk',
+            data=json.dumps({'filter': {'author_id': self.other.id}}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual([], self.search('peace'))
+
+    def test_missing_index_is_built_by_the_cli(self):
+        db.session.commit()
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql("DROP TABLE IF EXISTS search_index")
+        self.app.extensions['search']['backend'] = None
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(503, self.client.get('/api/search?q=emma').status_code)
+        Book(title="Emma", year=1815, author_id=self.other.id).create()
+
+        # Picked up without a restart, including writes made while missing
+        result = self.app.test_cli_runner().invoke(args=['search', 'rebuild'])
+        self.assertIn('Search index (fts5) built.', result.output)
+        self.assertEqual(2, len(self.search('emma')))
+        self.assertEqual('fts5', self.app.extensions['search']['backend'].name)
+
+class TestMemorySearch(TestSearch):
+    config = MemorySearchConfig
+    backend = 'memory'
+
+    def test_missing_index_is_built_by_the_cli(self):
+        result = self.app.test_cli_runner().invoke(args=['search', 'rebuild'])
+        self.assertIn('Search index (memory) already up to date.', result.output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from api.utils.test_base import BaseTestCase
+from api.models.authors import Author, AuthorSchema
+from api.models.books import Book, BookSchema
+from api.models.serializers import (
+    AUTHOR_LIST_FIELDS, BOOK_LIST_FIELDS, attach_avatar_variants, attach_books, dump_rows,
+    dump_schema, list_columns
+)
+from api.utils.database import db
+from api.config.config import TestingConfig
+from main import create_app
+
+class TestSerializers(BaseTestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        db.create_all()
+        author = Author(first_name="John", last_name="Doe").create()
+        author.avatar = "http://localhost/api/authors/uploads/a.jpg"
+        db.session.commit()
+        Book(title="Test Book 1", year=1976, author_id=author.id).create()
+        Book(title=None, year=None, author_id=author.id).create()
+        Author(first_name="Jane", last_name="Doe").create()
+        Book(title="Orphan", year=2000, author_id=None).create()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+
+    def test_dump_schema_is_cached(self):
+        self.assertIs(dump_schema(BookSchema, many=True, only=['id']),
+                      dump_schema(BookSchema, many=True, only=('id',)))
+        self.assertIsNot(dump_schema(BookSchema), dump_schema(BookSchema, many=True))
+
+    def test_book_rows_match_schema(self):
+        books = Book.query.order_by(Book.id).all()
+        expected = BookSchema(many=True, only=BOOK_LIST_FIELDS).dump(books)
+        rows = Book.query.with_entities(*list_columns(Book, BOOK_LIST_FIELDS)).order_by(Book.id).all()
+        self.assertEqual(expected, dump_rows(rows, BOOK_LIST_FIELDS))
+
+    def test_author_rows_match_schema(self):
+        authors = Author.query.order_by(Author.id).all()
+        expected = AuthorSchema(many=True, only=AUTHOR_LIST_FIELDS + ('avatar_variants', 'books')).dump(authors)
+        rows = Author.query.with_entities(*list_columns(Author, AUTHOR_LIST_FIELDS)).order_by(Author.id).all()
+        self.assertEqual(expected, attach_books(attach_avatar_variants(dump_rows(rows, AUTHOR_LIST_FIELDS))))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import json
+import os
+import runpy
+import subprocess
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from sqlalchemy import inspect
+
+from api.utils.test_base import BaseTestCase
+from api.utils.database import db
+from api.config.config import TestingConfig
+import main
+from main import create_app
+
+class TestStartup(BaseTestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+
+    def test_tables_are_created_by_the_cli(self):
+        self.assertEqual([], inspect(db.engine).get_table_names())
+        result = self.app.test_cli_runner().invoke(args=['init-db'])
+        self.assertIn('Database tables created.', result.output)
+        self.assertIn('authors', inspect(db.engine).get_table_names())
+
+    def test_init_db_adds_missing_indexes(self):
+        db.create_all()
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql("DROP INDEX ix_books_year")
+            connection.exec_driver_sql("ALTER TABLE books DROP COLUMN version")
+        result = self.app.test_cli_runner().invoke(args=['init-db'])
+        self.assertIn('Columns added: books.version.', result.output)
+        self.assertIn('Indexes added: ix_books_year.', result.output)
+        self.assertIn('ix_books_year', [index['name'] for index in inspect(db.engine).get_indexes('books')])
+
+    def test_only_gunicorn_workers_schedule_the_avatar_gc(self):
+        class ScheduledConfig(TestingConfig):
+            AVATAR_GC_INTERVAL = 3600
+
+        app = create_app(ScheduledConfig)
+        self.assertNotIn('avatar_gc_scheduler', app.extensions)
+
+        hooks = runpy.run_path(os.path.join(os.path.dirname(main.__file__), 'gunicorn.conf.py'))
+        worker = SimpleNamespace(wsgi=app)
+        hooks['post_worker_init'](worker)
+        self.assertTrue(app.extensions['avatar_gc_scheduler'].running)
+        hooks['worker_exit'](None, worker)
+        self.assertNotIn('avatar_gc_scheduler', app.extensions)
+
+    def test_swagger_is_opt_in(self):
+        rules = [rule.rule for rule in self.app.url_map.iter_rules()]
+        self.assertNotIn('/api/spec', rules)
+
+        class SwaggerConfig(TestingConfig):
+            SWAGGER_ENABLED = True
+
+        client = create_app(SwaggerConfig).test_client()
+        response = client.get('/api/spec')
+        self.assertEqual(200, response.status_code)
+        self.assertIn('/api/authors/', response.get_json()['paths'])
+        self.assertEqual(200, client.get('/api/docs/').status_code)
+
+    def swagger_client(self, **settings):
+        config = type('SwaggerConfig', (TestingConfig,), dict(SWAGGER_ENABLED=True, **settings))
+        app = create_app(config)
+        return app, app.test_client()
+
+    def test_spec_is_built_once_and_cacheable(self):
+        app, client = self.swagger_client()
+        response = client.get('/api/spec')
+        self.assertEqual('public, max-age=86400', response.headers['Cache-Control'])
+        etag = response.headers['ETag']
+        cached = app.extensions['swagger_spec']
+
+        response = client.get('/api/spec', headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        self.assertIs(cached, app.extensions['swagger_spec'])
+
+        asset = client.get('/api/docs/swagger-ui.css')
+        self.assertEqual(200, asset.status_code)
+        self.assertEqual('public, max-age=604800', asset.headers['Cache-Control'])
+        asset.close()
+
+    def test_dumped_spec_is_served(self):
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        result = self.app.test_cli_runner().invoke(args=['dump-spec', path])
+        self.assertIn(f'Wrote the OpenAPI spec to {path}.', result.output)
+        with open(path, 'rb') as f:
+            dumped = f.read()
+        self.assertIn('/api/authors/', json.loads(dumped)['paths'])
+
+        app, client = self.swagger_client(SWAGGER_SPEC_FILE=path)
+        self.assertEqual(dumped, client.get('/api/spec').data)
+
+    def test_import_has_no_side_effects(self):
+        # A fresh interpreter, so that modules imported by other tests do
+        # not count
+        code = (
+            "import sys, main\n"
+            "heavy = ['sentry_sdk', 'flask_monitoringdashboard', 'flask_swagger', 'flask_swagger_ui']\n"
+            "print([name for name in heavy if name in sys.modules])\n"
+            "print('app' in vars(main))\n"
+        )
+        env = dict(os.environ, RAILWAY_ENVIRONMENT_NAME='test')
+        output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True,
+                                text=True, check=True).stdout.split('\n')
+        self.assertEqual(['[]', 'False'], output[:2])
+
+if __name__ == '__main__':
+    unittest.main()
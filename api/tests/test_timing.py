@@ -0,0 +1,91 @@
+import re
+import unittest
+from flask import g
+from sqlalchemy import event
+
+from api.utils.test_base import BaseTestCase, count_queries
+from api.models.authors import Author
+from api.models.books import Book
+from api.models.serializers import BOOK_LIST_FIELDS, dump_rows
+from api.utils.database import db, _before_cursor_execute
+from api.utils.timing import RequestTiming
+from api.config.config import TestingConfig
+from main import create_app
+
+class TestRequestTiming(BaseTestCase):
+    def setUp(self):
+        class TimingConfig(TestingConfig):
+            REQUEST_TIMING = True
+
+        self.app = create_app(TimingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+
+        db.create_all()
+        author = Author(first_name="Jane", last_name="Austen").create()
+        Book(title="Emma", year=1815, author_id=author.id).create()
+        self.author_id = author.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+
+    def parse(self, header):
+        return {name: float(duration) for name, duration in re.findall(r'(\w+);dur=([\d.]+)', header)}
+
+    def test_server_timing_header_and_log(self):
+        with count_queries() as statements, self.assertLogs('api.request_timing', 'INFO') as logs:
+            response = self.client.get(f'/api/authors/{self.author_id}/')
+        self.assertEqual(200, response.status_code)
+
+        header = response.headers['Server-Timing']
+        self.assertIn(f'desc="{len(statements)} queries"', header)
+        timings = self.parse(header)
+        self.assertEqual({'db', 'serialize', 'total'}, set(timings))
+        self.assertGreater(timings['serialize'], 0)
+        self.assertLessEqual(timings['db'], timings['total'])
+
+        record = logs.records[0]
+        self.assertEqual((len(statements), 200, 'GET'), (record.queries, record.status, record.method))
+        self.assertEqual('author_routes.get_author_detail', record.endpoint)
+        self.assertEqual(timings['total'], record.total_ms)
+
+    def test_list_rows_count_as_serialization(self):
+        rows = [(i, f"Book {i}", 1900 + i, self.author_id) for i in range(1000)]
+        with self.app.test_request_context('/api/books/'):
+            g.request_timing = RequestTiming()
+            dump_rows(rows, BOOK_LIST_FIELDS)
+            self.assertGreater(g.request_timing.serialize, 0)
+
+    def test_header_can_be_turned_off(self):
+        self.app.config['REQUEST_TIMING_HEADER'] = False
+        with self.assertLogs('api.request_timing', 'INFO'):
+            response = self.client.get('/api/authors/')
+        self.assertNotIn('Server-Timing', response.headers)
+
+
+class TestRequestTimingOff(BaseTestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+
+    def test_nothing_is_hooked_in(self):
+        self.assertFalse(event.contains(db.engine, 'before_cursor_execute', _before_cursor_execute))
+        response = self.client.get('/api/authors/')
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn('Server-Timing', response.headers)
+
+if __name__ == '__main__':
+    unittest.main()
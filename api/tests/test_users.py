@@ -1,13 +1,22 @@
 import json
+import os
+import sqlite3
+import tempfile
 import unittest
 from datetime import datetime
 
-from api.utils.test_base import BaseTestCase
+from api.utils.test_base import BaseTestCase, count_queries
 from api.models.users import User, db
+from api.utils.passwords import passwords, _hash
+from api.utils.ratelimit import SQLiteBucketStore, parse_rate
 from api.utils.token import generate_verification_token, confirm_verification_token
 from main import create_app
 from api.config.config import TestingConfig
 
+class PooledHashConfig(TestingConfig):
+    PASSWORD_HASH_POOL_SIZE = 1
+    PASSWORD_HASH_MAX_PENDING = 1
+
 def create_users():
     # Clear existing users to avoid duplicates
     db.session.query(User).delete()
@@ -120,6 +129,175 @@ class TestUsers(BaseTestCase):
         data = json.loads(response.data)
         self.assertEqual(404, response.status_code)
 
+    def test_login_rehashes_outdated_hash(self):
+        user = User.find_by_email('kunal.relan12@gmail.com')
+        user.password = _hash('helloworld', 2000)
+        db.session.commit()
+        self.assertTrue(passwords.needs_update(user.password))
+
+        for _ in range(2):
+            response = self.client.post(
+                '/api/users/login',
+                data=json.dumps({"email": "kunal.relan12@gmail.com", "password": "helloworld"}),
+                content_type='application/json'
+            )
+            self.assertEqual(201, response.status_code)
+            user = User.find_by_email('kunal.relan12@gmail.com')
+            self.assertFalse(passwords.needs_update(user.password))
+            self.assertIn('$1000$', user.password)
+
+    def test_create_user_duplicate(self):
+        for username, email in (('kunalrelan12', 'new@example.com'), ('newuser', 'kunal.relan12@gmail.com')):
+            response = self.client.post(
+                '/api/users/',
+                data=json.dumps({"username": username, "password": "helloworld", "email": email}),
+                content_type='application/json'
+            )
+            self.assertEqual(422, response.status_code)
+            self.assertEqual('Email or username already exists.', json.loads(response.data)['error'])
+        self.assertEqual(2, User.query.count())
+
+    def test_find_by_identity(self):
+        with count_queries() as statements:
+            user = User.find_by_identity(email='kunal.relan12@gmail.com', username='kunalrelan125')
+        self.assertEqual(1, len(statements))
+        self.assertEqual('kunalrelan12', user.username)
+        self.assertEqual('kunalrelan125', User.find_by_identity(username='kunalrelan125').username)
+        self.assertIsNone(User.find_by_identity())
+
+    def test_login_caches_verified_users(self):
+        login = {"username": "kunalrelan12", "password": "helloworld"}
+        for expected_queries in (1, 0):
+            with count_queries() as statements:
+                response = self.client.post('/api/users/login', data=json.dumps(login),
+                                            content_type='application/json')
+            self.assertEqual(201, response.status_code)
+            self.assertEqual(expected_queries, len(statements))
+
+    def test_login_after_confirming_email(self):
+        login = json.dumps({"email": "kunal.relan123@gmail.com", "password": "helloworld"})
+        response = self.client.post('/api/users/login', data=login, content_type='application/json')
+        self.assertEqual(400, response.status_code)
+        token = generate_verification_token('kunal.relan123@gmail.com')
+        self.assertEqual(200, self.client.get('/api/users/confirm/' + token).status_code)
+        response = self.client.post('/api/users/login', data=login, content_type='application/json')
+        self.assertEqual(201, response.status_code)
+
+class TestPooledHashing(BaseTestCase):
+    def setUp(self):
+        self.app = create_app(PooledHashConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+
+    def tearDown(self):
+        passwords.shutdown()
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+
+    def test_hash_and_verify_in_pool(self):
+        hash = User.generate_hash('helloworld')
+        self.assertTrue(User.verify_hash('helloworld', hash))
+        self.assertFalse(User.verify_hash('wrongpassword', hash))
+        self.assertFalse(passwords.needs_update(hash))
+
+    def test_signup_when_pool_is_full(self):
+        executor, slots = passwords._get_pool(1)
+        slots.acquire()
+        try:
+            response = self.client.post(
+                '/api/users/',
+                data=json.dumps({"username": "busy", "password": "helloworld", "email": "busy@example.com"}),
+                content_type='application/json'
+            )
+        finally:
+            slots.release()
+        self.assertEqual(503, response.status_code)
+        self.assertEqual('1', response.headers['Retry-After'])
+        self.assertIsNone(User.find_by_email('busy@example.com'))
+class TestRateLimit(BaseTestCase):
+    def setUp(self):
+        self.storage = tempfile.mkstemp(suffix='.db')[1]
+
+        class RateLimitConfig(TestingConfig):
+            RATELIMIT_ENABLED = True
+            RATELIMIT_STORAGE = self.storage
+            RATELIMIT_PER_IP = '4/60'
+            RATELIMIT_PER_IDENTIFIER = '2/60'
+
+        self.app = create_app(RateLimitConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+        create_users()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.storage + suffix):
+                os.remove(self.storage + suffix)
+
+    def login(self, email):
+        return self.client.post(
+            '/api/users/login',
+            data=json.dumps({"email": email, "password": "wrongpassword"}),
+            content_type='application/json'
+        )
+
+    def test_limits_per_identifier_then_per_ip(self):
+        self.assertEqual(401, self.login('kunal.relan12@gmail.com').status_code)
+        # Identifiers are compared case-insensitively
+        self.assertEqual(404, self.login('Kunal.Relan12@gmail.com').status_code)
+        response = self.login('kunal.relan12@gmail.com')
+        self.assertEqual(429, response.status_code)
+        self.assertEqual('30', response.headers['Retry-After'])
+
+        # Rejected attempts take no tokens, so the address has two left
+        self.assertEqual(404, self.login('someone@example.com').status_code)
+        self.assertEqual(404, self.login('other@example.com').status_code)
+        self.assertEqual(429, self.login('another@example.com').status_code)
+
+    def test_forwarded_clients_get_their_own_buckets(self):
+        self.app.config['RATELIMIT_TRUSTED_PROXIES'] = 1
+        def login(address, email):
+            return self.client.post(
+                '/api/users/login',
+                data=json.dumps({"email": email, "password": "wrongpassword"}),
+                content_type='application/json',
+                headers={'X-Forwarded-For': address}
+            )
+        for i in range(4):
+            self.assertEqual(404, login('198.51.100.1', f'a{i}@example.com').status_code)
+        self.assertEqual(429, login('198.51.100.1', 'a4@example.com').status_code)
+        self.assertEqual(404, login('198.51.100.2', 'b0@example.com').status_code)
+
+    def test_locked_store_turns_requests_away(self):
+        blocker = sqlite3.connect(self.storage, isolation_level=None)
+        self.addCleanup(blocker.close)
+        self.login('someone@example.com')
+        blocker.execute("BEGIN EXCLUSIVE")
+        with self.assertLogs(level='WARNING'):
+            response = self.login('someone@example.com')
+        blocker.execute("ROLLBACK")
+        self.assertEqual(503, response.status_code)
+        self.assertEqual('1', response.headers['Retry-After'])
+
+    def test_unusable_store_is_not_enforced(self):
+        self.app.config['RATELIMIT_STORAGE'] = os.path.join(self.storage, 'missing', 'buckets.db')
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(404, self.login('someone@example.com').status_code)
+
+    def test_buckets_are_shared_through_the_file(self):
+        buckets = [('login:ip:1.2.3.4', *parse_rate('1/60'))]
+        self.assertEqual(0, SQLiteBucketStore(self.storage).take(buckets))
+        self.assertGreater(SQLiteBucketStore(self.storage).take(buckets), 59)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,40 @@
+import hashlib
+import time
+
+from flask_jwt_extended import JWTManager
+
+from api.utils.cache import TTLCache
+
+class CachingJWTManager(JWTManager):
+    """JWTManager that remembers the claims of tokens it has verified.
+
+    Clients reuse one access token for many requests, so the signature check
+    and claim parsing are done once per token and the verified claims are
+    served from a TTLCache keyed by the token's SHA-256. An entry lives at
+    most JWT_CLAIMS_CACHE_TTL seconds and never past the token's ``exp``,
+    after which the token is verified again and rejected as expired.
+    JWT_CLAIMS_CACHE_SIZE of 0 turns the cache off.
+    """
+
+    def init_app(self, app, *args, **kwargs):
+        super().init_app(app, *args, **kwargs)
+        app.config.setdefault('JWT_CLAIMS_CACHE_SIZE', 1024)
+        app.config.setdefault('JWT_CLAIMS_CACHE_TTL', 300)
+        self.claims_cache = TTLCache(app.config['JWT_CLAIMS_CACHE_SIZE'],
+                                     app.config['JWT_CLAIMS_CACHE_TTL'])
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        # Expired-token lookups and cookie tokens with a CSRF value are rare
+        # and depend on more than the token, so they are always verified
+        if allow_expired or csrf_value is not None:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        key = hashlib.sha256(encoded_token.encode()).digest()
+        claims = self.claims_cache.get(key)
+        if claims is None:
+            claims = super()._decode_jwt_from_config(encoded_token)
+            exp = claims.get('exp')
+            self.claims_cache.set(key, claims, None if exp is None else exp - time.time())
+        # Callers keep the claims on flask.g; hand out a copy so the cached
+        # entry is never modified
+        return dict(claims)
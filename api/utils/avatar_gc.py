@@ -0,0 +1,175 @@
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select
+
+from api.utils.database import db
+from api.models.authors import Author
+from api.models.avatars import AvatarFile
+from api.utils.storage import get_storage
+
+# "<sha256>-<size>.<ext>" is a thumbnail of "<sha256>.<ext>"
+VARIANT_RE = re.compile(r'^([0-9a-f]{64})-\d+(\.\w+)$')
+
+def original_filename(name):
+    match = VARIANT_RE.match(name)
+    return match.group(1) + match.group(2) if match else name
+
+def _referenced_names(batch_size):
+    # Every filename an author's avatar URL points to, plus every file with
+    # a reference count, streamed from the database in batches
+    for statement in (select(Author.avatar).where(Author.avatar.isnot(None)),
+                      select(AvatarFile.filename)):
+        result = db.session.execute(statement.execution_options(yield_per=batch_size))
+        for batch in result.partitions():
+            yield [(value.rsplit('/', 1)[-1],) for (value,) in batch]
+
+# Names in ``names`` present in the refs table, queried in chunks that stay
+# below SQLite's bound parameter limit
+def _lookup(index, names, chunk_size=500):
+    found = set()
+    for start in range(0, len(names), chunk_size):
+        chunk = names[start:start + chunk_size]
+        found.update(row[0] for row in index.execute(
+            f"SELECT name FROM refs WHERE name IN ({','.join('?' * len(chunk))})", chunk))
+    return found
+
+
+def collect_avatars(storage, grace_period, batch_size=1000, dry_run=False):
+    """Delete files in avatar ``storage`` that no author refers to.
+
+    The referenced filenames are copied into a temporary on-disk SQLite
+    table and the stored files are listed in batches that are looked up
+    against it, so memory use depends on ``batch_size`` and not on the
+    number of files or authors. Files modified within the last
+    ``grace_period`` seconds are kept: an upload writes its file before
+    committing the row that refers to it. The age is checked again right
+    before each delete, so a file rewritten by an upload since it was
+    listed is kept too. Interrupted uploads leave
+    ".upload-*" temp files behind, which are collected like any other
+    unreferenced file.
+    """
+    stats = {'scanned': 0, 'referenced': 0, 'recent': 0, 'deleted': 0, 'bytes': 0}
+    cutoff = time.time() - grace_period
+
+    fd, index_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    index = sqlite3.connect(index_path)
+    try:
+        index.execute("PRAGMA journal_mode=OFF")
+        index.execute("PRAGMA synchronous=OFF")
+        index.execute("CREATE TABLE refs (name TEXT PRIMARY KEY) WITHOUT ROWID")
+        for rows in _referenced_names(batch_size):
+            index.executemany("INSERT OR IGNORE INTO refs VALUES (?)", rows)
+        index.commit()
+        db.session.rollback()
+
+        for files in storage.scan(batch_size):
+            stats['scanned'] += len(files)
+            originals = {stored.name: original_filename(stored.name) for stored in files}
+            referenced = _lookup(index, list(set(originals.values())))
+
+            for stored in files:
+                if originals[stored.name] in referenced:
+                    stats['referenced'] += 1
+                    continue
+                if stored.mtime > cutoff:
+                    stats['recent'] += 1
+                    continue
+                if not dry_run and not storage.delete_if_older(stored.name, cutoff):
+                    stats['recent'] += 1
+                    continue
+                stats['deleted'] += 1
+                stats['bytes'] += stored.size
+    finally:
+        index.close()
+        os.remove(index_path)
+    return stats
+
+# Run collect_avatars() with the app's settings unless another process on
+# the host is already collecting the same folder
+def run_avatar_gc(dry_run=False, grace_period=None, batch_size=None):
+    config = current_app.config
+    folder = config['UPLOAD_FOLDER']
+    folder_key = hashlib.sha1(os.path.abspath(folder).encode()).hexdigest()[:16]
+    lock_path = os.path.join(tempfile.gettempdir(), f'avatar-gc-{folder_key}.lock')
+    with open(lock_path, 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logging.info("Avatar GC already running for %s", folder)
+            return None
+        stats = collect_avatars(
+            get_storage(),
+            config['AVATAR_GC_GRACE_PERIOD'] if grace_period is None else grace_period,
+            config['AVATAR_GC_BATCH_SIZE'] if batch_size is None else batch_size,
+            dry_run,
+        )
+    logging.info("Avatar GC of %s: %s", folder, stats)
+    return stats
+
+
+avatars_cli = AppGroup('avatars', help="Manage stored avatar files.")
+
+@avatars_cli.command('gc')
+@click.option('--grace-period', type=int, default=None,
+              help="Keep unreferenced files modified within this many seconds.")
+@click.option('--batch-size', type=int, default=None, help="Directory entries checked per query.")
+@click.option('--dry-run', is_flag=True, help="Report what would be deleted without deleting it.")
+def gc_command(grace_period, batch_size, dry_run):
+    """Delete avatar files no author refers to."""
+    stats = run_avatar_gc(dry_run, grace_period, batch_size)
+    if stats is None:
+        click.echo("Another avatar GC is running.")
+        return
+    verb = "Would delete" if dry_run else "Deleted"
+    click.echo(f"Scanned {stats['scanned']} files: {stats['referenced']} referenced, "
+               f"{stats['recent']} within the grace period. "
+               f"{verb} {stats['deleted']} files ({stats['bytes']} bytes).")
+
+@avatars_cli.command('migrate-layout')
+def migrate_layout_command():
+    """Move avatar files stored flat in UPLOAD_FOLDER into shard directories.
+
+    Safe to run while the app is serving: files stay readable at either
+    location while they are moved.
+    """
+    moved = get_storage().migrate()
+    click.echo(f"Moved {moved} files.")
+
+# Run the GC every AVATAR_GC_INTERVAL seconds in a background scheduler
+# thread. Called from the gunicorn worker hooks in gunicorn.conf.py, not
+# from create_app(), so that only serving processes schedule it; the file
+# lock in run_avatar_gc lets one worker at a time collect.
+def schedule_avatar_gc(app):
+    interval = app.config.get('AVATAR_GC_INTERVAL', 0)
+    if not interval:
+        return None
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    def job():
+        with app.app_context():
+            try:
+                run_avatar_gc()
+            finally:
+                db.session.remove()
+
+    scheduler = BackgroundScheduler(daemon=True)
+    scheduler.add_job(job, 'interval', seconds=interval, max_instances=1, coalesce=True)
+    scheduler.start()
+    app.extensions['avatar_gc_scheduler'] = scheduler
+    return scheduler
+
+def stop_avatar_gc(app):
+    scheduler = app.extensions.pop('avatar_gc_scheduler', None)
+    if scheduler is not None:
+        scheduler.shutdown(wait=False)
@@ -0,0 +1,125 @@
+import hashlib
+
+from flask import abort, current_app, request
+from sqlalchemy import delete, update
+
+from api.utils.database import db
+from api.models.avatars import AvatarFile
+from api.utils.storage import get_storage, valid_name
+from api.utils.thumbnails import variant_sizes
+
+# Accepted extensions and the one the stored file gets
+EXTENSIONS = {'png': 'png', 'jpg': 'jpg', 'jpeg': 'jpg'}
+
+# Room for the multipart boundaries and part headers around the file
+FORM_OVERHEAD = 16 * 1024
+
+class AvatarTooLarge(ValueError):
+    pass
+
+def avatar_extension(filename):
+    if not filename or '.' not in filename:
+        return None
+    return EXTENSIONS.get(filename.rsplit('.', 1)[1].lower())
+
+# Largest request body the upload route reads before answering 413
+def upload_limit():
+    return current_app.config['AVATAR_MAX_BYTES'] + FORM_OVERHEAD
+
+# Filename of the stored file an avatar URL points to
+def avatar_filename(url):
+    return url.rsplit('/', 1)[-1] if url else None
+
+# {size: URL} of the resized copies of an avatar, served by the upload route
+# once generated and as the original until then
+def avatar_variant_urls(url):
+    if not url:
+        return None
+    return {str(size): f"{url}?size={size}" for size in variant_sizes()}
+
+# Copy an uploaded file into avatar storage in fixed-size chunks, hashing
+# as it goes, and store it as "<sha256>.<extension>". Identical uploads end
+# up as the same file. Returns (filename, size).
+def save_avatar(stream, extension):
+    max_bytes = current_app.config['AVATAR_MAX_BYTES']
+    chunk_size = current_app.config['AVATAR_CHUNK_SIZE']
+
+    digest = hashlib.sha256()
+    size = 0
+    with get_storage().writer() as out:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise AvatarTooLarge(f"Avatar exceeds {max_bytes} bytes.")
+            digest.update(chunk)
+            out.write(chunk)
+        filename = f"{digest.hexdigest()}.{extension}"
+        out.commit(filename)
+    return filename, size
+
+# Count one more author using the file, in the current transaction
+def add_reference(filename, size):
+    dialect = db.session.get_bind().dialect.name
+    row = {'filename': filename, 'size': size, 'refcount': 1}
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        statement = insert(AvatarFile).values(row).on_conflict_do_update(
+            index_elements=['filename'], set_={'refcount': AvatarFile.refcount + 1}
+        )
+    elif dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(AvatarFile).values(row).on_duplicate_key_update(
+            refcount=AvatarFile.refcount + 1
+        )
+    else:
+        avatar = db.session.get(AvatarFile, filename, with_for_update=True)
+        if avatar is None:
+            db.session.add(AvatarFile(**row))
+        else:
+            avatar.refcount += 1
+        return
+    db.session.execute(statement)
+
+# Drop one reference in the current transaction. The file itself is not
+# deleted here: an upload of the same content may already have replaced it
+# without having committed its reference yet. Files nothing refers to are
+# removed by the avatar GC once they are older than its grace period.
+def release_reference(filename):
+    db.session.execute(
+        update(AvatarFile)
+        .where(AvatarFile.filename == filename)
+        .values(refcount=AvatarFile.refcount - 1)
+    )
+    db.session.execute(
+        delete(AvatarFile).where(AvatarFile.filename == filename, AvatarFile.refcount <= 0)
+    )
+
+# Send a stored avatar file. Stored files never change content (their names
+# are content hashes or unique upload names), so they are cacheable for
+# AVATAR_CACHE_MAX_AGE as immutable; pass immutable=False for responses that
+# stand in for a file that will exist later. ETag, Last-Modified and Range
+# requests are handled either way. With local storage, AVATAR_SEND_MODE
+# "x-accel" or "x-sendfile" leaves sending the bytes to nginx or
+# Apache/lighttpd.
+def send_avatar(filename, immutable=True):
+    config = current_app.config
+    mode = config['AVATAR_SEND_MODE']
+    if mode not in ('direct', 'x-accel', 'x-sendfile'):
+        raise ValueError(f"Unknown AVATAR_SEND_MODE: {mode}")
+    if not valid_name(filename):
+        abort(404)
+    max_age = config['AVATAR_CACHE_MAX_AGE'] if immutable else config['AVATAR_FALLBACK_MAX_AGE']
+
+    response = get_storage().send(
+        filename, request.environ, max_age,
+        mode=mode,
+        accel_prefix=config['AVATAR_ACCEL_PREFIX'],
+        response_class=current_app.response_class,
+    )
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = immutable
+    return response
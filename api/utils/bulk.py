@@ -0,0 +1,72 @@
+from itertools import islice
+
+from sqlalchemy import insert, text
+
+from api.utils.database import db
+
+class BulkPayloadError(ValueError):
+    pass
+
+# The body of a bulk request is a JSON array of records
+def get_bulk_items(data, max_items):
+    if not isinstance(data, list) or not data:
+        raise BulkPayloadError("Request body must be a non-empty JSON array.")
+    if len(data) > max_items:
+        raise BulkPayloadError(f"At most {max_items} items can be sent per request.")
+    return data
+
+# Per-item outcome of a rejected bulk request; nothing was written
+def invalid_results(count, errors):
+    return [
+        {'index': i, 'status': 'invalid', 'errors': errors[i]} if i in errors
+        else {'index': i, 'status': 'valid'}
+        for i in range(count)
+    ]
+
+def created_results(ids):
+    return [{'index': i, 'status': 'created', 'id': id} for i, id in enumerate(ids)]
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+# Insert rows (dicts of column values) in chunks inside the session's current
+# transaction and return the generated primary keys in input order.
+#
+# - Dialects with executemany RETURNING (SQLite, MariaDB, PostgreSQL) send
+#   each chunk as one batched INSERT ... RETURNING.
+# - MySQL sends each chunk as one multi-row INSERT. InnoDB hands out
+#   consecutive ids to a multi-row insert of known size, so the ids are
+#   derived from LAST_INSERT_ID() and auto_increment_increment.
+# - Anything else falls back to an ORM flush per chunk.
+def bulk_insert(model, rows, chunk_size):
+    table = model.__table__
+    dialect = db.session.get_bind().dialect
+    ids = []
+
+    if dialect.insert_executemany_returning_sort_by_parameter_order:
+        statement = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        for chunk in chunked(rows, chunk_size):
+            ids.extend(db.session.execute(statement, chunk).scalars())
+        return ids
+
+    if dialect.name == 'mysql':
+        step = db.session.execute(text("SELECT @@session.auto_increment_increment")).scalar()
+        for chunk in chunked(rows, chunk_size):
+            db.session.execute(insert(table).values(chunk))
+            first = db.session.execute(text("SELECT LAST_INSERT_ID()")).scalar()
+            ids.extend(first + i * step for i in range(len(chunk)))
+        return ids
+
+    for chunk in chunked(rows, chunk_size):
+        objects = [model(**row) for row in chunk]
+        db.session.add_all(objects)
+        db.session.flush()
+        ids.extend(obj.id for obj in objects)
+        for obj in objects:
+            db.session.expunge(obj)
+    return ids
@@ -1,3 +1,64 @@
+import time
+
+from flask import g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
+from sqlalchemy.schema import CreateColumn
+
+from api.utils.replicas import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Time every statement on a connection and add it to the current request's
+# timing, if any; see api.utils.timing
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = g.get('request_timing') if has_request_context() else None
+    if timing is not None:
+        timing.add_query(time.perf_counter() - context._query_start)
+
+def track_queries(engine):
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+# create_all() does not alter existing tables, so add the declared columns
+# they are missing. Only nullable columns without a server default can be
+# added this way; anything else needs a hand-written migration.
+def create_missing_columns(connection):
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable or column.server_default is not None:
+                raise RuntimeError(f"Cannot add column {table.name}.{column.name} automatically")
+            ddl = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+            created.append(f"{table.name}.{column.name}")
+    return created
 
-db = SQLAlchemy()
\ No newline at end of file
+# create_all() only creates indexes together with their tables, so add the
+# declared indexes missing from tables created before them. FULLTEXT
+# indexes are left to the search index build.
+def create_missing_indexes(connection):
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing or index.kwargs.get('mysql_prefix'):
+                continue
+            index.create(connection)
+            created.append(index.name)
+    return created
@@ -1,8 +1,174 @@
+import atexit
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+import weakref
+
 from flask_mail import Message, Mail
 from flask import current_app
 
 mail = Mail()
 
+# Bodies of the emails the API sends, compiled once per app on first use
+TEMPLATES = {
+    'verification': (
+        "<p>Welcome! Thanks for signing up. Please follow this link to activate your account:</p>"
+        "<p><a href='{{ verification_email }}'>{{ verification_email }}</a></p><br><p>Thanks!</p>"
+    ),
+}
+
+def render_email(name, **context):
+    compiled = current_app.extensions['mail_dispatcher'].templates
+    template = compiled.get(name)
+    if template is None:
+        template = compiled[name] = current_app.jinja_env.from_string(TEMPLATES[name])
+    return template.render(**context)
+
+# Errors after which the message is dropped instead of retried
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)
+
+
+class _Dispatch:
+    """Queue and delivery thread of one app."""
+
+    def __init__(self, app):
+        self.app = app
+        self.templates = {}
+        self.queue = queue.Queue(maxsize=app.config['MAIL_QUEUE_SIZE'])
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='mail-dispatcher', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        config = self.app.config
+        connection = None
+        while True:
+            try:
+                batch = [self.queue.get(timeout=config['MAIL_IDLE_TIMEOUT'])]
+            except queue.Empty:
+                # Nothing to send for a while, let the server close its side
+                connection = self.close(connection)
+                continue
+
+            # Give messages enqueued right behind the first one a moment to
+            # join the batch, so they share the connection round trip
+            deadline = time.monotonic() + config['MAIL_BATCH_WAIT']
+            while len(batch) < config['MAIL_BATCH_SIZE']:
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            with self.app.app_context():
+                for message in batch:
+                    connection = self.deliver(connection, message)
+                    self.queue.task_done()
+
+    def deliver(self, connection, message):
+        config = self.app.config
+        for attempt in range(config['MAIL_MAX_RETRIES'] + 1):
+            try:
+                if connection is None:
+                    connection = mail.connect().__enter__()
+                connection.send(message)
+                return connection
+            except PERMANENT_ERRORS:
+                logging.exception("Email to %s rejected", message.recipients)
+                return connection
+            except (smtplib.SMTPException, OSError):
+                # The connection may be half-open after any SMTP or socket
+                # error, so start from a fresh one
+                connection = self.close(connection)
+                if attempt == config['MAIL_MAX_RETRIES']:
+                    logging.exception("Giving up on email to %s", message.recipients)
+                    return None
+                time.sleep(config['MAIL_RETRY_BACKOFF'] * 2 ** attempt)
+            except Exception:
+                logging.exception("Email to %s failed", message.recipients)
+                return connection
+
+    @staticmethod
+    def close(connection):
+        if connection is not None and connection.host is not None:
+            try:
+                connection.host.quit()
+            except (smtplib.SMTPException, OSError):
+                connection.host.close()
+        return None
+
+
+class MailDispatcher:
+    """Sends email from a background thread.
+
+    send() queues the message and returns at once. A daemon thread per app
+    takes messages off the queue in batches and sends them over one SMTP
+    connection, which stays open until MAIL_IDLE_TIMEOUT seconds pass with
+    nothing to send. Failed sends are retried on a new connection with
+    exponential backoff. With MAIL_ASYNC off, send() delivers in the calling
+    thread as Flask-Mail does.
+    """
+
+    def __init__(self, app=None):
+        self._apps = weakref.WeakSet()
+        if app is not None:
+            self.init_app(app)
+        os.register_at_fork(after_in_child=self._forget_threads)
+        atexit.register(self.flush, 5)
+
+    def init_app(self, app):
+        app.config.setdefault('MAIL_ASYNC', True)
+        app.config.setdefault('MAIL_QUEUE_SIZE', 1000)
+        app.config.setdefault('MAIL_BATCH_SIZE', 50)
+        app.config.setdefault('MAIL_BATCH_WAIT', 0.05)
+        app.config.setdefault('MAIL_IDLE_TIMEOUT', 30)
+        app.config.setdefault('MAIL_MAX_RETRIES', 3)
+        app.config.setdefault('MAIL_RETRY_BACKOFF', 1.0)
+        state = _Dispatch(app)
+        app.extensions['mail_dispatcher'] = state
+        self._apps.add(state)
+
+    def _forget_threads(self):
+        # Threads do not survive fork; the child starts its own on first send
+        for state in self._apps:
+            state.thread = None
+            state.lock = threading.Lock()
+            state.queue = queue.Queue(maxsize=state.app.config['MAIL_QUEUE_SIZE'])
+
+    def send(self, message):
+        if not current_app.config['MAIL_ASYNC']:
+            mail.send(message)
+            return
+        state = current_app.extensions['mail_dispatcher']
+        state.start()
+        try:
+            state.queue.put_nowait(message)
+        except queue.Full:
+            logging.error("Mail queue is full, dropping email to %s", message.recipients)
+
+    # Wait until every queued message has been handled, for tests and shutdown
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for state in self._apps:
+            if state.thread is None:
+                continue
+            with state.queue.all_tasks_done:
+                while state.queue.unfinished_tasks:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    state.queue.all_tasks_done.wait(remaining)
+        return True
+
+mailer = MailDispatcher()
+
 def send_email(to, subject, template):
     msg = Message(
         subject,
@@ -10,4 +176,4 @@ def send_email(to, subject, template):
         html=template,
         sender=current_app.config['MAIL_DEFAULT_SENDER']
     )
-    mail.send(msg)
+    mailer.send(msg)
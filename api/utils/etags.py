@@ -0,0 +1,125 @@
+import hashlib
+from functools import wraps
+
+from flask import current_app, request
+from sqlalchemy import event, select, update
+
+from api.utils.database import db
+from api.models.authors import Author
+from api.models.books import Book
+from api.models.versions import ResourceVersion, new_version
+
+AUTHORS = 'authors'
+BOOKS = 'books'
+
+PENDING_KEY = 'etags_invalidated'
+
+def get_version(name):
+    version = db.session.execute(
+        select(ResourceVersion.version).where(ResourceVersion.name == name)
+    ).scalar()
+    return version or '0'
+
+# Replace the version tokens of the given collections once the current
+# transaction commits. Writes do not hold the shared version rows locked
+# until they commit; a list fetched between the commit and the new token
+# is tagged with a token that is about to go stale, which only costs its
+# client one more full response.
+def invalidate(*names):
+    db.session.info.setdefault(PENDING_KEY, set()).update(names)
+
+def _replace_versions(connection, names):
+    # Always in name order, so that concurrent writers lock the rows in the
+    # same order
+    rows = [{'name': name, 'version': new_version()} for name in sorted(names)]
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        statement = insert(ResourceVersion)
+        statement = statement.on_conflict_do_update(
+            index_elements=['name'], set_={'version': statement.excluded.version}
+        )
+    elif dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(ResourceVersion)
+        statement = statement.on_duplicate_key_update(version=statement.inserted.version)
+    else:
+        table = ResourceVersion.__table__
+        for row in rows:
+            result = connection.execute(
+                update(table).where(table.c.name == row['name']).values(version=row['version'])
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(row))
+        return
+    connection.execute(statement, rows)
+
+@event.listens_for(db.session, 'after_commit')
+def _after_commit(session):
+    names = session.info.pop(PENDING_KEY, None)
+    if names:
+        with db.engine.begin() as connection:
+            _replace_versions(connection, names)
+
+@event.listens_for(db.session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(PENDING_KEY, None)
+
+# Version of one author's detail view: its own row version and those of its
+# books, which the view includes. None when the author does not exist.
+def author_version(author_id):
+    rows = db.session.execute(
+        select(Author.version, Book.id, Book.version)
+        .outerjoin(Book, Book.author_id == Author.id)
+        .where(Author.id == author_id)
+        .order_by(Book.id)
+    ).all()
+    if not rows:
+        return None
+    return ':'.join([rows[0][0] or ''] + [f'{id}.{version or ""}' for _, id, version in rows if id is not None])
+
+def book_version(id):
+    row = db.session.execute(select(Book.version).where(Book.id == id)).first()
+    return None if row is None else row[0] or ''
+
+# Strong ETag of the current request's resource: a version plus the request
+# path and query string, so every resource and every page of a list gets its
+# own tag. Lists use the version of their collection, detail views the
+# version of their row.
+def make_etag(name, version=None):
+    if version is None:
+        version = get_version(name)
+    key = f"{name}:{version}:{request.full_path}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+# Answer If-None-Match with 304 before the view queries or serializes
+# anything, and tag successful responses of the view. Detail views pass
+# row_version, called with the view's arguments; when it finds no row the
+# view runs untagged (and answers 404).
+def conditional_get(name, row_version=None):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if row_version is None:
+                etag = make_etag(name)
+            else:
+                version = row_version(*args, **kwargs)
+                if version is None:
+                    return view(*args, **kwargs)
+                etag = make_etag(name, 'row:' + version)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
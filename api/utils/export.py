@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+
+from flask import Response, current_app, stream_with_context
+from sqlalchemy import select
+
+from api.utils.database import db
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+class ExportFormatError(ValueError):
+    pass
+
+def _ndjson_encoder(names):
+    def encode(row):
+        return json.dumps(dict(zip(names, row)), default=str, separators=(',', ':')) + '\n'
+    return None, encode
+
+def _csv_encoder(names):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def encode(row):
+        writer.writerow(row)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    return encode(names), encode
+
+# Stream the given columns of a table as NDJSON or CSV. Rows are fetched from
+# a server-side cursor in batches of EXPORT_BATCH_SIZE and every row is
+# encoded on its own, so memory stays bounded by the batch size rather than
+# by the size of the table.
+def stream_export(columns, fmt, filename):
+    if fmt not in EXPORT_FORMATS:
+        raise ExportFormatError(f"Unsupported export format: {fmt}")
+
+    names = [column.key for column in columns]
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    statement = (
+        select(*columns)
+        .order_by(columns[0])
+        .execution_options(yield_per=batch_size)
+    )
+    header, encode = _csv_encoder(names) if fmt == 'csv' else _ndjson_encoder(names)
+
+    def generate():
+        if header is not None:
+            yield header
+        result = db.session.execute(statement)
+        try:
+            for batch in result.partitions():
+                yield ''.join(encode(row) for row in batch)
+        finally:
+            result.close()
+
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{fmt}'
+    return response
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import os
+
+from flask import request
+
+# Optional integrations, each switched on by config and imported only when
+# it is, so that a plain create_app() does not pay for importing them.
+
+# Error reporting to Sentry when SENTRY_DSN is set. sentry_sdk is
+# process-wide, so it is only initialised once.
+def init_sentry(app):
+    dsn = app.config.get('SENTRY_DSN')
+    if not dsn:
+        return False
+    import sentry_sdk
+
+    if sentry_sdk.get_client().is_active():
+        return True
+    sentry_sdk.init(
+        dsn=dsn,
+        # Add data like request headers and IP for users,
+        # see https://docs.sentry.io/platforms/python/data-management/data-collected/ for more info
+        send_default_pii=app.config.get('SENTRY_SEND_DEFAULT_PII', False),
+        traces_sample_rate=app.config.get('SENTRY_TRACES_SAMPLE_RATE', 0.0),
+    )
+    return True
+
+# Flask-MonitoringDashboard when MONITORING_DASHBOARD is on
+def init_dashboard(app):
+    if not app.config.get('MONITORING_DASHBOARD'):
+        return False
+    try:
+        import flask_monitoringdashboard as dashboard
+    except ImportError:
+        logging.warning("MONITORING_DASHBOARD is on but Flask-MonitoringDashboard is not installed")
+        return False
+    dashboard.bind(app)
+    return True
+
+# The OpenAPI spec of every /api route, built from the route docstrings
+def build_spec(app):
+    from flask_swagger import swagger
+
+    swag = swagger(app, prefix='/api')
+    swag['info']['base'] = "http://localhost:5000"
+    swag['info']['version'] = "1.0"
+    swag['info']['title'] = "Flask Author Book Management System"
+    return swag
+
+def spec_body(app):
+    return json.dumps(build_spec(app), sort_keys=True).encode('utf-8')
+
+# Write the spec to a file, for SWAGGER_SPEC_FILE
+def write_spec(app, path):
+    with open(path, 'wb') as f:
+        f.write(spec_body(app))
+
+# The spec as served: JSON bytes and their ETag. Read from SWAGGER_SPEC_FILE
+# when that file exists (written at build time by "flask dump-spec"),
+# otherwise built from the routes on first use. Either way only once per app.
+def get_spec(app):
+    cached = app.extensions.get('swagger_spec')
+    if cached is None:
+        path = app.config.get('SWAGGER_SPEC_FILE')
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                body = f.read()
+        else:
+            body = spec_body(app)
+        cached = app.extensions['swagger_spec'] = (body, hashlib.sha1(body).hexdigest())
+    return cached
+
+# The OpenAPI spec at /api/spec and Swagger UI at /api/docs when
+# SWAGGER_ENABLED is on. Both are cacheable: the spec for
+# SWAGGER_SPEC_MAX_AGE and the UI's static assets for
+# SWAGGER_ASSETS_MAX_AGE, revalidated with their ETags after that.
+def init_swagger(app):
+    if not app.config.get('SWAGGER_ENABLED'):
+        return False
+    from flask_swagger_ui import get_swaggerui_blueprint
+
+    swaggerui_blueprint = get_swaggerui_blueprint(
+        '/api/docs', '/api/spec', config={'app_name': "Flask Author Book Management System"})
+
+    # The blueprint serves its page at "/" and "/index.html" and the
+    # bundled JavaScript and CSS at any other path
+    @swaggerui_blueprint.after_request
+    def cache_assets(response):
+        path = (request.view_args or {}).get('path')
+        if path and path != 'index.html' and response.status_code in (200, 304):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config.get('SWAGGER_ASSETS_MAX_AGE', 0)
+        return response
+
+    app.register_blueprint(swaggerui_blueprint, url_prefix='/api/docs')
+
+    @app.route("/api/spec")
+    def spec():
+        body, etag = get_spec(app)
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config.get('SWAGGER_SPEC_MAX_AGE', 0)
+        return response.make_conditional(request)
+
+    return True
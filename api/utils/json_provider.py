@@ -0,0 +1,59 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional, the default provider is used without it
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson.
+
+    Output matches the default provider: keys are sorted, and dates and any
+    other type orjson does not handle natively go through the default
+    provider's ``default`` hook. Values orjson refuses, such as integers
+    wider than 64 bits, fall back to the standard library encoder.
+    Decoding, and so request body parsing, is left to the default provider:
+    orjson would turn those wide integers into floats.
+    """
+
+    def _options(self, indent, newline):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if newline:
+            option |= orjson.OPT_APPEND_NEWLINE
+        return option
+
+    def dumps_bytes(self, obj, indent=False, newline=False):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._options(indent, newline))
+        except TypeError:
+            dump_args = {'indent': 2} if indent else {'separators': (',', ':')}
+            return (super().dumps(obj, **dump_args) + ('\n' if newline else '')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(
+            self.dumps_bytes(obj, indent=indent, newline=True), mimetype=self.mimetype
+        )
+
+
+# JSON_PROVIDER is "auto" (orjson when installed), "orjson" or "default"
+def init_json_provider(app):
+    choice = app.config.get('JSON_PROVIDER', 'auto')
+    if choice == 'default' or (choice == 'auto' and orjson is None):
+        return
+    if choice not in ('auto', 'orjson'):
+        raise ValueError(f"Unknown JSON_PROVIDER: {choice}")
+    if orjson is None:
+        raise RuntimeError("JSON_PROVIDER is 'orjson' but orjson is not installed")
+    app.json = OrjsonProvider(app)
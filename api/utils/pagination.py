@@ -0,0 +1,97 @@
+import base64
+import json
+
+from flask import current_app
+from sqlalchemy import and_, or_
+
+
+class PaginationError(ValueError):
+    pass
+
+
+# Cursors are opaque to clients: a url-safe base64 JSON list of the sort key
+# values of the last row on the page.
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise PaginationError("Invalid pagination cursor.")
+    if not isinstance(values, list) or not values:
+        raise PaginationError("Invalid pagination cursor.")
+    return values
+
+# Read ?limit= and ?after= from the query string
+def get_page_args(args):
+    default_limit = current_app.config.get('PAGINATION_DEFAULT_LIMIT', 50)
+    max_limit = current_app.config.get('PAGINATION_MAX_LIMIT', 500)
+
+    limit = args.get('limit')
+    if limit is None or limit == '':
+        limit = default_limit
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise PaginationError("limit must be an integer.")
+        if limit < 1:
+            raise PaginationError("limit must be greater than 0.")
+        limit = min(limit, max_limit)
+
+    after = args.get('after')
+    after = decode_cursor(after) if after else None
+    return limit, after
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+# WHERE clause selecting the rows that come after the cursor. NULL sort values
+# come first in ascending order and last in descending order on both SQLite
+# and MySQL, which is what the NULL branches below assume.
+def _after_clause(column, sort, descending, after):
+    if sort is None:
+        if len(after) != 1 or not _is_int(after[0]):
+            raise PaginationError("Invalid pagination cursor.")
+        return column < after[0] if descending else column > after[0]
+
+    if len(after) != 2 or not _is_int(after[1]) or not (
+            after[0] is None or _is_int(after[0]) or isinstance(after[0], str)):
+        raise PaginationError("Invalid pagination cursor.")
+    value, last_id = after
+    tie = column < last_id if descending else column > last_id
+
+    if value is None:
+        if descending:
+            return and_(sort.is_(None), tie)
+        return or_(sort.isnot(None), and_(sort.is_(None), tie))
+
+    beyond = sort < value if descending else sort > value
+    clause = or_(beyond, and_(sort == value, tie))
+    if descending:
+        clause = or_(clause, sort.is_(None))
+    return clause
+
+# Keyset pagination on a unique, indexed column (the primary key), optionally
+# ordered by another column first with the key as tiebreaker. Each page is a
+# range scan starting right after the previous page's last row, so the cost
+# of a page does not depend on how deep into the table it is.
+def keyset_paginate(query, column, limit, after=None, sort=None, descending=False):
+    if after is not None:
+        query = query.filter(_after_clause(column, sort, descending, after))
+
+    order = [sort, column] if sort is not None else [column]
+    query = query.order_by(*[c.desc() if descending else c.asc() for c in order])
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor([getattr(rows[-1], c.key) for c in order])
+    return rows, {'limit': limit, 'next': next_cursor}
@@ -0,0 +1,136 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, has_app_context
+from passlib.hash import pbkdf2_sha256
+
+# passlib's own default for pbkdf2_sha256
+DEFAULT_ROUNDS = 29000
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when too many hashes are already queued for the worker pool."""
+    pass
+
+# These run inside the pool workers, so they only take picklable arguments
+def _hash(password, rounds):
+    return pbkdf2_sha256.using(rounds=rounds).hash(password)
+
+def _verify(password, hash):
+    return pbkdf2_sha256.verify(password, hash)
+
+
+# Pool processes are started from a clean server process (or spawned)
+# rather than forked from a worker that already runs threads (mail
+# dispatcher, thumbnails, scheduler), whose locks a forked child could
+# inherit held
+def default_start_method():
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return 'forkserver'
+    return 'spawn'
+
+
+class PasswordHasher:
+    """Runs PBKDF2 hashing and verification off the request thread.
+
+    Hashes are computed on a process pool of PASSWORD_HASH_POOL_SIZE workers
+    (1 by default). At most PASSWORD_HASH_MAX_PENDING calls wait for the
+    pool at once; further calls raise PasswordHasherBusy rather than queue
+    without limit. A pool size of 0 hashes inline in the calling thread.
+
+    The pool is started on first use in each process, so every gunicorn
+    worker gets its own and the host runs workers x pool size hashing
+    processes. It only pays off with threaded workers (gthread, --threads):
+    a worker's other threads keep serving while its logins hash elsewhere,
+    and at most pool size hashes run per worker. A sync worker waits for
+    the result anyway, so there a pool size of 0 saves the round trip.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+        os.register_at_fork(after_in_child=self._forget_pool)
+        atexit.register(self.shutdown)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_ROUNDS', DEFAULT_ROUNDS)
+        app.config.setdefault('PASSWORD_HASH_POOL_SIZE', 1)
+        app.config.setdefault('PASSWORD_HASH_MAX_PENDING', 0)
+        app.config.setdefault('PASSWORD_HASH_START_METHOD', default_start_method())
+        app.extensions['passwords'] = self
+
+    def _config(self, key, default):
+        if has_app_context():
+            return current_app.config.get(key, default)
+        return default
+
+    @property
+    def rounds(self):
+        return self._config('PASSWORD_HASH_ROUNDS', DEFAULT_ROUNDS)
+
+    def _forget_pool(self):
+        # A forked child must not reuse the parent's worker processes
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self, size):
+        with self._lock:
+            if self._executor is None:
+                max_pending = self._config('PASSWORD_HASH_MAX_PENDING', 0) or size * 4
+                context = multiprocessing.get_context(
+                    self._config('PASSWORD_HASH_START_METHOD', None) or default_start_method())
+                self._executor = ProcessPoolExecutor(max_workers=size, mp_context=context)
+                self._slots = threading.BoundedSemaphore(max_pending)
+            return self._executor, self._slots
+
+    def _discard_pool(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._slots = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        size = self._config('PASSWORD_HASH_POOL_SIZE', 0)
+        if not size:
+            return fn(*args)
+
+        executor, slots = self._get_pool(size)
+        if not slots.acquire(blocking=False):
+            raise PasswordHasherBusy("Password hashing is at capacity, try again shortly.")
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed by the OS); start a fresh pool next time
+            self._discard_pool(executor)
+            return fn(*args)
+        finally:
+            slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password, hash):
+        return self._run(_verify, password, hash)
+
+    # True when the stored hash was made with other parameters than the
+    # configured ones and should be replaced after the next successful login
+    def needs_update(self, hash):
+        if not pbkdf2_sha256.identify(hash):
+            return True
+        return pbkdf2_sha256.from_string(hash).rounds != self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor, self._slots = self._executor, None, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+passwords = PasswordHasher()
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+import weakref
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from api.utils.database import db
+
+
+class PoolStats:
+    """Counters of one engine's connection pool, kept across pool re-creation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+    def increment(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'timeouts': self.timeouts,
+                'wait_total_ms': round(self.wait_total * 1000, 3),
+                'wait_avg_ms': round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a connection.
+
+    The wait includes opening a new connection when the pool has room for
+    one, and ends in a timeout when pool_size + max_overflow connections are
+    all checked out for longer than pool_timeout.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record_wait(time.perf_counter() - start)
+        return connection
+
+
+class PoolMetrics:
+    """Instruments the app's database connection pools.
+
+    init_app() must run before db.init_app(): when SQLALCHEMY_ENGINE_OPTIONS
+    configures a queue pool (pool_size is set), the engines are created with
+    InstrumentedQueuePool. Every engine is also disposed in forked children,
+    so gunicorn workers never share the connections of the process that
+    loaded the app.
+    """
+
+    def __init__(self, app=None):
+        self._engines = weakref.WeakSet()
+        if app is not None:
+            self.init_app(app)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def init_app(self, app):
+        options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+        if 'pool_size' in options and 'poolclass' not in options:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'poolclass': InstrumentedQueuePool, **options}
+        app.extensions['pool_metrics'] = self
+
+    # Start counting connects and invalidations; call after db.init_app()
+    def watch(self, app):
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            if engine in self._engines:
+                continue
+            self._engines.add(engine)
+            event.listen(engine, 'connect', self._on_connect(engine))
+            event.listen(engine, 'invalidate', self._on_invalidate(engine))
+
+    @staticmethod
+    def _on_connect(engine):
+        engine_ref = weakref.ref(engine)
+        def on_connect(dbapi_connection, connection_record):
+            stats = getattr(engine_ref() and engine_ref().pool, 'stats', None)
+            if stats is not None:
+                stats.increment('connects')
+        return on_connect
+
+    @staticmethod
+    def _on_invalidate(engine):
+        engine_ref = weakref.ref(engine)
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            stats = getattr(engine_ref() and engine_ref().pool, 'stats', None)
+            if stats is not None:
+                stats.increment('invalidations')
+        return on_invalidate
+
+    def _after_fork(self):
+        # The parent's connections must not be closed from here, only
+        # forgotten; the child opens its own on first use
+        for engine in list(self._engines):
+            engine.dispose(close=False)
+            if hasattr(engine.pool, 'stats'):
+                engine.pool.stats = PoolStats()
+
+    # Live state of every pool of the current app, by bind key
+    def snapshot(self):
+        pools = {}
+        for key, engine in db.engines.items():
+            pool = engine.pool
+            state = {'pool': type(pool).__name__, 'status': pool.status()}
+            if isinstance(pool, QueuePool):
+                state.update({
+                    'size': pool.size(),
+                    'checked_out': pool.checkedout(),
+                    'checked_in': pool.checkedin(),
+                    'overflow': max(pool.overflow(), 0),
+                    'max_overflow': pool._max_overflow,
+                    'timeout': pool.timeout(),
+                })
+            stats = getattr(pool, 'stats', None)
+            if stats is not None:
+                state.update(stats.snapshot())
+            pools[key or 'default'] = state
+        return {'pid': os.getpid(), 'pools': pools}
+
+pool_metrics = PoolMetrics()
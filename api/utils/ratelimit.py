@@ -0,0 +1,209 @@
+import functools
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from flask import current_app, request
+
+from api.utils.responses import response_with
+from api.utils import responses as resp
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limit exceeded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class RateLimitStoreUnavailable(Exception):
+    """Raised when the bucket file cannot be opened at all."""
+    pass
+
+# Seconds a client is asked to wait when the bucket file is too busy to
+# answer within its timeout
+BUSY_RETRY_AFTER = 1
+
+class RateLimitBusy(Exception):
+    pass
+
+def _is_busy(error):
+    return getattr(error, 'sqlite_errorcode', None) in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED) \
+        or 'locked' in str(error)
+
+# "capacity/seconds": a bucket of ``capacity`` tokens refilled over ``seconds``
+def parse_rate(value):
+    capacity, _, seconds = str(value).partition('/')
+    capacity, seconds = int(capacity), float(seconds or 1)
+    if capacity < 1 or seconds <= 0:
+        raise ValueError(f"Invalid rate: {value}")
+    return capacity, capacity / seconds
+
+
+class SQLiteBucketStore:
+    """Token buckets in a SQLite file shared by every process on the host.
+
+    Each take() runs in one BEGIN IMMEDIATE transaction, so concurrent
+    gunicorn workers consume tokens one at a time. Buckets refill lazily:
+    a row only stores the token count and when it was last updated.
+    """
+
+    # Rows of buckets untouched for this many takes are pruned
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+
+    def _connection(self):
+        # One connection per thread, opened again in forked children
+        # Lock timeouts are raised as they are; any other failure means the
+        # file cannot be used at all
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = None
+            try:
+                connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=OFF")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS buckets ("
+                    "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL"
+                    ") WITHOUT ROWID")
+            except sqlite3.Error as e:
+                if connection is not None:
+                    connection.close()
+                if _is_busy(e):
+                    raise
+                raise RateLimitStoreUnavailable(str(e)) from e
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    # Take one token from every bucket, or from none of them. ``buckets`` is
+    # a list of (key, capacity, refill rate per second). Returns 0 when the
+    # tokens were taken, otherwise the seconds until they all would be.
+    def take(self, buckets):
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            levels = []
+            wait = 0
+            for key, capacity, rate in buckets:
+                row = connection.execute(
+                    "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+                levels.append((key, tokens))
+            if not wait:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    [(key, tokens - 1, now) for key, tokens in levels])
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                # Any bucket idle for a day has long been full again
+                connection.execute("DELETE FROM buckets WHERE updated < ?", (now - 86400,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return wait
+
+    def reset(self):
+        self._connection().execute("DELETE FROM buckets")
+
+
+class RateLimiter:
+    """Per-IP and per-identifier token buckets for the user routes.
+
+    RATELIMIT_PER_IP and RATELIMIT_PER_IDENTIFIER are "capacity/seconds"
+    rates. The identifier is the email or username in the JSON body, so
+    guessing one account's password from many addresses is limited too.
+    Behind RATELIMIT_TRUSTED_PROXIES reverse proxies the client address is
+    taken from X-Forwarded-For. If the bucket file cannot be opened at all,
+    requests are let through and the error is logged. If it stays locked
+    past its timeout, as under a burst of attempts, requests are turned
+    away with 503 before any password is hashed.
+    """
+
+    def __init__(self, app=None):
+        self._stores = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_STORAGE',
+                              os.path.join(tempfile.gettempdir(), 'author-book-ratelimit.db'))
+        app.config.setdefault('RATELIMIT_PER_IP', '20/60')
+        app.config.setdefault('RATELIMIT_PER_IDENTIFIER', '5/60')
+        app.config.setdefault('RATELIMIT_TRUSTED_PROXIES', 0)
+        app.extensions['ratelimit'] = self
+
+    def get_store(self):
+        path = current_app.config['RATELIMIT_STORAGE']
+        with self._lock:
+            store = self._stores.get(path)
+            if store is None:
+                store = self._stores[path] = SQLiteBucketStore(path)
+            return store
+
+    def client_address(self):
+        proxies = current_app.config['RATELIMIT_TRUSTED_PROXIES']
+        route = request.access_route
+        if proxies and len(route) >= proxies:
+            return route[-proxies]
+        return request.remote_addr
+
+    def check(self, scope, identifier=None):
+        config = current_app.config
+        buckets = [(f'{scope}:ip:{self.client_address()}', *parse_rate(config['RATELIMIT_PER_IP']))]
+        if identifier:
+            buckets.append((f'{scope}:id:{identifier.strip().lower()}',
+                            *parse_rate(config['RATELIMIT_PER_IDENTIFIER'])))
+        try:
+            wait = self.get_store().take(buckets)
+        except RateLimitStoreUnavailable:
+            logging.exception("Rate limit storage unavailable, not limiting")
+            return
+        except sqlite3.Error:
+            logging.warning("Rate limit storage busy, turning the request away", exc_info=True)
+            raise RateLimitBusy()
+        if wait:
+            raise RateLimitExceeded(math.ceil(wait))
+
+    # Decorator for routes taking a JSON body with one of ``identifier_fields``
+    def limit(self, scope, identifier_fields=('email', 'username')):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if current_app.config['RATELIMIT_ENABLED']:
+                    data = request.get_json(silent=True)
+                    identifier = None
+                    if isinstance(data, dict):
+                        identifier = next((data[field] for field in identifier_fields
+                                           if isinstance(data.get(field), str) and data[field]), None)
+                    try:
+                        self.check(scope, identifier)
+                    except RateLimitExceeded as e:
+                        return response_with(
+                            resp.TOO_MANY_REQUESTS_429,
+                            value={"error": "Too many attempts, try again later."},
+                            headers={'Retry-After': str(e.retry_after)}
+                        )
+                    except RateLimitBusy:
+                        return response_with(
+                            resp.SERVICE_UNAVAILABLE_503,
+                            value={"error": "Too many attempts in progress, try again shortly."},
+                            headers={'Retry-After': str(BUSY_RETRY_AFTER)}
+                        )
+                return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+limiter = RateLimiter()
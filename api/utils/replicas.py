@@ -0,0 +1,112 @@
+import itertools
+import threading
+from functools import wraps
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+
+# Methods whose requests read from a replica
+READ_METHODS = frozenset(['GET', 'HEAD'])
+
+
+class ReplicaSet:
+    """Bind keys of the read replicas of an app, handed out round-robin."""
+
+    def __init__(self, keys):
+        self.keys = tuple(keys)
+        self._next = itertools.cycle(self.keys)
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def pick(self):
+        with self._lock:
+            return next(self._next)
+
+
+# SQLALCHEMY_REPLICA_URIS become binds "replica_0", "replica_1", ... so that
+# Flask-SQLAlchemy creates their engines with the same options and pool as
+# the primary; no models are bound to them, so create_all() leaves them
+# alone. Call before db.init_app().
+def init_replicas(app):
+    from api.utils.database import db
+
+    # db keeps an empty MetaData for every bind key it has seen, and
+    # create_all() goes through all of them; drop those of replicas that
+    # another app configured
+    for key in [key for key in db.metadatas if key and key.startswith('replica_')]:
+        del db.metadatas[key]
+
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    keys = []
+    for index, uri in enumerate(app.config.get('SQLALCHEMY_REPLICA_URIS') or []):
+        key = f'replica_{index}'
+        binds[key] = uri
+        keys.append(key)
+    replicas = app.extensions['replicas'] = ReplicaSet(keys)
+    if not keys:
+        return replicas
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+    # The session outlives the request when the app context was pushed
+    # before it (tests, CLI), so the routing state is reset per request
+    @app.teardown_request
+    def reset_routing(exc):
+        g.pop('use_primary', None)
+        session = app.extensions['sqlalchemy'].session
+        session.info.pop('primary', None)
+        session.info.pop('replica', None)
+
+    return replicas
+
+# Run the decorated GET view on the primary, for views that read something
+# they are about to write or that must see the latest writes
+def use_primary(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_primary = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """Session that sends the reads of GET and HEAD requests to a replica.
+
+    Everything else uses the primary: other methods, work outside a request
+    (CLI commands, background jobs), flushes, INSERT/UPDATE/DELETE
+    statements, SELECT ... FOR UPDATE and textual SQL. Once a request has
+    written, later reads of the same session stay on the primary as well,
+    so they see the write. A session sticks to one replica until it is
+    removed at the end of the request.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            replica = self.info.get('replica')
+            if replica is None:
+                replica = self.info['replica'] = current_app.extensions['replicas'].pick()
+            return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        if self.info.get('primary'):
+            return False
+        replicas = current_app.extensions.get('replicas')
+        if not replicas or not has_request_context() or request.method not in READ_METHODS:
+            return False
+        if g.get('use_primary'):
+            return False
+        if self._flushing or self._writes(clause):
+            self.info['primary'] = True
+            return False
+        return True
+
+    @staticmethod
+    def _writes(clause):
+        if clause is None:
+            return False
+        if isinstance(clause, sa.TextClause) or getattr(clause, 'is_dml', False):
+            return True
+        return getattr(clause, '_for_update_arg', None) is not None
@@ -1,4 +1,6 @@
-from flask import make_response, jsonify
+from flask import current_app
+
+from api.utils.timing import serializing
 
 INVALID_FIELD_NAME_SENT_422 = {
     "http_code": 422,
@@ -48,6 +50,24 @@ UNAUTHORIZED_403 = {
     "message": "You are not authorised to execute this."
 }
 
+PAYLOAD_TOO_LARGE_413 = {
+    "http_code": 413,
+    "code": "payloadTooLarge",
+    "message": "Payload too large"
+}
+
+TOO_MANY_REQUESTS_429 = {
+    "http_code": 429,
+    "code": "tooManyRequests",
+    "message": "Too many requests"
+}
+
+SERVICE_UNAVAILABLE_503 = {
+    "http_code": 503,
+    "code": "serviceUnavailable",
+    "message": "Service temporarily unavailable, try again shortly"
+}
+
 SUCCESS_200 = {
     'http_code': 200,
     'code': 'success'
@@ -63,23 +83,37 @@ SUCCESS_204 = {
     'code': 'success'
 }
 
-def response_with(response, value=None, message=None, error=None, headers={}, pagination=None):
-    result = {}
-    if value is not None:
-        result.update(value)
-
-    if response.get('message', None) is not None:
-        result.update({'message': response['message']})
-
-    result.update({'code': response['code']})
-
-    if error is not None:
-        result.update({'errors': error})
-
-    if pagination is not None:
-        result.update({'pagination': pagination})
-
-    headers.update({'Access-Control-Allow-Origin': '*'})
-    headers.update({'server': 'Flask REST API'})
-
-    return make_response(jsonify(result), response['http_code'], headers)
+# Build the JSON envelope of every API response.
+#
+# ``value`` is used as the envelope itself rather than copied, so pass a dict
+# the caller does not keep using. ``body`` takes an already encoded JSON
+# document (e.g. a cached response body) and sends it as is, in which case
+# ``value``, ``message``, ``error`` and ``pagination`` are ignored.
+def response_with(response, value=None, message=None, error=None, headers=None, pagination=None, body=None):
+    if body is None:
+        result = value if value is not None else {}
+
+        if message is None:
+            message = response.get('message', None)
+        if message is not None:
+            result['message'] = message
+
+        result['code'] = response['code']
+
+        if error is not None:
+            result['errors'] = error
+
+        if pagination is not None:
+            result['pagination'] = pagination
+
+        with serializing():
+            rv = current_app.json.response(result)
+    else:
+        rv = current_app.response_class(body, mimetype='application/json')
+
+    rv.status_code = response['http_code']
+    if headers:
+        rv.headers.update(headers)
+    rv.headers['Access-Control-Allow-Origin'] = '*'
+    rv.headers['server'] = 'Flask REST API'
+    return rv
@@ -0,0 +1,470 @@
+import bisect
+import heapq
+import logging
+import math
+import re
+import threading
+from collections import defaultdict
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect, select, text
+
+from api.utils.database import db
+from api.models.authors import Author
+from api.models.books import Book
+
+# Searchable documents are identified by (kind, id). An author's document is
+# "first_name last_name", a book's document is its title.
+AUTHOR = 'author'
+BOOK = 'book'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+class SearchIndexMissing(RuntimeError):
+    """Raised by searches while the database's native index is not built."""
+    pass
+
+def tokenize(value):
+    return TOKEN_RE.findall(value.lower()) if value else []
+
+def author_document(first_name, last_name):
+    return ' '.join(part for part in (first_name, last_name) if part)
+
+def _document_rows(connection, kind, batch_size):
+    if kind == AUTHOR:
+        statement = select(Author.id, Author.first_name, Author.last_name)
+    else:
+        statement = select(Book.id, Book.title)
+    result = connection.execute(statement.execution_options(yield_per=batch_size))
+    for batch in result.partitions():
+        if kind == AUTHOR:
+            yield [(row[0], author_document(row[1], row[2])) for row in batch]
+        else:
+            yield [(row[0], row[1] or '') for row in batch]
+
+
+class SQLiteFTS5Backend:
+    """Inverted index stored in an FTS5 virtual table next to the data.
+
+    Authors and books share one table so they are ranked together by bm25.
+    The rowid encodes the document key, which keeps updates and deletes
+    O(log n) lookups instead of scans over an unindexed column.
+    """
+
+    name = 'fts5'
+    applies_in_transaction = True
+    table = 'search_index'
+
+    @staticmethod
+    def available(connection):
+        return bool(connection.exec_driver_sql(
+            "SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar())
+
+    @staticmethod
+    def _rowid(kind, id):
+        return id * 2 + (1 if kind == BOOK else 0)
+
+    @staticmethod
+    def _key(rowid):
+        return (BOOK if rowid % 2 else AUTHOR), rowid // 2
+
+    def exists(self, connection):
+        return connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.table,)
+        ).first() is not None
+
+    # Create the table from the current rows; with rebuild, an existing
+    # table is dropped and rebuilt too
+    def build(self, connection, rebuild=False):
+        if self.exists(connection):
+            if not rebuild:
+                return False
+            connection.exec_driver_sql(f"DROP TABLE {self.table}")
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+            "body, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        connection.exec_driver_sql(
+            f"INSERT INTO {self.table} (rowid, body) "
+            "SELECT id * 2, first_name || ' ' || last_name FROM authors"
+        )
+        connection.exec_driver_sql(
+            f"INSERT INTO {self.table} (rowid, body) "
+            "SELECT id * 2 + 1, COALESCE(title, '') FROM books"
+        )
+        return True
+
+    # The table is created by build(), never on the way of a request
+    def ensure_ready(self, connection):
+        pass
+
+    def apply(self, connection, kind, documents):
+        rowids = [{'rowid': self._rowid(kind, id)} for id in documents]
+        connection.execute(text(f"DELETE FROM {self.table} WHERE rowid = :rowid"), rowids)
+        upserts = [
+            {'rowid': self._rowid(kind, id), 'body': body}
+            for id, body in documents.items() if body is not None
+        ]
+        if upserts:
+            connection.execute(
+                text(f"INSERT INTO {self.table} (rowid, body) VALUES (:rowid, :body)"), upserts
+            )
+
+    def search(self, connection, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # Every word is a phrase; the last one also matches as a prefix
+        terms = [f'"{token}"' for token in tokens[:-1]] + [f'"{tokens[-1]}"*']
+        rows = connection.execute(
+            text(
+                f"SELECT rowid, rank FROM {self.table} WHERE {self.table} MATCH :match "
+                "ORDER BY rank LIMIT :limit"
+            ),
+            {'match': ' OR '.join(terms), 'limit': limit},
+        )
+        return [self._key(rowid) + (-rank,) for rowid, rank in rows]
+
+
+class MySQLFulltextBackend:
+    """Uses the InnoDB FULLTEXT indexes declared on the models.
+
+    InnoDB maintains those indexes itself, so there is nothing to apply on
+    writes; build() adds the indexes to databases created before they were
+    declared.
+    """
+
+    name = 'mysql'
+    applies_in_transaction = True
+
+    INDEXES = (
+        ('books', 'ft_books_title', 'title'),
+        ('authors', 'ft_authors_name', 'first_name, last_name'),
+    )
+
+    def _missing(self, connection):
+        missing = []
+        for table, name, columns in self.INDEXES:
+            exists = connection.execute(text(
+                "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() "
+                "AND table_name = :table AND index_name = :name LIMIT 1"
+            ), {'table': table, 'name': name}).first()
+            if not exists:
+                missing.append((table, name, columns))
+        return missing
+
+    def exists(self, connection):
+        return not self._missing(connection)
+
+    # Add the missing indexes. Adding the first FULLTEXT index rebuilds the
+    # table and each ALTER commits, so this only runs from the CLI.
+    def build(self, connection, rebuild=False):
+        missing = self._missing(connection)
+        for table, name, columns in missing:
+            connection.exec_driver_sql(f"ALTER TABLE {table} ADD FULLTEXT INDEX {name} ({columns})")
+        return bool(missing)
+
+    # The indexes are added by build(), never on the way of a request
+    def ensure_ready(self, connection):
+        pass
+
+    def apply(self, connection, kind, documents):
+        pass
+
+    def search(self, connection, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = ' '.join(tokens[:-1] + [tokens[-1] + '*'])
+        params = {'match': match, 'limit': limit}
+        books = connection.execute(text(
+            "SELECT id, MATCH (title) AGAINST (:match IN BOOLEAN MODE) AS score FROM books "
+            "WHERE MATCH (title) AGAINST (:match IN BOOLEAN MODE) ORDER BY score DESC LIMIT :limit"
+        ), params)
+        authors = connection.execute(text(
+            "SELECT id, MATCH (first_name, last_name) AGAINST (:match IN BOOLEAN MODE) AS score "
+            "FROM authors WHERE MATCH (first_name, last_name) AGAINST (:match IN BOOLEAN MODE) "
+            "ORDER BY score DESC LIMIT :limit"
+        ), params)
+        hits = [(BOOK, id, float(score)) for id, score in books]
+        hits += [(AUTHOR, id, float(score)) for id, score in authors]
+        return heapq.nlargest(limit, hits, key=lambda hit: hit[2])
+
+
+class MemoryBackend:
+    """Pure-Python inverted index with BM25 ranking, kept per process.
+
+    It is built from the database on first use and then updated from
+    committed writes. Other processes' writes are not seen, so this is only
+    the fallback for databases without a native full-text index.
+    """
+
+    name = 'memory'
+    applies_in_transaction = False
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, batch_size=1000):
+        self._lock = threading.RLock()
+        self._batch_size = batch_size
+        self._ready = False
+        self._postings = defaultdict(dict)  # token -> {key: term frequency}
+        self._lengths = {}                  # key -> number of tokens
+        self._tokens = {}                   # key -> distinct tokens, for removal
+        self._total_length = 0
+        self._vocabulary = None             # sorted tokens for prefix matches
+
+    def ensure_ready(self, connection):
+        with self._lock:
+            if self._ready:
+                return
+            for kind in (AUTHOR, BOOK):
+                for batch in _document_rows(connection, kind, self._batch_size):
+                    for id, body in batch:
+                        self._add((kind, id), body)
+            self._ready = True
+
+    def _remove(self, key):
+        for token in self._tokens.pop(key, ()):
+            postings = self._postings[token]
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary = None
+        self._total_length -= self._lengths.pop(key, 0)
+
+    def _add(self, key, body):
+        tokens = tokenize(body)
+        if not tokens:
+            return
+        frequencies = defaultdict(int)
+        for token in tokens:
+            frequencies[token] += 1
+        for token, frequency in frequencies.items():
+            if token not in self._postings:
+                self._vocabulary = None
+            self._postings[token][key] = frequency
+        self._tokens[key] = tuple(frequencies)
+        self._lengths[key] = len(tokens)
+        self._total_length += len(tokens)
+
+    def apply(self, connection, kind, documents):
+        with self._lock:
+            # Not built yet: the build will read the committed rows itself
+            if not self._ready:
+                return
+            for id, body in documents.items():
+                self._remove((kind, id))
+                if body is not None:
+                    self._add((kind, id), body)
+
+    def _prefix_tokens(self, prefix):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        vocabulary = self._vocabulary
+        start = bisect.bisect_left(vocabulary, prefix)
+        matches = []
+        for token in vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            matches.append(token)
+        return matches
+
+    def search(self, connection, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            count = len(self._lengths)
+            if not count:
+                return []
+            average_length = self._total_length / count
+            terms = set(tokens[:-1]) | set(self._prefix_tokens(tokens[-1]))
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, frequency in postings.items():
+                    norm = self.K1 * (1 - self.B + self.B * self._lengths[key] / average_length)
+                    scores[key] += idf * frequency * (self.K1 + 1) / (frequency + norm)
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [key + (score,) for key, score in best]
+
+
+class SearchIndex:
+    """Flask extension keeping a full-text index of authors and books.
+
+    ORM writes are picked up from session events, so the existing routes
+    need no changes. Writes that bypass the ORM unit of work (bulk INSERT,
+    UPDATE or DELETE statements) must call stage() themselves.
+    """
+
+    PENDING_KEY = 'search_pending'
+
+    def __init__(self, app=None):
+        self._listening = False
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SEARCH_BACKEND', 'auto')
+        app.extensions['search'] = {'backend': None}
+        if not self._listening:
+            event.listen(db.session, 'after_flush', self._after_flush)
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_rollback', self._after_rollback)
+            self._listening = True
+
+    def _native_backend(self, connection):
+        choice = current_app.config['SEARCH_BACKEND']
+        dialect = connection.dialect.name
+        if choice == 'auto':
+            if dialect == 'sqlite' and SQLiteFTS5Backend.available(connection):
+                choice = 'fts5'
+            elif dialect == 'mysql':
+                choice = 'mysql'
+            else:
+                choice = 'memory'
+        if choice == 'fts5':
+            return SQLiteFTS5Backend()
+        if choice == 'mysql':
+            return MySQLFulltextBackend()
+        if choice == 'memory':
+            return None
+        raise ValueError(f"Unknown SEARCH_BACKEND: {choice}")
+
+    # The backend is only kept once it is usable. A native index that has
+    # not been built yet ("flask search rebuild") is looked for again on
+    # every call, so workers start using it as soon as it exists.
+    def _create_backend(self, connection):
+        backend = self._native_backend(connection)
+        if backend is None:
+            return MemoryBackend(current_app.config.get('EXPORT_BATCH_SIZE', 1000))
+        if not backend.exists(connection):
+            state = current_app.extensions['search']
+            if not state.get('warned'):
+                logging.warning("The %s search index does not exist; create it with "
+                                "'flask search rebuild'", backend.name)
+                state['warned'] = True
+            return None
+        return backend
+
+    # The app's backend, or None while its native index is missing
+    def get_backend(self, connection):
+        state = current_app.extensions['search']
+        if state['backend'] is None:
+            with self._lock:
+                if state['backend'] is None:
+                    state['backend'] = self._create_backend(connection)
+        return state['backend']
+
+    def build(self, connection, rebuild=False):
+        """Create the native index of the database (FTS5 table or MySQL
+        FULLTEXT indexes) if it is missing, or rebuild it. Returns the
+        backend name and whether anything was done; the in-memory index
+        has nothing to build."""
+        backend = self._native_backend(connection)
+        current_app.extensions['search']['backend'] = None
+        if backend is None:
+            return MemoryBackend.name, False
+        return backend.name, backend.build(connection, rebuild=rebuild)
+
+    def search(self, query, limit):
+        """Return up to ``limit`` (kind, id, score) tuples, best match first."""
+        connection = db.session.connection()
+        backend = self.get_backend(connection)
+        if backend is None:
+            raise SearchIndexMissing("The search index has not been built yet.")
+        backend.ensure_ready(connection)
+        return backend.search(connection, query, limit)
+
+    def stage(self, session, kind, documents):
+        """Record new document bodies ({id: body}, None to remove) for a write
+        that is part of the session's current transaction."""
+        if not documents:
+            return
+        connection = session.connection()
+        backend = self.get_backend(connection)
+        # Building the index later reads these writes from the tables
+        if backend is None:
+            return
+        if backend.applies_in_transaction:
+            backend.apply(connection, kind, documents)
+        else:
+            pending = session.info.setdefault(self.PENDING_KEY, {AUTHOR: {}, BOOK: {}})
+            pending[kind].update(documents)
+
+    # Session events
+
+    def _after_flush(self, session, flush_context):
+        if not has_app_context() or 'search' not in current_app.extensions:
+            return
+        authors, books = {}, {}
+        for obj in session.new:
+            if isinstance(obj, Author):
+                authors[obj.id] = author_document(obj.first_name, obj.last_name)
+            elif isinstance(obj, Book):
+                books[obj.id] = obj.title or ''
+        for obj in session.dirty:
+            state = inspect(obj)
+            if isinstance(obj, Author) and (state.attrs.first_name.history.has_changes()
+                                            or state.attrs.last_name.history.has_changes()):
+                authors[obj.id] = author_document(obj.first_name, obj.last_name)
+            elif isinstance(obj, Book) and state.attrs.title.history.has_changes():
+                books[obj.id] = obj.title or ''
+        for obj in session.deleted:
+            if isinstance(obj, Author):
+                authors[obj.id] = None
+            elif isinstance(obj, Book):
+                books[obj.id] = None
+        self.stage(session, AUTHOR, authors)
+        self.stage(session, BOOK, books)
+
+    def _after_commit(self, session):
+        pending = session.info.pop(self.PENDING_KEY, None)
+        if not pending or not has_app_context() or 'search' not in current_app.extensions:
+            return
+        backend = current_app.extensions['search']['backend']
+        if backend is not None:
+            for kind, documents in pending.items():
+                if documents:
+                    backend.apply(None, kind, documents)
+
+    def _after_rollback(self, session):
+        session.info.pop(self.PENDING_KEY, None)
+
+
+search = SearchIndex()
+
+# create_all() builds the FTS5 table with the tables, and drop_all() drops
+# it, so a recreated database does not start with a stale or missing index
+@event.listens_for(Book.__table__, 'after_create')
+def _create_fts5_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite' and SQLiteFTS5Backend.available(connection):
+        SQLiteFTS5Backend().build(connection)
+    if has_app_context() and 'search' in current_app.extensions:
+        current_app.extensions['search']['backend'] = None
+
+@event.listens_for(Book.__table__, 'after_drop')
+def _drop_fts5_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {SQLiteFTS5Backend.table}")
+    if has_app_context() and 'search' in current_app.extensions:
+        current_app.extensions['search']['backend'] = None
+
+
+search_cli = AppGroup('search', help="Manage the full-text search index.")
+
+@search_cli.command('rebuild')
+@click.option('--missing-only', is_flag=True, help="Only create an index that does not exist yet.")
+def rebuild_command(missing_only):
+    """Create or rebuild the full-text search index from the tables."""
+    with db.engine.begin() as connection:
+        name, built = search.build(connection, rebuild=not missing_only)
+    click.echo(f"Search index ({name}) {'built' if built else 'already up to date'}.")
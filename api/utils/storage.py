@@ -0,0 +1,291 @@
+import hashlib
+import io
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import quote
+
+from flask import current_app
+from werkzeug.exceptions import NotFound
+from werkzeug.utils import send_file
+
+# A stored file as listed by scan()
+StoredFile = namedtuple('StoredFile', ['name', 'size', 'mtime'])
+
+SHARD_RE = re.compile(r'^[0-9a-f]{2}$')
+
+# Names that may be requested from outside: no path separators and no
+# hidden files, which is what in-progress uploads are stored as
+def valid_name(name):
+    return bool(name) and '/' not in name and '\\' not in name and not name.startswith('.')
+
+
+class _Writer:
+    """File-like object that becomes a stored file once committed."""
+
+    def __init__(self, file):
+        self.file = file
+        self.committed = False
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if not self.committed:
+            self.abort()
+
+
+class _LocalWriter(_Writer):
+    def __init__(self, storage):
+        os.makedirs(storage.root, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=storage.root, prefix='.upload-')
+        super().__init__(os.fdopen(fd, 'wb'))
+        self.storage = storage
+
+    def commit(self, name):
+        self.file.close()
+        path = self.storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Atomic, and harmless when the same content is already stored
+        os.replace(self.temp_path, path)
+        self.committed = True
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class LocalStorage:
+    """Avatar files on the local disk, sharded into hashed subdirectories.
+
+    With a shard depth of 2, "name.jpg" is stored as "ab/cd/name.jpg" where
+    "abcd" starts the MD5 of the name, so no directory holds more than a
+    65536th of the files. Reads and deletes also look at the flat location
+    directly under the root, which is where files were stored before
+    sharding; migrate() moves them into place while the app keeps serving
+    them. New files are written through a hidden temp file in the root and
+    renamed into place.
+    """
+
+    name = 'local'
+
+    def __init__(self, root, shard_depth=2):
+        self.root = root
+        self.shard_depth = shard_depth
+
+    def relative_path(self, name):
+        digest = hashlib.md5(name.encode('utf-8')).hexdigest()
+        shards = [digest[2 * i:2 * i + 2] for i in range(self.shard_depth)]
+        return os.path.join(*shards, name)
+
+    def path(self, name):
+        return os.path.join(self.root, self.relative_path(name))
+
+    def locate(self, name):
+        for path in (self.path(name), os.path.join(self.root, name)):
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def exists(self, name):
+        return self.locate(name) is not None
+
+    def open(self, name):
+        path = self.locate(name)
+        if path is None:
+            raise FileNotFoundError(name)
+        return open(path, 'rb')
+
+    def writer(self):
+        return _LocalWriter(self)
+
+    def delete(self, name):
+        for path in {self.path(name), os.path.join(self.root, name)}:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # Delete the file unless it was modified after ``cutoff``, looking at its
+    # mtime right before removing it: an upload of the same content replaces
+    # the file, and a fresh one must survive a GC that listed the old one.
+    # Returns whether anything was deleted.
+    def delete_if_older(self, name, cutoff):
+        paths = []
+        for path in {self.path(name), os.path.join(self.root, name)}:
+            try:
+                if os.stat(path).st_mtime > cutoff:
+                    return False
+            except FileNotFoundError:
+                continue
+            paths.append(path)
+        deleted = False
+        for path in paths:
+            try:
+                os.remove(path)
+                deleted = True
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    # Batches of StoredFile for every file, read with os.scandir so only one
+    # batch and one directory handle per shard level are held at a time
+    def scan(self, batch_size):
+        if not os.path.isdir(self.root):
+            return
+        batch = []
+        for entry in self._walk(self.root, 0):
+            try:
+                info = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            batch.append(StoredFile(entry.name, info.st_size, info.st_mtime))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _walk(self, directory, depth):
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    yield entry
+                elif (depth < self.shard_depth and SHARD_RE.match(entry.name)
+                      and entry.is_dir(follow_symlinks=False)):
+                    yield from self._walk(entry.path, depth + 1)
+
+    def send(self, name, environ, max_age, mode='direct', accel_prefix=None, response_class=None):
+        path = self.locate(name)
+        if path is None:
+            raise NotFound()
+        if mode == 'x-accel':
+            response = response_class(mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+            relative = os.path.relpath(path, self.root).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(relative)}"
+            return response
+        return send_file(path, environ, use_x_sendfile=mode == 'x-sendfile',
+                         max_age=max_age, response_class=response_class)
+
+    # Move files stored flat under the root into their shard directories.
+    # Each file is hard-linked into place before the flat name is removed,
+    # so it is readable throughout. Returns the number of files moved.
+    def migrate(self):
+        if not self.shard_depth or not os.path.isdir(self.root):
+            return 0
+        moved = 0
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False) or not valid_name(entry.name):
+                    continue
+                target = self.path(entry.name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                try:
+                    os.link(entry.path, target)
+                except FileExistsError:
+                    pass
+                except OSError:
+                    # No hard links on this filesystem: copy, then rename
+                    with open(entry.path, 'rb') as source, self.writer() as out:
+                        while chunk := source.read(64 * 1024):
+                            out.write(chunk)
+                        out.commit(entry.name)
+                os.remove(entry.path)
+                moved += 1
+        return moved
+
+
+class _MemoryWriter(_Writer):
+    def __init__(self, storage):
+        super().__init__(io.BytesIO())
+        self.storage = storage
+
+    def commit(self, name):
+        with self.storage._lock:
+            self.storage._files[name] = (self.file.getvalue(), time.time())
+        self.committed = True
+
+    def abort(self):
+        self.file.close()
+
+
+class MemoryStorage:
+    """Avatar files kept in a dict, for tests."""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def exists(self, name):
+        return name in self._files
+
+    def open(self, name):
+        try:
+            return io.BytesIO(self._files[name][0])
+        except KeyError:
+            raise FileNotFoundError(name) from None
+
+    def writer(self):
+        return _MemoryWriter(self)
+
+    def delete(self, name):
+        with self._lock:
+            self._files.pop(name, None)
+
+    def delete_if_older(self, name, cutoff):
+        with self._lock:
+            stored = self._files.get(name)
+            if stored is None or stored[1] > cutoff:
+                return False
+            del self._files[name]
+            return True
+
+    def scan(self, batch_size):
+        with self._lock:
+            files = [StoredFile(name, len(data), mtime) for name, (data, mtime) in self._files.items()]
+        for start in range(0, len(files), batch_size):
+            yield files[start:start + batch_size]
+
+    def send(self, name, environ, max_age, mode='direct', accel_prefix=None, response_class=None):
+        try:
+            data, mtime = self._files[name]
+        except KeyError:
+            raise NotFound() from None
+        return send_file(
+            io.BytesIO(data), environ,
+            mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            etag=hashlib.sha1(data).hexdigest(), last_modified=mtime,
+            max_age=max_age, response_class=response_class,
+        )
+
+    def migrate(self):
+        return 0
+
+
+# AVATAR_STORAGE is "local" (UPLOAD_FOLDER, sharded AVATAR_SHARD_DEPTH
+# levels deep; 0 keeps the flat layout) or "memory"
+def init_storage(app):
+    app.config.setdefault('AVATAR_STORAGE', 'local')
+    app.config.setdefault('AVATAR_SHARD_DEPTH', 2)
+    choice = app.config['AVATAR_STORAGE']
+    if choice == 'local':
+        storage = LocalStorage(app.config['UPLOAD_FOLDER'], app.config['AVATAR_SHARD_DEPTH'])
+    elif choice == 'memory':
+        storage = MemoryStorage()
+    else:
+        raise ValueError(f"Unknown AVATAR_STORAGE: {choice}")
+    app.extensions['avatar_storage'] = storage
+    return storage
+
+def get_storage():
+    return current_app.extensions['avatar_storage']
@@ -1,6 +1,9 @@
 import unittest
 import tempfile
 import os
+from contextlib import contextmanager
+
+from sqlalchemy import event
 
 from main import create_app
 from api.utils.database import db
@@ -23,3 +26,15 @@ class BaseTestCase(unittest.TestCase):
             db.session.remove()
             db.drop_all()
         os.remove(self.test_db_file)
+
+# Collect the SQL statements sent to the database inside the block
+@contextmanager
+def count_queries():
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,150 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from api.utils.storage import get_storage, valid_name
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional, avatars are then only served at full size
+    Image = None
+
+FORMATS = {'jpg': 'JPEG', 'jpeg': 'JPEG', 'png': 'PNG'}
+
+# "<sha256>.jpg" at 48px is stored as "<sha256>-48.jpg"
+def variant_filename(filename, size):
+    stem, _, extension = filename.rpartition('.')
+    return f"{stem}-{size}.{extension}"
+
+def variant_sizes():
+    return current_app.config['AVATAR_VARIANT_SIZES']
+
+# Smallest configured size at least as large as the requested one
+def pick_size(requested, sizes):
+    larger = [size for size in sizes if size >= requested]
+    return min(larger) if larger else None
+
+# Store square, center-cropped copies of an image at each size alongside
+# it. Runs without an app context on a worker thread.
+def generate_variants(storage, filename, sizes):
+    extension = filename.rpartition('.')[2]
+    with storage.open(filename) as source, Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if FORMATS[extension] == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        for size in sizes:
+            name = variant_filename(filename, size)
+            if storage.exists(name):
+                continue
+            variant = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            with storage.writer() as out:
+                variant.save(out, FORMATS[extension])
+                out.commit(name)
+
+
+class ThumbnailWorker:
+    """Generates avatar size variants on a small background thread pool.
+
+    At most AVATAR_VARIANT_WORKERS images are resized at once and at most
+    AVATAR_VARIANT_MAX_PENDING wait for a thread; work beyond that is
+    dropped and done again the next time a missing variant is requested.
+    Without Pillow nothing is generated and the original is always served.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._pending = set()
+        if app is not None:
+            self.init_app(app)
+        os.register_at_fork(after_in_child=self._forget_pool)
+
+    def init_app(self, app):
+        app.config.setdefault('AVATAR_VARIANT_SIZES', (48, 96, 256))
+        app.config.setdefault('AVATAR_VARIANT_WORKERS', 2)
+        app.config.setdefault('AVATAR_VARIANT_MAX_PENDING', 100)
+        app.extensions['thumbnails'] = self
+
+    @property
+    def available(self):
+        return Image is not None
+
+    def _forget_pool(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._pending = set()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._executor is None:
+                config = current_app.config
+                self._executor = ThreadPoolExecutor(
+                    max_workers=config['AVATAR_VARIANT_WORKERS'], thread_name_prefix='thumbnails')
+                self._slots = threading.BoundedSemaphore(
+                    config['AVATAR_VARIANT_WORKERS'] + config['AVATAR_VARIANT_MAX_PENDING'])
+            return self._executor, self._slots
+
+    # Queue the variants of a stored avatar; returns the future, or None
+    # when nothing was queued
+    def schedule(self, filename):
+        if not self.available or not variant_sizes():
+            return None
+        storage = get_storage()
+        key = (id(storage), filename)
+        executor, slots = self._get_pool()
+        with self._lock:
+            if key in self._pending or not slots.acquire(blocking=False):
+                return None
+            self._pending.add(key)
+        try:
+            return executor.submit(self._run, key, storage, filename, tuple(variant_sizes()), slots)
+        except RuntimeError:
+            # The pool is shutting down
+            with self._lock:
+                self._pending.discard(key)
+            slots.release()
+            return None
+
+    def _run(self, key, storage, filename, sizes, slots):
+        try:
+            generate_variants(storage, filename, sizes)
+        except FileNotFoundError:
+            pass  # the avatar was deleted in the meantime
+        except OSError as e:
+            # Not an image Pillow can read
+            logging.warning("Could not generate variants of %s: %s", filename, e)
+        except Exception:
+            logging.exception("Could not generate variants of %s", filename)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+            slots.release()
+
+    # Name of the variant to serve for ``size``, or None when the original
+    # has to be served; missing variants are queued
+    def find(self, filename, size):
+        size = pick_size(size, variant_sizes())
+        if size is None or not self.available:
+            return None
+        if not valid_name(filename) or filename.rpartition('.')[2] not in FORMATS:
+            return None
+        storage = get_storage()
+        name = variant_filename(filename, size)
+        if storage.exists(name):
+            return name
+        if storage.exists(filename):
+            self.schedule(filename)
+        return None
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+thumbnails = ThumbnailWorker()
@@ -0,0 +1,108 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+from api.utils.database import db, track_queries
+
+logger = logging.getLogger('api.request_timing')
+
+
+class RequestTiming:
+    """Where the time of one request went, in seconds."""
+
+    __slots__ = ('start', 'queries', 'db', 'serialize', '_depth')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self._depth = 0
+
+    def add_query(self, seconds):
+        self.queries += 1
+        self.db += seconds
+
+    def fields(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db * 1000, 3),
+            'serialize_ms': round(self.serialize * 1000, 3),
+            'total_ms': round((time.perf_counter() - self.start) * 1000, 3),
+        }
+
+    def header(self, fields):
+        return (f'db;dur={fields["db_ms"]};desc="{fields["queries"]} queries", '
+                f'serialize;dur={fields["serialize_ms"]}, '
+                f'total;dur={fields["total_ms"]}')
+
+
+def current_timing():
+    return g.get('request_timing') if has_request_context() else None
+
+# Count the block as serialization time of the current request. Nested
+# blocks, such as the nested schemas of a dump, are only counted once.
+@contextmanager
+def serializing():
+    timing = current_timing()
+    if timing is None:
+        yield
+        return
+    timing._depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing._depth -= 1
+        if not timing._depth:
+            timing.serialize += time.perf_counter() - start
+
+
+class TimedDumpMixin:
+    """Schema mixin that counts dump() as serialization time."""
+
+    def dump(self, obj, *, many=None):
+        with serializing():
+            return super().dump(obj, many=many)
+
+
+# Per-request query count, database time, serialization time and total
+# time, sent as a Server-Timing header (REQUEST_TIMING_HEADER) and logged
+# as fields of an "api.request_timing" record. Nothing is hooked in unless
+# REQUEST_TIMING is on. Serialization time includes queries made while
+# serializing, such as lazy loads; the total of a streamed response ends
+# when the body starts streaming.
+def init_request_timing(app):
+    app.config.setdefault('REQUEST_TIMING', False)
+    app.config.setdefault('REQUEST_TIMING_HEADER', True)
+    if not app.config['REQUEST_TIMING']:
+        return False
+
+    with app.app_context():
+        for engine in db.engines.values():
+            track_queries(engine)
+
+    @app.before_request
+    def start_timing():
+        g.request_timing = RequestTiming()
+
+    @app.after_request
+    def finish_timing(response):
+        timing = g.pop('request_timing', None)
+        if timing is None:
+            return response
+        fields = timing.fields()
+        if app.config['REQUEST_TIMING_HEADER']:
+            response.headers['Server-Timing'] = timing.header(fields)
+        logger.info(
+            "%s %s %s: %d queries, db %.1fms, serialize %.1fms, total %.1fms",
+            request.method, request.path, response.status_code, fields['queries'],
+            fields['db_ms'], fields['serialize_ms'], fields['total_ms'],
+            extra={'method': request.method, 'path': request.path,
+                   'endpoint': request.endpoint, 'status': response.status_code, **fields},
+        )
+        return response
+
+    return True
@@ -0,0 +1,65 @@
+"""Throughput of POST /api/books/ (one row per request) against
+POST /api/books/bulk, on a temporary SQLite file.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_bulk_create [rows]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('RAILWAY_ENVIRONMENT_NAME', 'test')
+
+from flask_jwt_extended import create_access_token
+
+from main import create_app
+from api.config.config import TestingConfig
+from api.models.authors import Author
+from api.utils.database import db
+
+
+def run(rows):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+
+    app = create_app(BenchConfig)
+    try:
+        with app.app_context():
+            db.create_all()
+            author_id = Author(first_name='Bench', last_name='Mark').create().id
+            headers = {'Authorization': f"Bearer {create_access_token(identity='bench')}"}
+        client = app.test_client()
+        books = [{'title': f'Book {i}', 'year': 2000, 'author_id': author_id} for i in range(rows)]
+
+        start = time.perf_counter()
+        for book in books:
+            response = client.post('/api/books/', data=json.dumps(book),
+                                   content_type='application/json', headers=headers)
+            assert response.status_code == 201, response.data
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.post('/api/books/bulk', data=json.dumps(books),
+                               content_type='application/json', headers=headers)
+        assert response.status_code == 201, response.data
+        bulk = time.perf_counter() - start
+
+        print(f"rows: {rows}")
+        print(f"single-row endpoint: {single:8.3f}s  {rows / single:10.0f} rows/s")
+        print(f"bulk endpoint:       {bulk:8.3f}s  {rows / bulk:10.0f} rows/s")
+        print(f"speedup:             {single / bulk:8.1f}x")
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,97 @@
+"""Login throughput under concurrency, with password hashing inline in the
+request threads against the process pool, plus the latency of author list
+reads served while the logins run. Uses a temporary SQLite file and the
+production hashing rounds.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_login [threads] [seconds]
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault('RAILWAY_ENVIRONMENT_NAME', 'test')
+
+from main import create_app
+from api.config.config import Config, TestingConfig
+from api.models.users import User
+from api.utils.database import db
+from api.utils.passwords import passwords
+
+
+def run(threads, seconds, pool_size):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+        PASSWORD_HASH_ROUNDS = Config.PASSWORD_HASH_ROUNDS
+        PASSWORD_HASH_POOL_SIZE = pool_size
+        PASSWORD_HASH_MAX_PENDING = threads
+
+    app = create_app(BenchConfig)
+    try:
+        with app.app_context():
+            db.create_all()
+            hash = User.generate_hash('helloworld')
+            db.session.add_all([
+                User(username=f'user{i}', email=f'user{i}@example.com', password=hash, isVerified=True)
+                for i in range(threads)
+            ])
+            db.session.commit()
+
+        stop = threading.Event()
+        logins = [0] * threads
+        read_latencies = []
+
+        def login(i):
+            client = app.test_client()
+            body = json.dumps({'email': f'user{i}@example.com', 'password': 'helloworld'})
+            while not stop.is_set():
+                response = client.post('/api/users/login', data=body, content_type='application/json')
+                assert response.status_code == 201, response.data
+                logins[i] += 1
+
+        def read():
+            client = app.test_client()
+            while not stop.is_set():
+                start = time.perf_counter()
+                response = client.get('/api/authors/')
+                assert response.status_code == 200, response.data
+                read_latencies.append(time.perf_counter() - start)
+                time.sleep(0.01)
+
+        workers = [threading.Thread(target=login, args=(i,)) for i in range(threads)]
+        workers.append(threading.Thread(target=read))
+        for worker in workers:
+            worker.start()
+        time.sleep(seconds)
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+        latencies = sorted(read_latencies)
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+        label = f"pool of {pool_size}" if pool_size else "inline"
+        print(f"{label:12} {sum(logins) / seconds:8.1f} logins/s   "
+              f"reads p50 {statistics.median(latencies) * 1000:7.1f}ms  p95 {p95 * 1000:7.1f}ms")
+    finally:
+        passwords.shutdown()
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"threads: {threads}, cpus: {os.cpu_count()}, rounds: {Config.PASSWORD_HASH_ROUNDS}")
+    run(threads, seconds, 0)
+    run(threads, seconds, 1)
+    run(threads, seconds, os.cpu_count() or 1)
@@ -0,0 +1,88 @@
+"""Encode time and peak allocations of response_with on large list
+responses, against the previous implementation (dict copy + jsonify +
+make_response) with the default JSON provider.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_responses [rows ...]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('RAILWAY_ENVIRONMENT_NAME', 'test')
+
+from flask import jsonify, make_response
+from flask.json.provider import DefaultJSONProvider
+
+from main import create_app
+from api.config.config import TestingConfig
+from api.utils import responses as resp
+from api.utils.responses import response_with
+
+
+def legacy_response_with(response, value=None, headers=None, pagination=None):
+    headers = {} if headers is None else headers
+    result = {}
+    if value is not None:
+        result.update(value)
+    result.update({'code': response['code']})
+    if pagination is not None:
+        result.update({'pagination': pagination})
+    headers.update({'Access-Control-Allow-Origin': '*'})
+    headers.update({'server': 'Flask REST API'})
+    return make_response(jsonify(result), response['http_code'], headers)
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def run(sizes):
+    app = create_app(TestingConfig)
+    fast_json = app.json
+    with app.test_request_context():
+        print(f"{'rows':>8} {'variant':<26} {'time':>9} {'peak alloc':>12}")
+        for size in sizes:
+            books = [
+                {'id': i, 'title': f'Book {i}', 'year': 1900 + i % 100, 'author_id': i % 50}
+                for i in range(size)
+            ]
+            page = {'limit': size, 'next': None}
+            repeat = 5 if size <= 10000 else 2
+
+            app.json = DefaultJSONProvider(app)
+            variants = [
+                ('legacy, default JSON', lambda: legacy_response_with(
+                    resp.SUCCESS_200, value={'books': books}, pagination=page)),
+                ('new, default JSON', lambda: response_with(
+                    resp.SUCCESS_200, value={'books': books}, pagination=page)),
+            ]
+            for name, func in variants:
+                elapsed, peak = measure(func, repeat)
+                print(f"{size:>8} {name:<26} {elapsed:>8.4f}s {peak / 1e6:>10.2f}MB")
+
+            app.json = fast_json
+            if type(fast_json) is not DefaultJSONProvider:
+                elapsed, peak = measure(lambda: response_with(
+                    resp.SUCCESS_200, value={'books': books}, pagination=page), repeat)
+                name = f'new, {type(fast_json).__name__}'
+                print(f"{size:>8} {name:<26} {elapsed:>8.4f}s {peak / 1e6:>10.2f}MB")
+
+            body = response_with(resp.SUCCESS_200, value={'books': books}, pagination=page).data
+            elapsed, peak = measure(lambda: response_with(resp.SUCCESS_200, body=body), repeat)
+            print(f"{size:>8} {'new, pre-encoded body':<26} {elapsed:>8.4f}s {peak / 1e6:>10.2f}MB")
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
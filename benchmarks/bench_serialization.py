@@ -0,0 +1,67 @@
+"""Book list serialization: a fresh BookSchema dump of ORM objects (the old
+list path) against dump_rows() over with_entities() column tuples.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_serialization [rows ...]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault('RAILWAY_ENVIRONMENT_NAME', 'test')
+
+from sqlalchemy import insert
+
+from main import create_app
+from api.config.config import TestingConfig
+from api.models.authors import Author
+from api.models.books import Book, BookSchema
+from api.models.serializers import BOOK_LIST_FIELDS, dump_rows, list_columns
+from api.utils.database import db
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def schema_path(limit):
+    fetched = Book.query.order_by(Book.id).limit(limit).all()
+    BookSchema(many=True, only=list(BOOK_LIST_FIELDS)).dump(fetched)
+    db.session.expunge_all()
+
+
+def fast_path(limit):
+    rows = Book.query.with_entities(*list_columns(Book, BOOK_LIST_FIELDS)).order_by(Book.id).limit(limit).all()
+    dump_rows(rows, BOOK_LIST_FIELDS)
+
+
+def run(sizes):
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        author_id = Author(first_name='Bench', last_name='Mark').create().id
+        db.session.execute(insert(Book.__table__), [
+            {'title': f'Book {i}', 'year': 1900 + i % 100, 'author_id': author_id}
+            for i in range(max(sizes))
+        ])
+        db.session.commit()
+
+        print(f"{'rows':>8} {'schema':>10} {'fast path':>10} {'speedup':>8}")
+        for size in sizes:
+            repeat = 5 if size <= 10000 else 2
+            slow = best_of(repeat, lambda: schema_path(size))
+            fast = best_of(repeat, lambda: fast_path(size))
+            print(f"{size:>8} {slow:>9.3f}s {fast:>9.3f}s {slow / fast:>7.1f}x")
+
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
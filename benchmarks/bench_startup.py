@@ -0,0 +1,51 @@
+"""Cold start: how long importing main.py and running create_app() take,
+each measured in a fresh interpreter, with the optional integrations
+(Sentry, the monitoring dashboard, Swagger UI) off and on. Sentry gets a
+placeholder DSN and sends nothing, as no errors are raised.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from api.config.config import TestingConfig
+
+class StartupConfig(TestingConfig):
+    SENTRY_DSN = {dsn!r}
+    MONITORING_DASHBOARD = {enabled!r}
+    SWAGGER_ENABLED = {enabled!r}
+
+main.create_app(StartupConfig)
+created = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'create_app': created - imported}}))
+"""
+
+def measure(enabled, runs):
+    code = PROBE.format(enabled=enabled, dsn='https://key@localhost/1' if enabled else None)
+    env = dict(os.environ, RAILWAY_ENVIRONMENT_NAME='test')
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True,
+                                text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: statistics.median(sample[key] for sample in samples) for key in ('import', 'create_app')}
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"median of {runs} runs")
+    for enabled in (False, True):
+        timings = measure(enabled, runs)
+        label = "integrations on" if enabled else "integrations off"
+        print(f"{label:17} import {timings['import'] * 1000:8.1f}ms   "
+              f"create_app {timings['create_app'] * 1000:8.1f}ms")
@@ -0,0 +1,15 @@
+# gunicorn.conf.py
+# Read by gunicorn from the working directory, so "gunicorn main:app" on
+# the deploy picks it up.
+
+# Only serving workers run the avatar GC scheduler; "flask" commands such as
+# init-db build the same app without starting it
+def post_worker_init(worker):
+    from api.utils.avatar_gc import schedule_avatar_gc
+    schedule_avatar_gc(worker.wsgi)
+
+def worker_exit(server, worker):
+    from api.utils.avatar_gc import stop_avatar_gc
+    app = getattr(worker, 'wsgi', None)
+    if app is not None:
+        stop_avatar_gc(app)
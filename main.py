@@ -1,27 +1,37 @@
 # main.py
 
-import os, logging
+import os, sys, logging
+import click
 from dotenv import load_dotenv
-from flask import Flask, jsonify, Blueprint, request
+from flask import Flask, jsonify, Blueprint, current_app, request
+from flask.cli import with_appcontext
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager
-from flask_swagger import swagger
-from flask_swagger_ui import get_swaggerui_blueprint
-
-# Mnnitoring Packages:
-import sentry_sdk
-import flask_monitoringdashboard as dashboard
 
 # Import Internal Modules:
 from api.utils.responses import response_with
 import api.utils.responses as resp
 from api.config.config import DevelopmentConfig, ProductionConfig, TestingConfig
-from api.utils.database import db
-from api.utils.email import mail
+from api.utils.database import create_missing_columns, create_missing_indexes, db
+from api.utils.auth import CachingJWTManager
+from api.utils.avatars import send_avatar
+from api.utils.avatar_gc import avatars_cli
+from api.utils.email import mail, mailer
+from api.utils.integrations import init_dashboard, init_sentry, init_swagger, write_spec
+from api.utils.json_provider import init_json_provider
+from api.utils.passwords import passwords
+from api.utils.pool_metrics import pool_metrics
+from api.utils.ratelimit import limiter
+from api.utils.replicas import init_replicas
+from api.utils.search import search, search_cli
+from api.utils.storage import init_storage
+from api.utils.thumbnails import thumbnails
+from api.utils.timing import init_request_timing
 from api.models.authors import Author, AuthorSchema
 from api.routes.authors import author_routes
 from api.routes.books import book_routes
 from api.routes.users import user_routes
+from api.routes.search import search_routes
+from api.routes.internal import internal_routes
 
 load_dotenv()
 
@@ -33,24 +43,31 @@ elif os.environ.get('RAILWAY_ENVIRONMENT_NAME') == 'test':
 else:
     app_config = DevelopmentConfig
 
-def create_app(app_config):
-
-    # Initialize Sentry
-    sentry_sdk.init(
-        dsn="https://1a2bad50c8e9301441ea1bb0099f6ee6@o4510117421514752.ingest.us.sentry.io/4510117450940416",
-        # Add data like request headers and IP for users,
-        # see https://docs.sentry.io/platforms/python/data-management/data-collected/ for more info
-        send_default_pii=True,
-    )
-
+# Build the app. Nothing here talks to the database: the schema is created
+# by "flask init-db", run once per deploy rather than by every worker.
+def create_app(app_config=app_config):
     app = Flask(__name__)
     app.config.from_object(app_config)
-    jwt = JWTManager(app)
+    init_sentry(app)
+    init_json_provider(app)
+    jwt = CachingJWTManager(app)
     mail.init_app(app)
+    mailer.init_app(app)
+    pool_metrics.init_app(app)
+    init_replicas(app)
     db.init_app(app)
-
-    with app.app_context():
-        db.create_all()  # This runs on every app start
+    pool_metrics.watch(app)
+    init_request_timing(app)
+    search.init_app(app)
+    passwords.init_app(app)
+    limiter.init_app(app)
+    thumbnails.init_app(app)
+    init_storage(app)
+
+    app.cli.add_command(avatars_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(dump_spec_command)
 
     '''
     CORS(app, supports_credentials=True, origins=[
@@ -61,13 +78,12 @@ def create_app(app_config):
     
     CORS(app, supports_credentials=True, origins="*")
 
-    SWAGGER_URL = '/api/docs'
-
     app.register_blueprint(author_routes, url_prefix='/api/authors')
     app.register_blueprint(book_routes, url_prefix='/api/books')
     app.register_blueprint(user_routes, url_prefix='/api/users')
-    swaggerui_blueprint = get_swaggerui_blueprint('/api/docs', '/api/spec', config={'app_name': "Flask Author Book Management System"})
-    app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
+    app.register_blueprint(search_routes, url_prefix='/api/search')
+    app.register_blueprint(internal_routes, url_prefix='/internal')
+    init_swagger(app)
 
     @app.route('/api/<path:path>', methods=['OPTIONS'])
     def options_handler(path):
@@ -77,7 +93,7 @@ def create_app(app_config):
 
     @app.route('/avatar/<filename>')
     def uploaded_file(filename):
-        return send_from_directory(app.config['UPLOAD_FOLDER'],filename)
+        return send_avatar(filename)
 
     @app.after_request
     def add_header(response):
@@ -97,6 +113,11 @@ def create_app(app_config):
         logging.error(e)
         return response_with(resp.BAD_REQUEST_400)
 
+    @app.errorhandler(413)
+    def payload_too_large(e):
+        logging.error(e)
+        return response_with(resp.PAYLOAD_TOO_LARGE_413)
+
     @app.errorhandler(500)
     def server_error(e):
         logging.error(e)
@@ -106,23 +127,53 @@ def create_app(app_config):
     def not_found(e):
         logging.error(e)
         return response_with(resp.SERVER_ERROR_404)
-    
-    @app.route("/api/spec")
-    def spec():
-        swag = swagger(app, prefix='/api')
-        swag['info']['base'] = "http://localhost:5000"
-        swag['info']['version'] = "1.0"
-        swag['info']['title'] = "Flask Author Book Management System"
-        return jsonify(swag)
 
-    return app
+    init_dashboard(app)
 
-# Create app using selected config
-app = create_app(app_config)
+    return app
 
-# Bind the app for Flask Monitoring Dashboard
-dashboard.bind(app)
+# Create the tables, columns, indexes and search index that do not exist yet
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the database tables, their new columns and indexes and the full-text search index."""
+    db.create_all()
+    with db.engine.begin() as connection:
+        columns = create_missing_columns(connection)
+        indexes = create_missing_indexes(connection)
+        name, built = search.build(connection)
+    click.echo(f"Database tables created{f', search index ({name}) built' if built else ''}.")
+    if columns:
+        click.echo(f"Columns added: {', '.join(columns)}.")
+    if indexes:
+        click.echo(f"Indexes added: {', '.join(indexes)}.")
+
+# Write the OpenAPI spec to a file, to be served from SWAGGER_SPEC_FILE
+@click.command('dump-spec')
+@click.argument('path', required=False)
+@with_appcontext
+def dump_spec_command(path):
+    """Write the OpenAPI spec to PATH (default: SWAGGER_SPEC_FILE or openapi.json)."""
+    path = path or current_app.config.get('SWAGGER_SPEC_FILE') or 'openapi.json'
+    write_spec(current_app._get_current_object(), path)
+    click.echo(f"Wrote the OpenAPI spec to {path}.")
+
+# "main.app" (gunicorn main:app, run.py) builds the app with the selected
+# config on first access, so importing this module does not
+def __getattr__(name):
+    if name == 'app':
+        global app
+        app = create_app(app_config)
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
+    app = create_app(app_config)
+    # python main.py --dump-spec [path]
+    if len(sys.argv) > 1 and sys.argv[1] == '--dump-spec':
+        path = sys.argv[2] if len(sys.argv) > 2 else app.config.get('SWAGGER_SPEC_FILE') or 'openapi.json'
+        write_spec(app, path)
+        print(f"Wrote the OpenAPI spec to {path}.")
+        sys.exit(0)
     app.run(port=int(os.environ.get("PORT", 8080)), host="0.0.0.0", use_reloader=False)
 